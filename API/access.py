@@ -0,0 +1,186 @@
+"""
+Access index of the salle-scoped admins.
+
+An admin with is_scoped_admin only reaches the salles assigned to them
+(ManagedSalle) and the non-admin users linked to those salles or created by
+them. The permission classes (permissions.py) check the ids of a request
+against these sets before the view runs a query, and restrict() narrows the
+list querysets to them. Admins without a scope get None and see everything,
+as before.
+
+The sets are computed with one query and kept as sorted array('I') in a
+bounded in-process LRU/TTL cache, backed by an optional shared cache
+(API_ACCESS_CACHE['SHARED_CACHE']), like the membership index. The receivers in
+signals.py drop the entries of the admins a write concerns once it commits;
+other processes see it once their local entry expires, so keep the TTL short.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import CharField, Q, Value
+
+from . import membership
+from .authentication import LRUCache
+from .models import User, User_Salle, ManagedSalle
+
+USER = 'user'
+SALLE = 'salle'
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_ACCESS_CACHE', {}).get(name, default)
+
+
+_local = LRUCache(max_size=_setting('MAX_SIZE', 10000), ttl=_setting('TTL', 30))
+_lock = threading.Lock()
+# Bumped by every invalidation: a load that raced with one is not cached
+_generation = 0
+
+
+class Access(namedtuple('Access', ('salle_ids', 'user_ids'))):
+    """Sorted ids a scoped admin can reach"""
+
+    def ids(self, kind):
+        return self.salle_ids if kind == SALLE else self.user_ids
+
+    def allows(self, kind, pk):
+        ids = self.ids(kind)
+        position = bisect_left(ids, int(pk))
+        return position < len(ids) and ids[position] == int(pk)
+
+    def missing(self, kind, pks):
+        """The ids, among the given ones, out of reach"""
+        return [pk for pk in pks if not self.allows(kind, pk)]
+
+
+def _shared_cache():
+    alias = _setting('SHARED_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(id_admin):
+    return f'access:{id_admin}'
+
+
+def _kind(kind):
+    return Value(kind, output_field=CharField())
+
+
+def _load(id_admin):
+    shared = _shared_cache()
+    if shared is not None:
+        raw = shared.get(_shared_key(id_admin))
+        if raw is not None:
+            salle_ids, user_ids = array('I'), array('I')
+            salle_ids.frombytes(raw[0])
+            user_ids.frombytes(raw[1])
+            return Access(salle_ids, user_ids)
+    # Both sets in one round trip, the rows tagged with their kind
+    rows = ManagedSalle.objects.filter(admin_id=id_admin).values_list(_kind(SALLE), 'salle_id').union(
+        User.objects.filter(
+            Q(salle_Links__id_salle__managers__admin_id=id_admin) | Q(admin_creator_id=id_admin), is_admin=False
+        ).values_list(_kind(USER), 'pk')
+    )
+    ids = {SALLE: [], USER: []}
+    for kind, pk in rows:
+        ids[kind].append(pk)
+    salle_ids, user_ids = array('I', sorted(ids[SALLE])), array('I', sorted(ids[USER]))
+    if shared is not None:
+        shared.set(_shared_key(id_admin), (salle_ids.tobytes(), user_ids.tobytes()),
+                   timeout=_setting('SHARED_TTL', 300))
+    return Access(salle_ids, user_ids)
+
+
+def get(user):
+    """Access of a scoped admin, None for an admin without a scope"""
+    if not user.is_scoped_admin:
+        return None
+    access = _local.get(user.pk)
+    if access is None:
+        generation = _generation
+        access = _load(user.pk)
+        with _lock:
+            if generation == _generation:
+                _local.set(user.pk, access)
+    return access
+
+
+def restrict(queryset, user, paths):
+    """Narrow a queryset to the reach of a scoped admin; paths maps USER/SALLE to the field holding their id"""
+    access = get(user)
+    if access is None:
+        return queryset
+    for kind, path in paths.items():
+        ids = access.ids(kind)
+        if len(ids) > membership.MAX_IN_IDS:
+            # Join back to the assignments instead of sending a long IN list
+            ids = (ManagedSalle.objects.filter(admin=user).values('salle_id') if kind == SALLE
+                   else User.objects.filter(Q(salle_Links__id_salle__managers__admin=user) | Q(admin_creator=user),
+                                            is_admin=False).values('pk'))
+        queryset = queryset.filter(**{f'{path}__in': ids})
+    return queryset
+
+
+def version_models(user):
+    """Tables besides the listed ones whose writes can change what a scoped admin sees"""
+    return (ManagedSalle, User_Salle, User) if user.is_scoped_admin else ()
+
+
+def forget(*admin_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        for id_admin in admin_ids:
+            _local.delete(id_admin)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_shared_key(id_admin) for id_admin in admin_ids])
+
+
+def forget_salles(salle_ids):
+    """Drop the entries of the admins managing one of the salles"""
+    admin_ids = set(ManagedSalle.objects.filter(salle_id__in=list(salle_ids)).values_list('admin_id', flat=True))
+    if admin_ids:
+        forget(*admin_ids)
+
+
+_pending = threading.local()
+
+
+def forget_salles_on_commit(salle_ids):
+    """forget_salles() once the transaction commits, with one query for all the links it wrote"""
+    if not hasattr(_pending, 'salle_ids'):
+        _pending.salle_ids = set()
+    _pending.salle_ids.update(salle_ids)
+    transaction.on_commit(_forget_pending_salles)
+
+
+def _forget_pending_salles():
+    # The first callback of the transaction takes them all, the others find nothing left
+    salle_ids, _pending.salle_ids = _pending.salle_ids, set()
+    if salle_ids:
+        forget_salles(salle_ids)
+
+
+def clear():
+    """Drop every local entry (the shared entries expire on their own)"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _local.clear()
+
+
+def assign(admin, salle_ids):
+    """Replace the salles a scoped admin manages"""
+    salle_ids = set(salle_ids)
+    current = set(ManagedSalle.objects.filter(admin=admin).values_list('salle_id', flat=True))
+    # Row by row, so the receivers in signals.py drop the admin's entry
+    for managed in ManagedSalle.objects.filter(admin=admin, salle_id__in=current - salle_ids):
+        managed.delete()
+    for id_salle in sorted(salle_ids - current):
+        ManagedSalle.objects.create(admin=admin, salle_id=id_salle)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'API'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+        from django.core.signals import request_started
+
+        from . import checks, deletions, signals  # noqa: F401  Registers the system checks, connects the model signal receivers
+
+        # signals.record_last_login batches the writes that update_last_login does on every login
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        # Picks up the deletion jobs finished by the worker process (deletions.py imports signals, so not in there)
+        request_started.connect(deletions.reconcile, dispatch_uid='api_reconcile_deletions')
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class LRUCache:
+    """Small thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_TOKEN_CACHE', {}).get(name, default)
+
+
+_local_tokens = LRUCache(max_size=_setting('MAX_SIZE', 10000), ttl=_setting('TTL', 30))
+
+
+def _shared_cache():
+    alias = _setting('SHARED_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'auth:token:{key}'
+
+
+def clear():
+    """Drop every local entry (the shared entries expire on their own)"""
+    _local_tokens.clear()
+
+
+def invalidate_token(key):
+    """Drop a token from both cache layers"""
+    _local_tokens.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps resolved tokens in a bounded in-process
+    LRU/TTL cache, backed by an optional shared cache (API_TOKEN_CACHE['SHARED_CACHE']),
+    so repeated requests with the same token skip the Token+User query.
+
+    Entries are invalidated by the signals in signals.py once the deletion of a
+    token or the save of its user commits; other processes only see the change
+    once their local entry expires, so keep the TTL short.
+    Cached users are shared between requests and must be treated as read-only.
+    """
+
+    def authenticate_credentials(self, key):
+        token = _local_tokens.get(key)
+        if token is None:
+            shared = _shared_cache()
+            if shared is not None:
+                token = shared.get(_shared_key(key))
+            if token is None:
+                model = self.get_model()
+                try:
+                    # admin_creator is read by UserSerializer on the dashboards
+                    token = model.objects.select_related('user', 'user__admin_creator').get(key=key)
+                except model.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                if shared is not None:
+                    shared.set(_shared_key(key), token, timeout=_setting('SHARED_TTL', 300))
+            _local_tokens.set(key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
@@ -0,0 +1,136 @@
+"""
+Batch endpoint: several API requests served by one HTTP request.
+
+Sub-requests are dispatched straight to their DRF view, skipping the
+middleware, as the user who sent the batch: the token is checked once. They
+run in order and share the batch request's database connection. With
+"concurrent", consecutive GET/HEAD sub-requests run together on
+API_BATCH['CONCURRENCY'] threads, each with its own connection (taken from the
+pool when the backend has one); any other method still runs after everything
+before it and before everything after it.
+
+Sub-requests are not wrapped in a transaction: a failed write does not undo
+the ones before it. Each one is measured and held to its query budget like a
+request of its own (see metrics.py).
+"""
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.views import APIView
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+# Response headers passed back with each sub-response
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_BATCH', {}).get(name, default)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_setting('CONCURRENCY', 4), thread_name_prefix='api-batch')
+        return _executor
+
+
+def _error(status, message):
+    return {'status': status, 'headers': {}, 'body': {'error': message}}
+
+
+def _sub_request(request, item, path, query):
+    sub = HttpRequest()
+    sub.method = item['method']
+    sub.path = sub.path_info = path
+    sub.META = {name: value for name, value in request.META.items()
+                if not name.startswith(('CONTENT_', 'HTTP_IF_'))}
+    sub.META.update(REQUEST_METHOD=item['method'], PATH_INFO=path, QUERY_STRING=query)
+    for name, value in item.get('headers', {}).items():
+        sub.META['HTTP_' + name.upper().replace('-', '_')] = value
+    sub.GET = QueryDict(query)
+
+    body = b'' if item.get('body') is None else json.dumps(item['body']).encode()
+    sub.META['CONTENT_TYPE'] = 'application/json'
+    sub.META['CONTENT_LENGTH'] = str(len(body))
+    sub._stream = io.BytesIO(body)
+    sub._read_started = False
+
+    # Already authenticated by the batch request, rest_framework's Request skips the authenticators
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _execute(request, item):
+    path, query = urlsplit(item['path'])[2:4]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return _error(404, 'Not found.')
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None or not issubclass(view_class, APIView) or not getattr(view_class, 'batchable', True):
+        return _error(400, "This endpoint can't be batched.")
+
+    sub = _sub_request(request, item, path, query)
+    sub.resolver_match = match
+    with metrics.measure_request(match.url_name, sub.method):
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+        except Exception:
+            logger.exception('Batched %s %s failed', item['method'], item['path'])
+            return _error(500, 'Internal server error.')
+    if response.streaming:
+        response.close()
+        return _error(400, "Streaming responses can't be batched.")
+    return {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in RESPONSE_HEADERS if name in response},
+        # Unrendered, the batch response renders it with the rest
+        'body': getattr(response, 'data', None),
+    }
+
+
+def _execute_in_thread(request, item):
+    try:
+        return _execute(request, item)
+    finally:
+        # The worker thread's connections go back (to the pool) between batches
+        connections.close_all()
+
+
+def run(request, items, concurrent=False):
+    """Sub-responses {status, headers, body} of the items, in the same order"""
+    responses = [None] * len(items)
+    position = 0
+    while position < len(items):
+        end = position + 1
+        if concurrent:
+            while end < len(items) and items[position]['method'] in READ_METHODS \
+                    and items[end]['method'] in READ_METHODS:
+                end += 1
+        if end - position == 1:
+            responses[position] = _execute(request, items[position])
+        else:
+            executor = _get_executor()
+            futures = [executor.submit(_execute_in_thread, request, items[index]) for index in range(position, end)]
+            for index, future in enumerate(futures, start=position):
+                responses[index] = future.result()
+        position = end
+    return responses
@@ -0,0 +1,219 @@
+"""
+Bulk write operations used by the bulk admin endpoints.
+
+bulk_create() skips the model signals, so every operation here sends
+signals.post_bulk_create once it has written its rows, and deletes links
+without the collector and its post_delete per row, then sends
+signals.post_bulk_delete.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .models import User, User_Salle
+from .signals import post_bulk_create, post_bulk_delete
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_BULK_IMPORT', {}).get(name, default)
+
+
+_hash_pool = None
+_hash_workers = 1
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool():
+    global _hash_pool, _hash_workers
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_workers = _setting('HASH_WORKERS', None) or os.cpu_count() or 1
+            # Spawned, not forked: the server process runs threads (login hashing, last_login
+            # flusher, connection pools) whose locks a fork would copy in whatever state they are.
+            # The workers only import django and the hashers, so they set up Django directly
+            # instead of importing this module, whose models need the app registry first.
+            _hash_pool = ProcessPoolExecutor(max_workers=_hash_workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=django.setup)
+        return _hash_pool
+
+
+def hash_passwords(passwords):
+    """Hash passwords on every core; PBKDF2 dominates the cost of creating users"""
+    if len(passwords) < _setting('MIN_POOL_ROWS', 8):
+        return [make_password(password) for password in passwords]
+    pool = _get_hash_pool()
+    chunksize = max(1, len(passwords) // (_hash_workers * 4))
+    return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def import_users(rows, serializer_class, admin_creator):
+    """
+    Validate every row, hash the valid passwords in the process pool and insert
+    the users with bulk_create in batches inside one transaction.
+    Returns (created, errors): created is a list of (row number, user), errors
+    a list of {'row': row number, 'errors': ...}; row numbers start at 1.
+    """
+    errors = []
+    valid = []
+    seen_emails = set()
+    for number, row in enumerate(rows, start=1):
+        serializer = serializer_class(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'errors': serializer.errors})
+            continue
+        # The serializer lowercased the email (User.objects.normalize_email)
+        data = serializer.validated_data
+        if data['email'] in seen_emails:
+            errors.append({'row': number, 'errors': {'email': ['Duplicate email in this import.']}})
+            continue
+        seen_emails.add(data['email'])
+        valid.append((number, data))
+
+    batch_size = _setting('BATCH_SIZE', 500)
+
+    # One query per batch to find emails that are already taken, an index lookup per email
+    existing = set()
+    for start in range(0, len(valid), batch_size):
+        emails = [data['email'] for _, data in valid[start:start + batch_size]]
+        existing.update(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    if existing:
+        errors.extend(
+            {'row': number, 'errors': {'email': ['User with this email already exists.']}}
+            for number, data in valid if data['email'] in existing
+        )
+        valid = [(number, data) for number, data in valid if data['email'] not in existing]
+
+    hashes = hash_passwords([data['password'] for _, data in valid])
+    pending = [
+        (number, User(
+            email=data['email'],
+            name=data['name'],
+            phone=data.get('phone', ''),
+            is_admin=data.get('is_admin', False),
+            admin_creator=admin_creator,
+            password=password_hash,
+        ))
+        for (number, data), password_hash in zip(valid, hashes)
+    ]
+
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create([user for _, user in batch])
+                created.extend(batch)
+            except IntegrityError:
+                # A concurrent insert took one of the emails: retry row by row to isolate it
+                for number, user in batch:
+                    try:
+                        with transaction.atomic():
+                            User.objects.bulk_create([user])
+                        created.append((number, user))
+                    except IntegrityError:
+                        errors.append({'row': number, 'errors': {'email': ['User with this email already exists.']}})
+
+        # Backends without RETURNING leave the primary keys unset after bulk_create
+        missing = {user.email: user for _, user in created if user.pk is None}
+        emails = list(missing)
+        for start in range(0, len(emails), batch_size):
+            chunk = emails[start:start + batch_size]
+            for email, id_user in User.objects.filter(email__in=chunk).values_list('email', 'id_user'):
+                missing[email].id_user = id_user
+
+        post_bulk_create.send(sender=User, instances=[user for _, user in created])
+
+    errors.sort(key=lambda error: error['row'])
+    return created, errors
+
+
+def link_users_to_salles(user_ids, salle_ids, admin_creator):
+    """
+    Link every user to every salle. Existing pairs are found with one query
+    against the (id_user, id_salle) unique index and the rest are inserted with
+    bulk_create in batches; a batch that hits a pair inserted meanwhile is
+    retried row by row, so only the rows this call inserted are returned and
+    announced. Returns (created links, existing count).
+    """
+    batch_size = _setting('BATCH_SIZE', 500)
+    existing = set(
+        User_Salle.objects.filter(id_user__in=user_ids, id_salle__in=salle_ids)
+        .values_list('id_user_id', 'id_salle_id')
+    )
+    pending = [
+        User_Salle(id_user_id=id_user, id_salle_id=id_salle, admin_creator=admin_creator)
+        for id_user in user_ids for id_salle in salle_ids
+        if (id_user, id_salle) not in existing
+    ]
+    if not pending:
+        return [], len(existing)
+
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                with transaction.atomic():
+                    User_Salle.objects.bulk_create(batch)
+                created.extend(batch)
+            except IntegrityError:
+                # A concurrent request linked one of the pairs: retry row by row to skip it
+                for link in batch:
+                    try:
+                        with transaction.atomic():
+                            User_Salle.objects.bulk_create([link])
+                        created.append(link)
+                    except IntegrityError:
+                        existing.add((link.id_user_id, link.id_salle_id))
+
+        # Backends without RETURNING leave the primary keys unset after bulk_create,
+        # the unique index maps each pair inserted above to its row
+        missing = {(link.id_user_id, link.id_salle_id): link for link in created if link.pk is None}
+        if missing:
+            for pk, id_user, id_salle in (
+                User_Salle.objects.filter(id_user__in=user_ids, id_salle__in=salle_ids)
+                .values_list('pk', 'id_user_id', 'id_salle_id')
+            ):
+                if (id_user, id_salle) in missing:
+                    missing[id_user, id_salle].pk = pk
+
+        post_bulk_create.send(sender=User_Salle, instances=created)
+    return created, len(existing)
+
+
+def delete_links(links):
+    """
+    Delete the links by primary key and send post_bulk_delete once. The
+    instances need the columns its receivers read: pk, id_user, id_salle and
+    date_creation. Call it inside the transaction that read them.
+    """
+    batch_size = _setting('BATCH_SIZE', 500)
+    for start in range(0, len(links), batch_size):
+        pks = [link.pk for link in links[start:start + batch_size]]
+        # QuerySet.delete() runs the collector, which selects the rows again and sends a
+        # post_delete per row. Nothing cascades from a link and post_bulk_delete carries
+        # the rows, so only the DELETE ... WHERE id IN the collector ends with is needed:
+        # that is the private _raw_delete, the fast path of QuerySet.delete(). This is
+        # its only caller, check it on Django upgrades.
+        User_Salle.objects.filter(pk__in=pks)._raw_delete(User_Salle.objects.db)
+    if links:
+        post_bulk_delete.send(sender=User_Salle, instances=links)
+
+
+def unlink_users_from_salles(user_ids, salle_ids):
+    """Delete every link between the users and the salles, returns the number deleted"""
+    with transaction.atomic():
+        # The columns the post_bulk_delete receivers read
+        links = list(
+            User_Salle.objects.filter(id_user__in=user_ids, id_salle__in=salle_ids)
+            .only('pk', 'id_user', 'id_salle', 'date_creation')
+        )
+        delete_links(links)
+    return len(links)
@@ -0,0 +1,131 @@
+"""
+Change journal for delta sync of the users, salles and user-salle links.
+
+Every write appends a Change row, and every delete (cascades included, they
+send post_delete too) a tombstone. Clients keep the id of the last row they
+saw as their cursor and ask for the rows after it (AdminChangesView), so a
+sync costs the number of changes instead of the size of the tables.
+
+The receivers in signals.py append the rows in the transaction of the write,
+so a row commits or rolls back with the data it describes. Ids are allocated
+at insert time and a transaction holding a lower id can commit after a higher
+one is read: rows younger than API_CHANGES['SETTLE_SECONDS'] are held back,
+which has to be longer than the write transactions (bulk imports hash the
+passwords before theirs opens).
+
+A delete through Django's collector sends a post_delete per row; inside
+batched() the rows are collected and inserted with one bulk_create at the end
+of the block.
+
+prune() (the prune_changes management command) drops the rows older than
+RETENTION_DAYS and leaves a PRUNED marker in place of the newest one: a cursor
+from before it is expired, its client has to resync in full.
+"""
+import contextlib
+import contextvars
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import User, Salle, User_Salle, Change
+
+KINDS = {
+    'user': User,
+    'salle': Salle,
+    'link': User_Salle,
+}
+_KIND_OF = {model: kind for kind, model in KINDS.items()}
+
+# Change rows of the current batched() block
+_batch = contextvars.ContextVar('api_change_batch', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_CHANGES', {}).get(name, default)
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def kind_of(model):
+    return _KIND_OF[model]
+
+
+def _insert(rows):
+    if rows:
+        Change.objects.bulk_create(rows, batch_size=2000)
+
+
+def record(kind, pks, action=Change.UPSERT):
+    """Append the rows in the current transaction"""
+    rows = [Change(kind=kind, object_id=pk, action=action) for pk in pks]
+    pending = _batch.get()
+    if pending is not None:
+        pending.extend(rows)
+    else:
+        _insert(rows)
+
+
+@contextlib.contextmanager
+def batched():
+    """
+    Collect what record() gets in the block and insert it when the block exits.
+    Open it inside the transaction of the writes; nested blocks join the outer one.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    pending = []
+    token = _batch.set(pending)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    _insert(pending)
+
+
+def latest_cursor():
+    return Change.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def changes_since(since, limit=None):
+    """
+    ({kind: {object id: last action}}, new cursor, has_more) for the settled rows
+    after the since cursor, at most limit of them; raises CursorExpired
+    """
+    max_limit = _setting('MAX_PAGE_SIZE', 5000)
+    limit = min(limit or _setting('PAGE_SIZE', 1000), max_limit)
+    settled = timezone.now() - timedelta(seconds=_setting('SETTLE_SECONDS', 5))
+    rows = list(
+        Change.objects.filter(id__gt=since, created__lte=settled).order_by('id')
+        .values_list('id', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {kind: {} for kind in KINDS}
+    for _, kind, object_id, action in rows:
+        if action == Change.PRUNED:
+            raise CursorExpired(since)
+        latest[kind][object_id] = action
+    return latest, rows[-1][0] if rows else since, has_more
+
+
+def prune(retention_days=None, chunk_size=10000):
+    """Drop the rows older than the retention, returns how many were deleted"""
+    if retention_days is None:
+        retention_days = _setting('RETENTION_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    boundary = Change.objects.filter(created__lt=cutoff).order_by('-id').values_list('id', flat=True).first()
+    if boundary is None:
+        return 0
+    # Mark first: a client reading while the older rows go away reaches the marker instead of a gap
+    Change.objects.filter(id=boundary).update(kind='', object_id=0, action=Change.PRUNED)
+    deleted = 0
+    while True:
+        ids = list(Change.objects.filter(id__lt=boundary).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Change.objects.filter(id__lte=ids[-1]).delete()[0]
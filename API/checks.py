@@ -0,0 +1,45 @@
+"""
+System checks of the API settings, run by manage.py check --deploy.
+
+Some caches hold state that every API worker and the management-command
+workers (reconcile_stats, run_deletion_jobs, ...) must see: a write handled by
+one process has to reach the others. A process-local backend keeps it in the
+process that wrote it.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Settings naming a cache alias whose entries all the processes must share
+SHARED_CACHE_SETTINGS = (
+    # Dashboard counters (stats.py)
+    'API_STATS_CACHE',
+    # Change markers behind the ETags (versions.py)
+    'API_VERSION_CACHE',
+)
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def process_local_caches(names=SHARED_CACHE_SETTINGS):
+    """(setting, alias) of the given settings pointing at a process-local cache"""
+    found = []
+    for name in names:
+        alias = getattr(settings, name, 'default')
+        if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+            found.append((name, alias))
+    return found
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f"{name} uses the process-local cache '{alias}'.",
+            hint='Point it at a cache every worker shares (Redis, Memcached), see settings_production.py.',
+            id='API.W001',
+        )
+        for name, alias in process_local_caches()
+    ]
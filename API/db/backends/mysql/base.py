@@ -0,0 +1,9 @@
+"""MySQL backend with the optional connection pool of API/db/pool.py (ENGINE = 'API.db.backends.mysql')"""
+from django.db.backends.mysql import base
+
+from API.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pool_ping(self, connection):
+        connection.ping()
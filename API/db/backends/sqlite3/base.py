@@ -0,0 +1,9 @@
+"""SQLite backend with the optional connection pool of API/db/pool.py (ENGINE = 'API.db.backends.sqlite3')"""
+from django.db.backends.sqlite3 import base
+
+from API.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pool_ping(self, connection):
+        connection.execute('SELECT 1').fetchall()
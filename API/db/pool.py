@@ -0,0 +1,243 @@
+"""
+Process-wide connection pool for the database backends in API/db/backends.
+
+Enabled per database with OPTIONS['pool'] (True or a dict of ConnectionPool
+arguments). Django then checks a connection out of the pool in connect() and
+returns it in close() instead of closing it: with CONN_MAX_AGE = 0 that is at
+the end of every request, so a worker holds at most max_size connections
+whatever its number of threads, and a request never pays for a new connection
+while an idle one is available.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections.
+
+    max_size      connections open at once, idle or in use
+    timeout       seconds checkout() waits for a free connection before raising PoolTimeout
+    max_lifetime  seconds after which a connection is closed when returned (None: never)
+    max_idle      seconds an idle connection is kept (None: forever)
+    check_idle    idle seconds after which a connection is pinged before being handed out
+    """
+
+    def __init__(self, connect, ping, max_size=10, timeout=10, max_lifetime=1800, max_idle=600, check_idle=30):
+        self.connect = connect
+        self.ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self._idle = deque()  # (connection, created, returned)
+        self._created = {}  # id(connection) -> creation time, for the connections out of the pool
+        self._size = 0
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+        self.stats = dict.fromkeys(
+            ('checkouts', 'connections_created', 'connections_closed', 'waits', 'wait_ms', 'timeouts',
+             'health_checks', 'health_check_failures'), 0)
+
+    def _after_fork(self):
+        # Connections inherited from the parent process belong to it: forget them without closing
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._created.clear()
+            self._size = 0
+
+    def _close(self, connection):
+        self.stats['connections_closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        waited = None
+        with self._condition:
+            self._after_fork()
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    connection, created, returned = self._idle.pop()
+                    if self.max_idle is not None and now - returned > self.max_idle:
+                        self._size -= 1
+                        self._close(connection)
+                        continue
+                    break
+                else:
+                    connection = None
+                if connection is not None or self._size < self.max_size:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection available within {self.timeout} s '
+                                      f'({self.max_size} in use)')
+                if waited is None:
+                    waited = now
+                    self.stats['waits'] += 1
+                self._condition.wait(remaining)
+            if waited is not None:
+                self.stats['wait_ms'] += (time.monotonic() - waited) * 1000
+            self.stats['checkouts'] += 1
+            if connection is None:
+                self._size += 1
+
+        if connection is not None and time.monotonic() - returned > self.check_idle:
+            self.stats['health_checks'] += 1
+            try:
+                self.ping(connection)
+            except Exception:
+                self.stats['health_check_failures'] += 1
+                self._close(connection)
+                connection = None
+        if connection is None:
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            created = time.monotonic()
+            self.stats['connections_created'] += 1
+        with self._condition:
+            self._created[id(connection)] = created
+        return connection
+
+    def checkin(self, connection, discard=False):
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            created = self._created.pop(id(connection), None)
+            now = time.monotonic()
+            if created is None:
+                # Not from this pool (e.g. checked out before a reset)
+                discard = True
+            elif self.max_lifetime is not None and now - created > self.max_lifetime:
+                discard = True
+            if discard:
+                if created is not None:
+                    self._size -= 1
+            else:
+                self._idle.append((connection, created, now))
+            self._condition.notify()
+        if discard:
+            self._close(connection)
+
+    def close_all(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                **self.stats,
+                'wait_ms': round(self.stats['wait_ms'], 3),
+                'max_size': self.max_size,
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, alias, factory):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = (alias, factory())
+        return _pools[key][1]
+
+
+def snapshot():
+    """Metrics of every pool, by database alias"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    result = {}
+    for alias, pool in pools:
+        stats = pool.snapshot()
+        if alias in result:
+            # Same alias with other connection parameters (e.g. the test database)
+            for name, value in stats.items():
+                result[alias][name] += value
+        else:
+            result[alias] = stats
+    return result
+
+
+def close_all():
+    """Close the idle connections of every pool"""
+    with _pools_lock:
+        pools = [pool for _, pool in _pools.values()]
+    for pool in pools:
+        pool.close_all()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixed into a backend's DatabaseWrapper to take connections from a
+    ConnectionPool when OPTIONS['pool'] is set. Backends implement
+    pool_ping(connection), raising when the connection is unusable.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool_options(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options:
+            return None
+        return {} if options is True else dict(options)
+
+    def get_pool(self, conn_params):
+        # Keyed on the parameters too, so the test database gets its own pool
+        key = (self.alias, repr(sorted(conn_params.items())))
+        return get_pool(key, self.alias, lambda: ConnectionPool(
+            connect=lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+            ping=self.pool_ping,
+            **self.pool_options,
+        ))
+
+    def get_new_connection(self, conn_params):
+        if self.pool_options is None:
+            return super().get_new_connection(conn_params)
+        self._pool = self.get_pool(conn_params)
+        return self._pool.checkout()
+
+    def _close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        # A connection closed inside an atomic block stays referenced by this wrapper, never share it
+        discard = self.in_atomic_block
+        if not discard:
+            try:
+                if not self.get_autocommit() or self.errors_occurred:
+                    connection.rollback()
+            except Exception:
+                discard = True
+        self._pool = None
+        pool.checkin(connection, discard=discard)
@@ -0,0 +1,239 @@
+"""
+Background deletion of users and salles with many dependent rows.
+
+instance.delete() has Django's collector load every link of a salle (and for
+an admin, every salle and link it created) and delete them all in one
+transaction. Above API_DELETION['BACKGROUND_MIN_DEPENDENTS'] dependent rows,
+request() records a DeletionJob instead, and a worker (the run_deletion_jobs
+management command) removes the dependents BATCH_SIZE rows per transaction
+before deleting the object itself, which then has next to nothing to cascade to.
+
+Link batches skip the collector: the rows are read with the columns the
+receivers need, deleted by primary key and announced with
+signals.post_bulk_delete. Until the job is done the object still exists but
+takes no new links, and a user is deactivated.
+
+A run that fails is retried after RETRY_DELAY seconds, doubled every time, up
+to MAX_ATTEMPTS runs; every stage picks up where the previous run stopped.
+A job that fails for good leaves the object with what the runs did not
+delete, and reactivates a user it deactivated.
+
+The worker runs in a process of its own. The dashboard counters and change
+markers it moves live in caches every process shares (checks.py warns about
+process-local ones), but the in-process layers of the token, membership and
+access caches are only dropped in the worker. When run() ends it touches the
+DeletionJob change marker, and every API process checks it on request_started,
+at most every RECONCILE_INTERVAL seconds (reconcile()), dropping its local
+layers once it moved.
+"""
+import logging
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import access, authentication, bulk, changes, membership, rollups, versions
+from .models import User, Salle, User_Salle, DeletionJob
+
+logger = logging.getLogger(__name__)
+
+MODELS = {
+    'user': User,
+    'salle': Salle,
+}
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_DELETION', {}).get(name, default)
+
+
+def kind_of(instance):
+    return 'user' if isinstance(instance, User) else 'salle'
+
+
+def dependents(kind, instance):
+    """Rows removed along with the object, an estimate for the progress of its job"""
+    if kind == 'salle':
+        return len(membership.user_ids_for_salle(instance.pk))
+    count = len(membership.salle_ids_for_user(instance.pk))
+    if instance.is_admin:
+        count += User_Salle.objects.filter(Q(admin_creator=instance) | Q(id_salle__admin_creator=instance)).count()
+        count += Salle.objects.filter(admin_creator=instance).count()
+        count += User.objects.filter(admin_creator=instance).count()
+    return count
+
+
+def pending_ids(kind, ids):
+    """The ids, among the given ones, of objects waiting for their deletion job"""
+    return set(
+        DeletionJob.objects.filter(kind=kind, object_id__in=list(ids), status__in=DeletionJob.ACTIVE)
+        .values_list('object_id', flat=True)
+    )
+
+
+def request(instance, requested_by=None):
+    """Delete the object now if it has few dependents, otherwise return the DeletionJob that will"""
+    kind = kind_of(instance)
+    with transaction.atomic():
+        job = DeletionJob.objects.filter(kind=kind, object_id=instance.pk, status__in=DeletionJob.ACTIVE).first()
+        if job is not None:
+            return job
+        total = dependents(kind, instance)
+        if total < _setting('BACKGROUND_MIN_DEPENDENTS', 1000):
+            with rollups.batched(), changes.batched():
+                instance.delete()
+            return None
+        deactivated = kind == 'user' and instance.is_active
+        if deactivated:
+            # No more logins or token authentication while the deletion runs
+            instance.is_active = False
+            instance.save(update_fields=['is_active'])
+        return DeletionJob.objects.create(kind=kind, object_id=instance.pk, requested_by=requested_by, total=total,
+                                          deactivated=deactivated)
+
+
+def _delete_links(condition, batch_size):
+    with transaction.atomic():
+        links = list(
+            User_Salle.objects.filter(condition).order_by('pk')
+            .only('pk', 'id_user', 'id_salle', 'date_creation')[:batch_size]
+        )
+        if not links:
+            return 0
+        # Without the collector and its post_delete per row
+        bulk.delete_links(links)
+    return len(links)
+
+
+def _delete_salles(id_admin, batch_size):
+    with transaction.atomic():
+        ids = list(Salle.objects.filter(admin_creator_id=id_admin).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        # Their links went in an earlier stage
+        with rollups.batched(), changes.batched():
+            Salle.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def _clear_admin_creator(id_admin, batch_size):
+    with transaction.atomic():
+        ids = list(User.objects.filter(admin_creator_id=id_admin).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        # What on_delete=SET_NULL would do, update() sends no signal so journal it here
+        User.objects.filter(pk__in=ids).update(admin_creator=None)
+        changes.record('user', ids)
+        transaction.on_commit(lambda: versions.touch(User))
+    return len(ids)
+
+
+def _stages(job):
+    pk = job.object_id
+    if job.kind == 'salle':
+        return [partial(_delete_links, Q(id_salle_id=pk))]
+    stages = [partial(_delete_links, Q(id_user_id=pk))]
+    if User.objects.filter(pk=pk, is_admin=True).exists():
+        stages += [
+            partial(_delete_links, Q(admin_creator_id=pk) | Q(id_salle__admin_creator_id=pk)),
+            partial(_delete_salles, pk),
+            partial(_clear_admin_creator, pk),
+        ]
+    return stages
+
+
+def claim():
+    """Take the oldest due pending job, or a running one whose worker went quiet"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('STALE_AFTER', 300))
+    with transaction.atomic():
+        job = (
+            DeletionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=DeletionJob.PENDING, run_after__lte=now) | Q(status=DeletionJob.RUNNING, heartbeat__lt=stale))
+            .order_by('id').first()
+        )
+        if job is None:
+            return None
+        job.status = DeletionJob.RUNNING
+        job.attempts += 1
+        job.started = job.started or now
+        job.heartbeat = now
+        job.save(update_fields=['status', 'attempts', 'started', 'heartbeat'])
+    return job
+
+
+def run(job, batch_size=None):
+    """
+    Delete the dependents of a claimed job in batches, then its object; a
+    failure queues it again until MAX_ATTEMPTS
+    """
+    batch_size = batch_size or _setting('BATCH_SIZE', 500)
+    try:
+        for stage in _stages(job):
+            while True:
+                count = stage(batch_size)
+                if not count:
+                    break
+                DeletionJob.objects.filter(pk=job.pk).update(deleted=F('deleted') + count, heartbeat=timezone.now())
+        with transaction.atomic(), rollups.batched(), changes.batched():
+            for instance in MODELS[job.kind].objects.filter(pk=job.object_id):
+                instance.delete()
+    except Exception as error:
+        logger.exception('Deletion job %s failed (attempt %s)', job.pk, job.attempts)
+        job.error = str(error)
+        if job.attempts < _setting('MAX_ATTEMPTS', 3):
+            job.status = DeletionJob.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=_setting('RETRY_DELAY', 30) * 2 ** (job.attempts - 1))
+            job.save(update_fields=['status', 'error', 'run_after'])
+        else:
+            _give_up(job)
+    else:
+        job.status = DeletionJob.DONE
+        job.finished = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished'])
+    job.refresh_from_db(fields=['deleted'])
+    # Failed jobs deleted rows too
+    versions.touch(DeletionJob)
+    return job
+
+
+def _give_up(job):
+    """Mark the job failed and make its object usable again"""
+    with transaction.atomic():
+        job.status = DeletionJob.FAILED
+        job.finished = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished'])
+        if job.deactivated:
+            for user in User.objects.filter(pk=job.object_id, is_active=False):
+                user.is_active = True
+                user.save(update_fields=['is_active'])
+
+
+# DeletionJob marker the local cache layers of this process were checked against, and when
+_seen_marker = None
+_checked = 0.0
+
+
+def reconcile(**kwargs):
+    """
+    Drop this process's local token, membership and access entries if a
+    deletion job ended since the last check (connected to request_started)
+    """
+    global _seen_marker, _checked
+    now = time.monotonic()
+    if now - _checked < _setting('RECONCILE_INTERVAL', 1):
+        return False
+    _checked = now
+    marker, = versions.get_versions([DeletionJob])
+    seen, _seen_marker = _seen_marker, marker
+    # The first check of a process has nothing cached before it
+    if seen is None or seen == marker:
+        return False
+    authentication.clear()
+    membership.clear()
+    access.clear()
+    return True
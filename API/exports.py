@@ -0,0 +1,112 @@
+"""
+Streaming exports of users, salles and user-salle links.
+
+Rows are read in primary-key order with keyset chunks (WHERE pk > last LIMIT n),
+so memory stays flat whatever the table size and no server-side cursor is needed.
+"""
+import csv
+import json
+
+from rest_framework import serializers
+
+from .models import User, Salle, User_Salle
+
+_datetime_field = serializers.DateTimeField()
+
+# Exported column -> ORM path read with values_list()
+EXPORT_COLUMNS = {
+    User: [
+        ('id_user', 'id_user'),
+        ('email', 'email'),
+        ('name', 'name'),
+        ('phone', 'phone'),
+        ('is_admin', 'is_admin'),
+        ('is_active', 'is_active'),
+        ('last_login', 'last_login'),
+        ('admin_creator_id', 'admin_creator_id'),
+        ('admin_creator_name', 'admin_creator__name'),
+        ('date_creation', 'date_creation'),
+    ],
+    Salle: [
+        ('id_salle', 'id_salle'),
+        ('name', 'name'),
+        ('phone', 'phone'),
+        ('date_creation', 'date_creation'),
+        ('admin_creator_id', 'admin_creator_id'),
+        ('admin_creator_name', 'admin_creator__name'),
+    ],
+    User_Salle: [
+        ('id', 'id'),
+        ('id_user', 'id_user_id'),
+        ('user_name', 'id_user__name'),
+        ('id_salle', 'id_salle_id'),
+        ('salle_name', 'id_salle__name'),
+        ('admin_creator_id', 'admin_creator_id'),
+        ('admin_creator_name', 'admin_creator__name'),
+        ('date_creation', 'date_creation'),
+    ],
+}
+
+
+def iter_chunks(queryset, pk_index, chunk_size=2000):
+    """
+    Yield the rows of a values_list() queryset ordered by primary key, pk_index
+    being the position of the primary key in a row, in lists of chunk_size rows
+    read with one query each
+    """
+    pk_name = queryset.model._meta.pk.name
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(**{f'{pk_name}__gt': last_pk})
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][pk_index]
+
+
+def iter_rows(queryset, chunk_size=2000):
+    """Yield value tuples for every row of the queryset, chunk_size rows per query"""
+    columns = EXPORT_COLUMNS[queryset.model]
+    pk_name = queryset.model._meta.pk.name
+    paths = [path for _, path in columns]
+    queryset = queryset.order_by(pk_name).values_list(*paths)
+    for rows in iter_chunks(queryset, paths.index(pk_name), chunk_size):
+        yield from rows
+
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return _datetime_field.to_representation(value)
+    return value
+
+
+class _LineBuffer:
+    """File-like object handing back what csv.writer writes, one row at a time"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_format_value, row)))) + '\n'
+
+
+def stream_csv(queryset, chunk_size=2000):
+    columns = [name for name, _ in EXPORT_COLUMNS[queryset.model]]
+    return csv_lines(columns, iter_rows(queryset, chunk_size))
+
+
+def stream_ndjson(queryset, chunk_size=2000):
+    columns = [name for name, _ in EXPORT_COLUMNS[queryset.model]]
+    return ndjson_lines(columns, iter_rows(queryset, chunk_size))
@@ -0,0 +1,182 @@
+"""
+Read-only fast path for the list endpoints.
+
+Each class here produces exactly the JSON shape of its DRF counterpart
+(UserSerializer, SalleSerializer, UserSalleListSerializer) straight from
+values_list() rows, skipping model instantiation and the per-field
+to_representation calls. The parity tests in tests.py keep them byte-identical,
+including for the sparse fieldsets of fieldsets.py, see FastSerializer.sparse().
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework.fields import DateTimeField
+from rest_framework.settings import api_settings
+
+
+class DateTimeFormatter:
+    """Formats datetimes like rest_framework.fields.DateTimeField, minus the field machinery"""
+
+    def __init__(self):
+        self.iso = api_settings.DATETIME_FORMAT is not None and api_settings.DATETIME_FORMAT.lower() == ISO_8601
+        self.tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        self.field = None if self.iso else DateTimeField()
+
+    def __call__(self, value):
+        if not value:
+            return None
+        if self.field is not None:
+            return self.field.to_representation(value)
+        if self.tz is not None and timezone.is_aware(value):
+            value = value.astimezone(self.tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+
+class FastSerializer:
+    """
+    values: the ORM paths read with values_list(named=True); rows keep the
+    primary key and date_creation as attributes for the cursor pagination.
+    paths: output field -> ORM path, or for a relation (foreign key path,
+    {nested field: ORM path}), used to build the sparse variants.
+    """
+    values = ()
+    paths = {}
+    datetime_fields = ('date_creation',)
+    # Read even when not selected, the cursor pagination orders on them
+    key_values = ()
+
+    @classmethod
+    def project(cls, queryset):
+        return queryset.values_list(*cls.values, named=True)
+
+    @classmethod
+    def sparse(cls, fieldset):
+        """Variant reading and rendering only the fields of a fieldsets.Fieldset"""
+        return _sparse_class(cls, fieldset)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @property
+    def data(self):
+        to_representation = self.to_representation
+        format_datetime = DateTimeFormatter()
+        return [to_representation(row, format_datetime) for row in self.rows]
+
+    def to_representation(self, row, format_datetime):
+        raise NotImplementedError
+
+
+@lru_cache(maxsize=256)
+def _sparse_class(serializer_class, fieldset):
+    columns = {}  # ORM path -> position in the rows
+
+    def column(path):
+        return columns.setdefault(path, len(columns))
+
+    for path in serializer_class.key_values:
+        column(path)
+    # (output field, column, nested [(field, column)] of an expanded relation, is a datetime)
+    plan = []
+    for name in fieldset.fields:
+        path = serializer_class.paths[name]
+        if isinstance(path, str):
+            plan.append((name, column(path), None, name in serializer_class.datetime_fields))
+            continue
+        key_path, nested_paths = path
+        nested = None
+        if fieldset.expanded(name):
+            nested = [(nested_name, column(nested_path)) for nested_name, nested_path in nested_paths.items()]
+        plan.append((name, column(key_path), nested, False))
+
+    def to_representation(self, row, format_datetime):
+        data = {}
+        for name, index, nested, is_datetime in plan:
+            if nested is not None:
+                data[name] = None if row[index] is None else {
+                    nested_name: row[nested_index] for nested_name, nested_index in nested
+                }
+            elif is_datetime:
+                data[name] = format_datetime(row[index])
+            else:
+                data[name] = row[index]
+        return data
+
+    return type(f'Sparse{serializer_class.__name__}', (serializer_class,), {
+        'values': tuple(columns),
+        'to_representation': to_representation,
+    })
+
+
+class FastUserSerializer(FastSerializer):
+    """Same output as UserSerializer"""
+    values = ('id_user', 'email', 'name', 'phone', 'is_admin', 'is_active', 'last_login',
+              'admin_creator_id', 'admin_creator__name', 'date_creation')
+    paths = {
+        'id_user': 'id_user', 'email': 'email', 'name': 'name', 'phone': 'phone', 'is_admin': 'is_admin',
+        'is_active': 'is_active', 'last_login': 'last_login',
+        'admin_creator': ('admin_creator_id', {'id_user': 'admin_creator_id', 'name': 'admin_creator__name'}),
+        'date_creation': 'date_creation',
+    }
+    datetime_fields = ('last_login', 'date_creation')
+    key_values = ('id_user', 'date_creation')
+
+    def to_representation(self, row, format_datetime):
+        return {
+            'id_user': row[0],
+            'email': row[1],
+            'name': row[2],
+            'phone': row[3],
+            'is_admin': row[4],
+            'is_active': row[5],
+            'last_login': format_datetime(row[6]),
+            'admin_creator': {'id_user': row[7], 'name': row[8]} if row[7] is not None else None,
+            'date_creation': format_datetime(row[9]),
+        }
+
+
+class FastSalleSerializer(FastSerializer):
+    """Same output as SalleSerializer"""
+    values = ('id_salle', 'name', 'phone', 'date_creation', 'admin_creator_id', 'admin_creator__name')
+    paths = {
+        'id_salle': 'id_salle', 'name': 'name', 'phone': 'phone', 'date_creation': 'date_creation',
+        'admin_creator': ('admin_creator_id', {'id_user': 'admin_creator_id', 'name': 'admin_creator__name'}),
+    }
+    key_values = ('id_salle', 'date_creation')
+
+    def to_representation(self, row, format_datetime):
+        return {
+            'id_salle': row[0],
+            'name': row[1],
+            'phone': row[2],
+            'date_creation': format_datetime(row[3]),
+            'admin_creator': {'id_user': row[4], 'name': row[5]} if row[4] is not None else None,
+        }
+
+
+class FastUserSalleListSerializer(FastSerializer):
+    """Same output as UserSalleListSerializer"""
+    values = ('id', 'admin_creator_id', 'admin_creator__name', 'id_user_id', 'id_user__name',
+              'id_salle_id', 'id_salle__name', 'date_creation')
+    paths = {
+        'id': 'id',
+        'admin_creator': ('admin_creator_id', {'id_user': 'admin_creator_id', 'name': 'admin_creator__name'}),
+        'id_user': ('id_user_id', {'id_user': 'id_user_id', 'name': 'id_user__name'}),
+        'id_salle': ('id_salle_id', {'id_salle': 'id_salle_id', 'name': 'id_salle__name'}),
+        'date_creation': 'date_creation',
+    }
+    key_values = ('id', 'date_creation')
+
+    def to_representation(self, row, format_datetime):
+        return {
+            'id': row[0],
+            'admin_creator': {'id_user': row[1], 'name': row[2]},
+            'id_user': {'id_user': row[3], 'name': row[4]},
+            'id_salle': {'id_salle': row[5], 'name': row[6]},
+            'date_creation': format_datetime(row[7]),
+        }
@@ -0,0 +1,52 @@
+"""
+Sparse fieldsets of the read endpoints.
+
+?fields=id_user,name keeps only the listed fields of each object and
+?expand=admin_creator renders the listed relations as nested objects. Once
+either parameter is given, the relations left out of ?expand are rendered as
+their primary key, so the related row is not joined at all; without them the
+output is unchanged.
+
+The selection is pushed down to the SQL: QueryPlanMixin.setup_queryset()
+(serializers.py) and FastSerializer.sparse() (fast_serializers.py) only read
+the columns of the selected fields.
+"""
+from collections import namedtuple
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+class Fieldset(namedtuple('Fieldset', ('fields', 'expand'))):
+    """fields: the selected fields in serializer order, expand: the relations rendered nested"""
+
+    def expanded(self, relation):
+        return relation in self.expand
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def from_request(request, available, relations):
+    """Fieldset of a request (None when it asks for the full objects), raises ValidationError on unknown names"""
+    params = request.query_params
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+
+    errors = {}
+    fields = _names(params.get(FIELDS_PARAM, ''))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        errors[FIELDS_PARAM] = [f"Unknown fields: {', '.join(unknown)}. Expected some of: {', '.join(available)}."]
+    expand = _names(params.get(EXPAND_PARAM, ''))
+    unknown = [name for name in expand if name not in relations]
+    if unknown:
+        errors[EXPAND_PARAM] = [f"Unknown relations: {', '.join(unknown)}. Expected some of: {', '.join(relations)}."]
+    if errors:
+        raise ValidationError(errors)
+
+    selected = tuple(name for name in available if not fields or name in fields)
+    return Fieldset(selected, frozenset(expand))
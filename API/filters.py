@@ -0,0 +1,17 @@
+def filter_users_by_role(queryset, role):
+    """?role=admin or ?role=user, anything else leaves the queryset unfiltered"""
+    if role is not None:
+        if role.lower() == 'admin':
+            queryset = queryset.filter(is_admin=True)
+        elif role.lower() == 'user':
+            queryset = queryset.filter(is_admin=False)
+    return queryset
+
+
+def filter_links(queryset, user_id=None, salle_id=None):
+    """?user_id= and ?salle_id= filters of the user-salle link list"""
+    if user_id:
+        queryset = queryset.filter(id_user__id_user=user_id)
+    if salle_id:
+        queryset = queryset.filter(id_salle__id_salle=salle_id)
+    return queryset
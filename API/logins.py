@@ -0,0 +1,173 @@
+"""
+Login support for the async login view.
+
+Password hashing is CPU bound: hashlib releases the GIL while running PBKDF2,
+so verify_credentials() runs it in a bounded thread pool instead of the
+single thread that sync_to_async() would serialize every login on.
+last_login is written by a background flusher in one UPDATE per interval
+rather than one per login, and token keys are cached per user, stamped with the
+Token change marker (versions.py) that every process shares: a token deleted by
+another worker moves the marker and the cached key is read again.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_login_failed
+from django.db import close_old_connections, connection, transaction
+from rest_framework.authtoken.models import Token
+
+from . import changes, versions
+from .authentication import LRUCache
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_LOGIN', {}).get(name, default)
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            workers = _setting('HASH_WORKERS', None) or os.cpu_count() or 1
+            _hash_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        return _hash_pool
+
+
+def _verify(password, encoded):
+    """(is_correct, must_update) without touching the database"""
+    must_update = []
+    is_correct = check_password(password, encoded, setter=must_update.append)
+    return is_correct, bool(must_update)
+
+
+async def verify_credentials(request, email, password):
+    """
+    Async equivalent of authenticate() with the ModelBackend: returns the
+    active user matching the credentials, or None.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_hash_pool()
+    user = await User.objects.filter(email=User.objects.normalize_email(email)).afirst()
+    if user is None:
+        # Hash anyway so unknown emails take as long as wrong passwords
+        await loop.run_in_executor(pool, make_password, password)
+    else:
+        is_correct, must_update = await loop.run_in_executor(pool, _verify, password, user.password)
+        if is_correct and must_update:
+            # Hasher settings changed since the password was stored
+            user.password = await loop.run_in_executor(pool, make_password, password)
+            await user.asave(update_fields=['password'])
+        if is_correct and user.is_active:
+            user.backend = 'django.contrib.auth.backends.ModelBackend'
+            return user
+
+    await user_login_failed.asend(sender=__name__, credentials={'username': email, 'password': '*' * 20},
+                                  request=request)
+    return None
+
+
+_user_tokens = LRUCache(max_size=_setting('TOKEN_CACHE_SIZE', 10000), ttl=_setting('TOKEN_CACHE_TTL', 300))
+
+
+async def get_token_key(user):
+    """Key of the user's auth token, created on first login"""
+    [version] = await sync_to_async(versions.get_versions)([Token])
+    entry = _user_tokens.get(user.pk)
+    if entry is not None and entry[1] == version:
+        return entry[0]
+    token, _ = await Token.objects.aget_or_create(user=user)
+    key = token.key
+    # Only cache a token that is committed, a rolled back one would never be found again
+    await sync_to_async(transaction.on_commit)(lambda: _user_tokens.set(user.pk, (key, version)))
+    return key
+
+
+def forget_user_token(user_pk):
+    _user_tokens.delete(user_pk)
+
+
+class LastLoginFlusher:
+    """
+    Collects last_login timestamps and writes them from a daemon thread every
+    API_LOGIN['LAST_LOGIN_FLUSH_INTERVAL'] seconds with one bulk_update.
+    An interval of 0 writes each login immediately.
+    bulk_update() skips the model signals, so the flush touches the User
+    change marker and appends to the change journal itself; cached token users keep the old value until their
+    cache entry expires.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, user_pk, when):
+        interval = _setting('LAST_LOGIN_FLUSH_INTERVAL', 5)
+        if not interval:
+            with transaction.atomic():
+                User.objects.filter(pk=user_pk).update(last_login=when)
+                changes.record('user', [user_pk])
+            versions.touch(User)
+            return
+        with self._lock:
+            previous = self._pending.get(user_pk)
+            if previous is not None and previous >= when:
+                return
+            self._pending[user_pk] = when
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(interval,), name='last-login-flusher',
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        """Write the pending timestamps now, returns how many users were updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with transaction.atomic():
+                User.objects.bulk_update(
+                    [User(pk=user_pk, last_login=when) for user_pk, when in pending.items()],
+                    ['last_login'],
+                    batch_size=500,
+                )
+                changes.record('user', pending)
+        except Exception:
+            # Keep the timestamps for the next flush, unless a newer login replaced them
+            with self._lock:
+                for user_pk, when in pending.items():
+                    self._pending[user_pk] = max(when, self._pending.get(user_pk, when))
+            raise
+        versions.touch(User)
+        return len(pending)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write the last_login timestamps')
+            finally:
+                connection.close()
+
+
+last_login_flusher = LastLoginFlusher()
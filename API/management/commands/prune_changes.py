@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from API import changes
+
+
+class Command(BaseCommand):
+    help = 'Delete the change journal rows older than the retention; clients holding an older cursor resync in full'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Days of journal to keep, API_CHANGES['RETENTION_DAYS'] by default")
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = changes.prune(options['days'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} change journal rows'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from API import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the report rollup buckets from the users, salles and user-salle links tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metric', action='append', choices=sorted(rollups.METRICS), dest='metrics',
+                            help='Only rebuild this metric (repeatable), all of them by default')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(options['metrics'], chunk_size=options['chunk_size'])
+        for metric, rows in written.items():
+            self.stdout.write(f'{metric}: {rows} buckets')
+        self.stdout.write(self.style.SUCCESS('Report rollups rebuilt'))
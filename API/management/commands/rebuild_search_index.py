@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from API import search
+
+
+class Command(BaseCommand):
+    help = 'Recompute the search prefixes of the users and salles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=sorted(search.INDEXED), dest='kinds',
+                            help='Only rebuild this kind of object (repeatable), all of them by default')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = search.rebuild(options['kinds'], chunk_size=options['chunk_size'])
+        for kind, rows in written.items():
+            self.stdout.write(f'{kind}: {rows} prefixes')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from API import checks, stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached dashboard counters from the database (run periodically, e.g. from cron)'
+
+    def handle(self, *args, **options):
+        for name, alias in checks.process_local_caches(('API_STATS_CACHE',)):
+            self.stderr.write(self.style.WARNING(
+                f"{name} is the process-local cache '{alias}': the API servers won't see these counters"
+            ))
+        counters = stats.reconcile()
+        for name, value in counters.items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Dashboard statistics reconciled'))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from API import checks, deletions
+
+
+class Command(BaseCommand):
+    help = 'Run the background deletions of users and salles requested through the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is waiting instead of polling')
+        parser.add_argument('--batch-size', type=int, help="Rows deleted per transaction, API_DELETION['BATCH_SIZE'] by default")
+        parser.add_argument('--poll-interval', type=float,
+                            help="Seconds between polls when idle, API_DELETION['POLL_INTERVAL'] by default")
+
+    def handle(self, *args, **options):
+        for name, alias in checks.process_local_caches():
+            self.stderr.write(self.style.WARNING(
+                f"{name} is the process-local cache '{alias}': the API servers won't see what the deletions change in it"
+            ))
+        poll_interval = options['poll_interval'] or deletions._setting('POLL_INTERVAL', 2)
+        while True:
+            close_old_connections()
+            job = deletions.claim()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(poll_interval)
+                continue
+            job = deletions.run(job, batch_size=options['batch_size'])
+            style = self.style.SUCCESS if job.status == job.DONE else self.style.ERROR
+            self.stdout.write(style(str(job)))
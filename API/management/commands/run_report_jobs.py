@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from API import report_jobs
+
+
+class Command(BaseCommand):
+    help = 'Generate the queued report jobs and delete the expired report files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of polling')
+        parser.add_argument('--poll-interval', type=float,
+                            help="Seconds between polls when idle, API_REPORT_JOBS['POLL_INTERVAL'] by default")
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval'] or report_jobs._setting('POLL_INTERVAL', 2)
+        while True:
+            close_old_connections()
+            expired = report_jobs.expire()
+            if expired:
+                self.stdout.write(f'Deleted {expired} expired report files')
+            job = report_jobs.claim()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(poll_interval)
+                continue
+            job = report_jobs.run(job)
+            style = self.style.SUCCESS if job.status == job.DONE else self.style.ERROR
+            self.stdout.write(style(str(job)))
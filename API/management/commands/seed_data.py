@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from API import rollups, search, seeding, stats
+from API.models import User
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a deterministic dataset of admins, users, salles and user-salle links'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(seeding.SCALES), default='small',
+                            help='Named dataset size, individual counts below override it')
+        parser.add_argument('--admins', type=int)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--salles', type=int)
+        parser.add_argument('--links', type=int)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same rows')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(email__endswith=f'@{seeding.EMAIL_DOMAIN}').exists():
+            raise CommandError('The database already holds seeded data, start from an empty database.')
+
+        counts = dict(seeding.SCALES[options['scale']])
+        for name in counts:
+            if options[name] is not None:
+                counts[name] = options[name]
+
+        seeding.seed(seed=options['seed'], batch_size=options['batch_size'], stdout=self.stdout, **counts)
+        # bulk_create bypasses the signals that maintain the cached counters, the rollups and the search index
+        stats.reconcile()
+        rollups.rebuild()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Seeding complete'))
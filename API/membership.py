@@ -0,0 +1,134 @@
+"""
+Adjacency index of the User_Salle relationship for the relationship views.
+
+For each user the ids of its salles, and for each salle the ids of its users,
+are kept as sorted array('I') in a bounded in-process LRU/TTL cache, backed by
+an optional shared cache (API_MEMBERSHIP_CACHE['SHARED_CACHE']) where they are
+stored as raw bytes. A missing entry costs one indexed query on User_Salle.
+
+The receivers in signals.py patch the local entries once a link write commits
+and drop the shared ones; other processes see the change once their local entry
+expires, so keep the TTL short.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .authentication import LRUCache
+from .models import User_Salle
+
+USER = 'user'
+SALLE = 'salle'
+# side -> (link column holding the key, link column holding the neighbours)
+_COLUMNS = {
+    USER: ('id_user_id', 'id_salle_id'),
+    SALLE: ('id_salle_id', 'id_user_id'),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_MEMBERSHIP_CACHE', {}).get(name, default)
+
+
+# Above this many ids the views join through User_Salle instead of sending a long IN list
+MAX_IN_IDS = _setting('MAX_IN_IDS', 5000)
+
+_local = LRUCache(max_size=_setting('MAX_SIZE', 50000), ttl=_setting('TTL', 30))
+_lock = threading.Lock()
+# Bumped by every write: a load that raced with a write is not cached
+_generation = 0
+
+
+def _shared_cache():
+    alias = _setting('SHARED_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(side, pk):
+    return f'membership:{side}:{pk}'
+
+
+def _load(side, pk):
+    shared = _shared_cache()
+    if shared is not None:
+        raw = shared.get(_shared_key(side, pk))
+        if raw is not None:
+            ids = array('I')
+            ids.frombytes(raw)
+            return ids
+    key_column, neighbour_column = _COLUMNS[side]
+    ids = array('I', User_Salle.objects.filter(**{key_column: pk}).order_by(neighbour_column)
+                .values_list(neighbour_column, flat=True))
+    if shared is not None:
+        shared.set(_shared_key(side, pk), ids.tobytes(), timeout=_setting('SHARED_TTL', 300))
+    return ids
+
+
+def neighbours(side, pk):
+    """Sorted ids of the salles of a user (side=USER) or the users of a salle (side=SALLE)"""
+    ids = _local.get((side, pk))
+    if ids is None:
+        generation = _generation
+        ids = _load(side, pk)
+        with _lock:
+            if generation == _generation:
+                _local.set((side, pk), ids)
+    return ids
+
+
+def salle_ids_for_user(id_user):
+    return neighbours(USER, id_user)
+
+
+def user_ids_for_salle(id_salle):
+    return neighbours(SALLE, id_salle)
+
+
+def _patch(side, pk, neighbour, added):
+    ids = _local.get((side, pk))
+    if ids is not None:
+        ids = array('I', ids)
+        position = bisect_left(ids, neighbour)
+        present = position < len(ids) and ids[position] == neighbour
+        if added and not present:
+            ids.insert(position, neighbour)
+        elif not added and present:
+            del ids[position]
+        _local.set((side, pk), ids)
+
+
+def apply_links(pairs, added):
+    """Add or remove committed (id_user, id_salle) links"""
+    global _generation
+    shared = _shared_cache()
+    with _lock:
+        _generation += 1
+        for id_user, id_salle in pairs:
+            _patch(USER, id_user, id_salle, added)
+            _patch(SALLE, id_salle, id_user, added)
+    if shared is not None:
+        keys = {_shared_key(USER, id_user) for id_user, _ in pairs}
+        keys.update(_shared_key(SALLE, id_salle) for _, id_salle in pairs)
+        shared.delete_many(list(keys))
+
+
+def forget(side, pk):
+    """Drop the entry of a deleted user or salle"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _local.delete((side, pk))
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(side, pk))
+
+
+def clear():
+    """Drop every local entry (the shared entries expire on their own)"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _local.clear()
@@ -0,0 +1,235 @@
+"""
+Per-request instrumentation: SQL query count, SQL time, serialization time and
+total latency, aggregated into histograms per URL name (login, admin-user-list...).
+
+QueryMetricsMiddleware records every request (and batch.py each of its
+sub-requests); serialization code reports its time with track_serialization().
+Histograms live in process memory and are exposed by the admin-only metrics
+endpoint.
+
+Query budgets: API_QUERY_BUDGETS maps URL names to the maximum number of SQL
+queries a request may run, per HTTP method (HEAD takes the GET budget); methods
+left out are not checked. Exceeding it logs a warning, or raises
+QueryBudgetExceeded when API_QUERY_BUDGET_STRICT is set (as the tests do).
+
+The middleware runs in both sync and async mode, so an async view (login) is
+not adapted to a thread just for it.
+"""
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50, 100, 500, 1000)
+
+HISTOGRAMS = {
+    'queries': QUERY_BUCKETS,
+    'sql_ms': LATENCY_BUCKETS_MS,
+    'serialization_ms': LATENCY_BUCKETS_MS,
+    'total_ms': LATENCY_BUCKETS_MS,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_seconds', 'serialization_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper, see connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+_current = contextvars.ContextVar('api_request_metrics', default=None)
+
+
+@contextlib.contextmanager
+def track_serialization():
+    """Add the time spent in the block to the current request's serialization time"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'buckets': {
+                **{f'le_{bound}': count for bound, count in zip(self.bounds, self.counts)},
+                'inf': self.counts[-1],
+            },
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, values):
+        with self._lock:
+            histograms = self._endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self._endpoints[endpoint] = {
+                    name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {name: histogram.as_dict() for name, histogram in histograms.items()}
+                for endpoint, histograms in sorted(self._endpoints.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+def check_budget(endpoint, method, queries):
+    budgets = getattr(settings, 'API_QUERY_BUDGETS', {}).get(endpoint, {})
+    budget = budgets.get('GET' if method == 'HEAD' else method)
+    if budget is None or queries <= budget:
+        return
+    message = f'{method} {endpoint} ran {queries} SQL queries, over its budget of {budget}'
+    if getattr(settings, 'API_QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def _wrap_connections(metrics):
+    """Count the queries of this thread's connections into metrics until the returned stack is closed"""
+    stack = contextlib.ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+    return stack
+
+
+def _record(endpoint, method, metrics, started):
+    total = time.perf_counter() - started
+    if callable(endpoint):
+        endpoint = endpoint()
+    registry.record(endpoint, {
+        'queries': metrics.queries,
+        'sql_ms': metrics.sql_seconds * 1000,
+        'serialization_ms': metrics.serialization_seconds * 1000,
+        'total_ms': total * 1000,
+    })
+    check_budget(endpoint, method, metrics.queries)
+
+
+@contextlib.contextmanager
+def measure_request(endpoint, method):
+    """
+    Record the SQL, serialization and total time of the block under endpoint
+    (a URL name, or a callable returning it once the block has run), then check
+    its budget for the HTTP method
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    started = time.perf_counter()
+    try:
+        with _wrap_connections(metrics):
+            yield metrics
+    finally:
+        _current.reset(token)
+    _record(endpoint, method, metrics, started)
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name if match is not None and match.url_name else '<unresolved>'
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with measure_request(lambda: _endpoint(request), request.method):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Connections are per thread and the async ORM runs its queries in the thread
+        # sync_to_async() gives this request, so the wrappers go on the connections there
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        stack = await sync_to_async(_wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        _record(lambda: _endpoint(request), request.method, metrics, started)
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-17 18:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['date_creation', 'id_salle'], name='salle_date_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_admin', 'id_user'], name='user_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_admin', 'is_active'], name='user_role_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_creation', 'id_user'], name='user_date_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user_salle',
+            index=models.Index(fields=['id_salle', 'id_user'], name='link_salle_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user_salle',
+            index=models.Index(fields=['date_creation', 'id'], name='link_date_creation_idx'),
+        ),
+        migrations.AlterField(
+            model_name='user_salle',
+            name='id_salle',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_Links', to='API.salle'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=16)),
+                ('period', models.CharField(max_length=8)),
+                ('dimension', models.IntegerField(default=0)),
+                ('bucket', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'period', 'bucket'], name='rollup_metric_bucket_idx')],
+                'unique_together': {('metric', 'period', 'dimension', 'bucket')},
+            },
+        ),
+    ]
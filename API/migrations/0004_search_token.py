@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0003_report_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=8)),
+                ('object_id', models.IntegerField()),
+                ('prefix', models.CharField(max_length=12)),
+                ('weight', models.SmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'prefix', 'weight', 'object_id'], name='search_prefix_idx')],
+                'unique_together': {('kind', 'object_id', 'prefix')},
+            },
+        ),
+    ]
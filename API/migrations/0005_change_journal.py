@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0004_search_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=8)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(max_length=8)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created'], name='change_created_idx')],
+            },
+        ),
+    ]
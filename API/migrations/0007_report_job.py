@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-17 23:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0006_deletion_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobQueue',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=32)),
+                ('format', models.CharField(max_length=8)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(default='queued', max_length=8)),
+                ('attempts', models.SmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.TextField(blank=True, default='')),
+                ('result', models.FileField(blank=True, upload_to='reports/')),
+                ('rows', models.IntegerField(blank=True, null=True)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('expires', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after', 'id'], name='report_job_status_idx'), models.Index(fields=['requested_by', 'status'], name='report_job_user_idx'), models.Index(fields=['status', 'expires'], name='report_job_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0007_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_scoped_admin',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ManagedSalle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('admin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='managed_salles', to=settings.AUTH_USER_MODEL)),
+                ('salle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='managers', to='API.salle')),
+            ],
+            options={
+                'unique_together': {('admin', 'salle')},
+            },
+        ),
+    ]
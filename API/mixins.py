@@ -0,0 +1,120 @@
+import time
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from . import access, routers, versions
+from .metrics import track_serialization
+
+
+class QueryPlanViewMixin:
+    """
+    Applies the serializer's declared select_related/only() plan to every queryset
+    the view reads, narrowed to the sparse fieldset of GET requests (see fieldsets.py)
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            serializer_class = self.get_serializer_class()
+            if self.request.method in ('GET', 'HEAD') and hasattr(serializer_class, 'get_fieldset'):
+                self._fieldset = serializer_class.get_fieldset(self.request)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fieldset': self.get_fieldset()}
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_queryset'):
+            queryset = serializer_class.setup_queryset(queryset, self.get_fieldset())
+        return queryset
+
+
+class AtomicWriteMixin:
+    """
+    Runs create, update and destroy in one transaction, so the rows the
+    receivers in signals.py write along with the object (report rollups,
+    search prefixes, change journal) commit or roll back with it
+    """
+
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Serves GET from a read replica (see routers.py); authentication still reads the primary"""
+
+    def get(self, request, *args, **kwargs):
+        with routers.use_replica():
+            return super().get(request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET with 304 Not Modified, without running the queryset or the
+    serializer, when the client's If-None-Match / If-Modified-Since still match
+    the change markers of version_models (see versions.py), and for a scoped
+    admin those of the tables behind their access index (see access.py)
+    """
+    version_models = ()
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_admin:
+            return super().get(request, *args, **kwargs)
+
+        models = tuple(dict.fromkeys(self.version_models + access.version_models(request.user)))
+        etag, last_modified = versions.validators(
+            models, request.user.pk, request.get_full_path(), request.accepted_renderer.format
+        )
+        if routers.reading_from_replica() and last_modified > time.time() - routers.max_lag():
+            # The replica may not have the latest write yet, don't let clients cache this response
+            response = super().get(request, *args, **kwargs)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class FastListMixin:
+    """
+    Serves list() through fast_serializer_class (see fast_serializers.py),
+    which builds the response from values_list() rows instead of model instances.
+    Goes with QueryPlanViewMixin, for the sparse fieldset of the request.
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.fast_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        serializer_class = self.fast_serializer_class
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            serializer_class = serializer_class.sparse(fieldset)
+        queryset = serializer_class.project(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        with track_serialization():
+            data = serializer_class(rows).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
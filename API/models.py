@@ -4,6 +4,11 @@ from django.utils import timezone
 
 
 class UserManager(BaseUserManager):
+    @classmethod
+    def normalize_email(cls, email):
+        """Lowercased whole, so that exact lookups and the unique index ignore the case on every backend"""
+        return super().normalize_email(email).lower()
+
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
@@ -27,6 +32,8 @@ class User(AbstractBaseUser):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=20)
     is_admin = models.BooleanField(default=False)
+    # An admin limited to the salles of their ManagedSalle rows (see access.py)
+    is_scoped_admin = models.BooleanField(default=False)
     date_creation = models.DateTimeField(default=timezone.now)
     admin_creator = models.ForeignKey(
         'self', 
@@ -48,6 +55,15 @@ class User(AbstractBaseUser):
     
     def __str__(self):
         return f"{self.name} ({self.email})"
+
+    class Meta:
+        indexes = [
+            # Role filter of the user list, walked in id_user order by the cursor pagination
+            models.Index(fields=['is_admin', 'id_user'], name='user_role_idx'),
+            # Covers the dashboard role/active counts without touching the rows
+            models.Index(fields=['is_admin', 'is_active'], name='user_role_active_idx'),
+            models.Index(fields=['date_creation', 'id_user'], name='user_date_creation_idx'),
+        ]
     
     # Required functions for Django Admin Panel, ensures superusers have all permissions
     def has_perm(self, perm, obj=None):  
@@ -75,6 +91,9 @@ class Salle(models.Model):
     class Meta:
         verbose_name = 'Salle'
         verbose_name_plural = 'Salles'
+        indexes = [
+            models.Index(fields=['date_creation', 'id_salle'], name='salle_date_creation_idx'),
+        ]
 
 
 class User_Salle(models.Model):
@@ -87,7 +106,9 @@ class User_Salle(models.Model):
     id_salle = models.ForeignKey(
         Salle,
         on_delete=models.CASCADE,
-        related_name='user_Links'
+        related_name='user_Links',
+        # link_salle_user_idx below starts with id_salle and serves its lookups and the constraint
+        db_index=False
     )
     date_creation = models.DateTimeField(default=timezone.now)
     admin_creator = models.ForeignKey(
@@ -104,4 +125,183 @@ class User_Salle(models.Model):
         verbose_name = 'User-Salle Links'
         verbose_name_plural = 'User-Salle Links'
         # Prevent duplicate links
-        unique_together = ('id_user', 'id_salle')
\ No newline at end of file
+        unique_together = ('id_user', 'id_salle')
+        indexes = [
+            # Salle -> users lookups, which the (id_user, id_salle) unique index can't serve
+            models.Index(fields=['id_salle', 'id_user'], name='link_salle_user_idx'),
+            models.Index(fields=['date_creation', 'id'], name='link_date_creation_idx'),
+        ]
+
+
+class ManagedSalle(models.Model):
+    """A salle a scoped admin manages, with its members (see access.py)"""
+    admin = models.ForeignKey(User, on_delete=models.CASCADE, related_name='managed_salles')
+    salle = models.ForeignKey(Salle, on_delete=models.CASCADE, related_name='managers')
+    date_creation = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.admin} manages {self.salle}"
+
+    class Meta:
+        unique_together = ('admin', 'salle')
+
+
+class ReportRollup(models.Model):
+    """
+    Pre-aggregated row counts per day or week bucket (see rollups.py).
+    dimension is the admin_creator of new users/salles or the salle of new links, 0 when unset.
+    """
+    metric = models.CharField(max_length=16)
+    period = models.CharField(max_length=8)
+    dimension = models.IntegerField(default=0)
+    bucket = models.DateField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.metric} {self.period} {self.bucket} [{self.dimension}]: {self.count}"
+
+    class Meta:
+        unique_together = ('metric', 'period', 'dimension', 'bucket')
+        indexes = [
+            # Reports over every dimension of a metric within a date range
+            models.Index(fields=['metric', 'period', 'bucket'], name='rollup_metric_bucket_idx'),
+        ]
+
+
+class SearchToken(models.Model):
+    """
+    Prefix index behind the search endpoint (see search.py): one row per
+    distinct word prefix of an indexed user or salle, with its best weight.
+    """
+    kind = models.CharField(max_length=8)
+    object_id = models.IntegerField()
+    prefix = models.CharField(max_length=12)
+    weight = models.SmallIntegerField()
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.prefix} ({self.weight})"
+
+    class Meta:
+        unique_together = ('kind', 'object_id', 'prefix')
+        indexes = [
+            # Matches of a prefix, best first, without reading the table
+            models.Index(fields=['kind', 'prefix', 'weight', 'object_id'], name='search_prefix_idx'),
+        ]
+
+
+class Change(models.Model):
+    """
+    Change journal behind the delta-sync endpoint (see changes.py): one row per
+    write of a user, salle or user-salle link, its id being the sync cursor.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    # Left by prune_changes in place of the newest pruned row, older cursors are expired
+    PRUNED = 'pruned'
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=8)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=8)
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.kind} {self.object_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='change_created_idx'),
+        ]
+
+
+class DeletionJob(models.Model):
+    """
+    Background deletion of a user or salle with many dependent rows (see deletions.py).
+    While it is pending or running the object still exists but takes no new links.
+    A failed run is retried; once the job fails for good the object is usable again.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    ACTIVE = (PENDING, RUNNING)
+
+    kind = models.CharField(max_length=8)
+    object_id = models.IntegerField()
+    status = models.CharField(max_length=8, default=PENDING)
+    requested_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='+')
+    # Runs started so far, a failed run is retried after a delay until MAX_ATTEMPTS
+    attempts = models.SmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    # The user was active and deactivated for the deletion, reactivated if the job fails
+    deactivated = models.BooleanField(default=False)
+    # Dependent rows counted when the job was created, and removed so far
+    total = models.IntegerField(default=0)
+    deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Touched after every batch, a running job without news for a while is taken over by another worker
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.kind} {self.object_id} ({self.status}, {self.deleted}/{self.total})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='deletion_status_idx'),
+            models.Index(fields=['kind', 'object_id'], name='deletion_object_idx'),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    Report generated by the run_report_jobs worker (see report_jobs.py) into a
+    file under MEDIA_ROOT, downloaded once done until it expires.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
+
+    report = models.CharField(max_length=32)
+    format = models.CharField(max_length=8)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=8, default=QUEUED)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    # Runs started so far, a failed run is retried after a delay until MAX_ATTEMPTS
+    attempts = models.SmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, default='')
+    result = models.FileField(upload_to='reports/', blank=True)
+    rows = models.IntegerField(null=True, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    expires = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Report {self.report}.{self.format} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='report_job_status_idx'),
+            models.Index(fields=['requested_by', 'status'], name='report_job_user_idx'),
+            models.Index(fields=['status', 'expires'], name='report_job_expires_idx'),
+        ]
+
+
+class JobQueue(models.Model):
+    """
+    One row per worker queue, locked with select_for_update() by the worker
+    claiming a job so that the concurrency limit is checked and taken at once
+    (see report_jobs.claim()).
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+
+    def __str__(self):
+        return self.name
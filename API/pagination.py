@@ -0,0 +1,143 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+# Joins the values of the ordering columns in a cursor position
+POSITION_SEPARATOR = '|'
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on indexed columns, so every page is a
+    WHERE key > cursor scan instead of an OFFSET.
+    Clients pick one of the declared orderings with ?ordering=. Orderings on
+    date_creation carry the primary key as a tie-breaker: the cursor position
+    holds both values and pages with date_creation >= d AND (date_creation > d
+    OR pk > p), so rows sharing a timestamp (bulk imports) never make DRF fall
+    back to an offset within a position.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering_query_param = 'ordering'
+    orderings = {}
+    default_ordering = None
+
+    def get_ordering(self, request, queryset, view):
+        requested = request.query_params.get(self.ordering_query_param)
+        if requested in self.orderings:
+            return self.orderings[requested]
+        return self.orderings[self.default_ordering]
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            super(KeysetCursorPagination, self)._get_position_from_instance(instance, (field,)) for field in ordering
+        )
+
+    def _keyset_filter(self, position, reverse):
+        """WHERE clause of the rows after position, in the direction of the cursor"""
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        (first, first_value), *tie_breaker = zip(self.ordering, values)
+        # Test for: (cursor reversed) XOR (column reversed)
+        lookup = 'lt' if reverse != first.startswith('-') else 'gt'
+        first = first.lstrip('-')
+        if not tie_breaker:
+            return Q(**{f'{first}__{lookup}': first_value})
+        (second, second_value), = tie_breaker
+        return Q(**{f'{first}__{lookup}e': first_value}) & (
+            Q(**{f'{first}__{lookup}': first_value}) | Q(**{f'{second.lstrip("-")}__{lookup}': second_value})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset with the keyset filter above in
+        # place of its filter on the first ordering column
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._keyset_filter(current_position, reverse))
+            except (ValidationError, ValueError):
+                # A position whose values don't parse as the ordering columns
+                raise NotFound(self.invalid_cursor_message)
+
+        # One extra row tells whether a page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class UserCursorPagination(KeysetCursorPagination):
+    orderings = {
+        'id_user': ('id_user',),
+        '-id_user': ('-id_user',),
+        'date_creation': ('date_creation', 'id_user'),
+        '-date_creation': ('-date_creation', '-id_user'),
+    }
+    default_ordering = 'id_user'
+
+
+class SalleCursorPagination(KeysetCursorPagination):
+    orderings = {
+        'id_salle': ('id_salle',),
+        '-id_salle': ('-id_salle',),
+        'date_creation': ('date_creation', 'id_salle'),
+        '-date_creation': ('-date_creation', '-id_salle'),
+    }
+    default_ordering = 'id_salle'
+
+
+class UserSalleCursorPagination(KeysetCursorPagination):
+    orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'date_creation': ('date_creation', 'id'),
+        '-date_creation': ('-date_creation', '-id'),
+    }
+    default_ordering = 'id'
@@ -0,0 +1,43 @@
+import codecs
+import csv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser backed by orjson when it is installed and the body is UTF-8"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class CSVParser(BaseParser):
+    """Parses a text/csv body with a header row into a list of dicts"""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return read_csv(stream, encoding)
+
+
+def read_csv(stream, encoding='utf-8'):
+    try:
+        reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+        return [dict(row) for row in reader]
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ParseError(f'CSV parse error - {exc}')
@@ -0,0 +1,66 @@
+"""
+Permission classes of the admin endpoints.
+
+IsAdmin lets in every admin, IsFullAdmin only the admins without a salle scope.
+Both decide before the view reads anything: for a scoped admin the user and
+salle ids of the URL (the view's scope_kwargs) are looked up in the admin's
+access index (access.py), and an id out of reach answers 404 as if it did not
+exist. The methods in the view's full_admin_methods are refused to scoped admins.
+
+A non-admin is refused with the view's admin_message when it has one, and
+IsRegularUser refuses admins the same way (the user dashboard).
+"""
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import BasePermission
+
+from . import access
+
+
+class IsAdmin(BasePermission):
+    message = "Only admin users can access this endpoint"
+    scoped_message = "Admins limited to some salles can't do this"
+    allows_scoped = True
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated and user.is_admin):
+            self.message = getattr(view, 'admin_message', self.message)
+            return False
+        if not user.is_scoped_admin:
+            return True
+        if not self.allows_scoped or request.method in getattr(view, 'full_admin_methods', ()):
+            self.message = self.scoped_message
+            return False
+        user_access = access.get(user)
+        for kwarg, kind in getattr(view, 'scope_kwargs', {}).items():
+            if kwarg in view.kwargs and not user_access.allows(kind, view.kwargs[kwarg]):
+                raise NotFound()
+        return True
+
+
+class IsFullAdmin(IsAdmin):
+    allows_scoped = False
+
+
+class IsRegularUser(BasePermission):
+    message = "Admins have their own dashboard"
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        if user.is_admin:
+            self.message = getattr(view, 'admin_message', self.message)
+            return False
+        return True
+
+
+def check_access(user, kind, ids):
+    """Refuse ids of a request body that are out of a scoped admin's reach"""
+    user_access = access.get(user)
+    if user_access is None:
+        return
+    missing = user_access.missing(kind, ids)
+    if missing:
+        label = 'Users' if kind == access.USER else 'Salles'
+        raise PermissionDenied(f"{label} out of your scope: {sorted(missing)}")
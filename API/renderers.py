@@ -0,0 +1,60 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import track_serialization
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed, falling back to the
+    stdlib encoder otherwise and for the cases orjson can't reproduce
+    (indented output for the browsable API, ASCII-only or non-compact JSON).
+    Datetimes and other non-native types still go through DRF's JSONEncoder,
+    so the output is identical to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which the stdlib encoder handles
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, for JavaScript compatibility
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class StreamingExportRenderer(FastJSONRenderer):
+    """
+    Lets content negotiation (Accept header or ?format=) select an export format.
+    Successful exports are StreamingHttpResponses and never reach render(),
+    so only error payloads are rendered here, as JSON.
+    """
+    charset = 'utf-8'
+
+
+class CSVExportRenderer(StreamingExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONExportRenderer(StreamingExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
@@ -0,0 +1,209 @@
+"""
+Reports too large for a request, generated by a worker into stored files.
+
+A client submits a ReportJob (AdminReportJobListView), polls it and downloads
+the file once it is done. The run_report_jobs management command claims the
+queued jobs oldest first, at most API_REPORT_JOBS['MAX_RUNNING'] at a time
+across workers, and writes the file through the default storage (MEDIA_ROOT).
+A run that fails is retried after RETRY_DELAY seconds, doubled every time, up
+to MAX_ATTEMPTS runs; a running job whose worker stops beating for STALE_AFTER
+seconds is claimed again. Files are deleted RESULT_TTL seconds after the job is
+done (expire()).
+
+Table reports hold what the list endpoints return: rows are read from the
+replica in keyset chunks (exports.iter_chunks) and rendered by the fast
+serializers of those endpoints, so an ndjson line is the JSON of the list item.
+CSV files flatten the nested relations into relation.field columns.
+"""
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import exports, routers
+from .fast_serializers import DateTimeFormatter, FastUserSerializer, FastSalleSerializer, FastUserSalleListSerializer
+from .filters import filter_users_by_role
+from .models import User, Salle, User_Salle, ReportJob, JobQueue
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+# Rows written between two heartbeats
+HEARTBEAT_ROWS = 10000
+# JobQueue row locked by claim()
+QUEUE = 'report-jobs'
+
+
+def _setting(name, default):
+    return getattr(settings, 'API_REPORT_JOBS', {}).get(name, default)
+
+
+def _columns(serializer_class):
+    """Output fields of the serializer, a nested field as (relation, field)"""
+    columns = []
+    for name, path in serializer_class.paths.items():
+        if isinstance(path, str):
+            columns.append((name,))
+        else:
+            columns.extend((name, nested) for nested in path[1])
+    return columns
+
+
+def _table(model, serializer_class, filter_queryset=None):
+    def build(params):
+        queryset = model.objects.all()
+        if filter_queryset is not None:
+            queryset = filter_queryset(queryset, params)
+        pk_name = model._meta.pk.name
+        queryset = serializer_class.project(queryset.using(routers.read_alias()).order_by(pk_name))
+        chunks = exports.iter_chunks(queryset, serializer_class.values.index(pk_name),
+                                     getattr(settings, 'API_EXPORT_CHUNK_SIZE', 2000))
+        return _columns(serializer_class), (record for rows in chunks for record in serializer_class(rows).data)
+    return build
+
+
+ADMIN_ACTIVITY_COLUMNS = ['id_user', 'name', 'email', 'is_active', 'last_login', 'date_creation',
+                          'users_created', 'salles_created', 'links_created']
+
+
+def _admin_activity(params):
+    """One row per admin with what they created, counted with one GROUP BY per table"""
+    alias = routers.read_alias()
+    created = {}
+    for position, model in enumerate((User, Salle, User_Salle)):
+        counts = (model.objects.using(alias).filter(admin_creator__isnull=False)
+                  .values_list('admin_creator_id').annotate(count=Count('pk')).order_by())
+        for id_admin, count in counts:
+            created.setdefault(id_admin, [0, 0, 0])[position] = count
+    admins = (User.objects.using(alias).filter(Q(is_admin=True) | Q(pk__in=list(created))).order_by('pk')
+              .values_list('id_user', 'name', 'email', 'is_active', 'last_login', 'date_creation'))
+    format_datetime = DateTimeFormatter()
+
+    def records():
+        for id_user, name, email, is_active, last_login, date_creation in admins.iterator():
+            record = {'id_user': id_user, 'name': name, 'email': email, 'is_active': is_active,
+                      'last_login': format_datetime(last_login), 'date_creation': format_datetime(date_creation)}
+            record.update(zip(ADMIN_ACTIVITY_COLUMNS[6:], created.get(id_user, (0, 0, 0))))
+            yield record
+    return [(name,) for name in ADMIN_ACTIVITY_COLUMNS], records()
+
+
+# report -> params -> (columns, records), a record being the JSON object of a row
+REPORTS = {
+    'users': _table(User, FastUserSerializer,
+                    lambda queryset, params: filter_users_by_role(queryset, params.get('role'))),
+    'salles': _table(Salle, FastSalleSerializer),
+    'membership': _table(User_Salle, FastUserSalleListSerializer),
+    'admin-activity': _admin_activity,
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def submit(user, report, format='csv', params=None):
+    """Queue a report for the user, raises QueueFull past MAX_QUEUED_PER_USER unfinished jobs"""
+    unfinished = ReportJob.objects.filter(requested_by=user, status__in=(ReportJob.QUEUED, ReportJob.RUNNING))
+    if unfinished.count() >= _setting('MAX_QUEUED_PER_USER', 5):
+        raise QueueFull(user.pk)
+    return ReportJob.objects.create(requested_by=user, report=report, format=format, params=params or {})
+
+
+def claim():
+    """Take the oldest due job, unless MAX_RUNNING jobs are running already"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('STALE_AFTER', 600))
+    with transaction.atomic():
+        # Workers claim one at a time, else two of them could count the same
+        # running jobs and both start one. Locked first, so that the count
+        # below (the first consistent read of the transaction under REPEATABLE
+        # READ) sees the jobs claimed by the worker that held the lock before.
+        JobQueue.objects.select_for_update().get_or_create(name=QUEUE)
+        running = ReportJob.objects.filter(status=ReportJob.RUNNING, heartbeat__gte=stale).count()
+        if running >= _setting('MAX_RUNNING', 2):
+            return None
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ReportJob.QUEUED, run_after__lte=now) | Q(status=ReportJob.RUNNING, heartbeat__lt=stale))
+            .order_by('id').first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.RUNNING
+        job.attempts += 1
+        job.started = job.heartbeat = now
+        job.save(update_fields=['status', 'attempts', 'started', 'heartbeat'])
+    return job
+
+
+def _write(job, destination):
+    columns, records = REPORTS[job.report](job.params)
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            yield record
+            count += 1
+            if count % HEARTBEAT_ROWS == 0:
+                ReportJob.objects.filter(pk=job.pk).update(heartbeat=timezone.now())
+
+    if job.format == 'ndjson':
+        lines = (json.dumps(record) + '\n' for record in counted(records))
+    else:
+        lines = exports.csv_lines(['.'.join(column) for column in columns],
+                                  (_flatten(record, columns) for record in counted(records)))
+    for line in lines:
+        destination.write(line.encode())
+    return count
+
+
+def _flatten(record, columns):
+    row = []
+    for column in columns:
+        value = record[column[0]]
+        if len(column) == 2:
+            value = None if value is None else value[column[1]]
+        row.append(value)
+    return row
+
+
+def run(job):
+    """Generate the file of a claimed job; a failure queues it again until MAX_ATTEMPTS"""
+    try:
+        with tempfile.TemporaryFile() as temporary, routers.use_replica():
+            rows = _write(job, temporary)
+            temporary.seek(0)
+            job.result.save(f'{job.report}-{job.pk}.{job.format}', File(temporary), save=False)
+    except Exception as error:
+        logger.exception('Report job %s failed (attempt %s)', job.pk, job.attempts)
+        job.error = str(error)
+        if job.attempts < _setting('MAX_ATTEMPTS', 3):
+            job.status = ReportJob.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=_setting('RETRY_DELAY', 30) * 2 ** (job.attempts - 1))
+        else:
+            job.status = ReportJob.FAILED
+            job.finished = timezone.now()
+    else:
+        job.status, job.error, job.rows, job.size = ReportJob.DONE, '', rows, job.result.size
+        job.finished = timezone.now()
+        job.expires = job.finished + timedelta(seconds=_setting('RESULT_TTL', 86400))
+    job.save()
+    return job
+
+
+def expire():
+    """Delete the files of the done jobs past their expiry, returns how many"""
+    expired = list(ReportJob.objects.filter(status=ReportJob.DONE, expires__lte=timezone.now()))
+    for job in expired:
+        job.result.delete(save=False)
+        job.status = ReportJob.EXPIRED
+        job.save(update_fields=['status', 'result'])
+    return len(expired)
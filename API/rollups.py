@@ -0,0 +1,185 @@
+"""
+Pre-aggregated time-series counts for the report endpoints.
+
+Every User, Salle and User_Salle row is counted in one day bucket and one
+week bucket (weeks start on Monday) of its date_creation, in the current time
+zone, per dimension: the admin_creator for users and salles, the salle for
+links. The buckets are adjusted in the same transaction as the write by the
+receivers in signals.py, so they always describe the rows that currently
+exist; rebuild() (see the rebuild_rollups management command) recomputes
+them from the base tables.
+
+A delete through Django's collector sends a post_delete per row, which would
+cost an UPDATE per deleted link. Inside batched() the deltas are summed and
+written once per bucket at the end of the block.
+"""
+import contextlib
+import contextvars
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import User, Salle, User_Salle, ReportRollup
+
+# metric -> (model, dimension attribute)
+METRICS = {
+    'users': (User, 'admin_creator_id'),
+    'salles': (Salle, 'admin_creator_id'),
+    'links': (User_Salle, 'id_salle_id'),
+}
+PERIODS = ('day', 'week')
+NO_DIMENSION = 0
+
+# {metric: deltas} of the current batched() block
+_batch = contextvars.ContextVar('api_rollup_batch', default=None)
+
+
+def bucket_start(value, period):
+    """First day of the bucket holding a datetime (or date)"""
+    day = timezone.localdate(value) if hasattr(value, 'hour') else value
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def _deltas(metric, instances, sign):
+    _, attribute = METRICS[metric]
+    deltas = Counter()
+    for instance in instances:
+        dimension = getattr(instance, attribute) or NO_DIMENSION
+        for period in PERIODS:
+            deltas[period, dimension, bucket_start(instance.date_creation, period)] += sign
+    return deltas
+
+
+def _apply(metric, deltas):
+    for (period, dimension, bucket), delta in deltas.items():
+        if not delta:
+            continue
+        rows = ReportRollup.objects.filter(metric=metric, period=period, dimension=dimension, bucket=bucket)
+        if rows.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ReportRollup.objects.create(
+                    metric=metric, period=period, dimension=dimension, bucket=bucket, count=delta,
+                )
+        except IntegrityError:
+            # A concurrent write created the bucket first
+            rows.update(count=F('count') + delta)
+
+
+def record(metric, instances, sign=1):
+    """Count created (sign=1) or deleted (sign=-1) rows in their buckets"""
+    deltas = _deltas(metric, instances, sign)
+    pending = _batch.get()
+    if pending is None:
+        _apply(metric, deltas)
+    else:
+        pending.setdefault(metric, Counter()).update(deltas)
+
+
+@contextlib.contextmanager
+def batched():
+    """
+    Sum what record() gets in the block and write it when the block exits.
+    Open it inside the transaction of the writes, so the buckets still roll back
+    with them; nested blocks join the outer one.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    pending = {}
+    token = _batch.set(pending)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    for metric, deltas in pending.items():
+        _apply(metric, deltas)
+
+
+def merge_dimension(metric, dimension, into=NO_DIMENSION):
+    """
+    Move the buckets of a dimension onto another one, e.g. the users of an
+    admin once on_delete=SET_NULL has cleared their admin_creator
+    """
+    pending = _batch.get()
+    if pending is not None and metric in pending:
+        # The buckets to move must include the deltas batched so far
+        _apply(metric, pending.pop(metric))
+    rows = ReportRollup.objects.filter(metric=metric, dimension=dimension)
+    deltas = Counter({
+        (period, into, bucket): count
+        for period, bucket, count in rows.values_list('period', 'bucket', 'count')
+    })
+    rows.delete()
+    _apply(metric, deltas)
+
+
+def rebuild(metrics=None, chunk_size=5000):
+    """
+    Recompute the buckets of the given metrics (all by default) from the base
+    tables, walking each table by primary key. Returns {metric: rows written}.
+    """
+    written = {}
+    for metric in metrics or METRICS:
+        model, attribute = METRICS[metric]
+        pk_name = model._meta.pk.attname
+        counts = Counter()
+        last_pk = None
+        while True:
+            queryset = model.objects.order_by(pk_name)
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            chunk = list(queryset.values_list(pk_name, 'date_creation', attribute)[:chunk_size])
+            if not chunk:
+                break
+            for _, date_creation, dimension in chunk:
+                for period in PERIODS:
+                    counts[period, dimension or NO_DIMENSION, bucket_start(date_creation, period)] += 1
+            last_pk = chunk[-1][0]
+
+        with transaction.atomic():
+            ReportRollup.objects.filter(metric=metric).delete()
+            ReportRollup.objects.bulk_create(
+                [ReportRollup(metric=metric, period=period, dimension=dimension, bucket=bucket, count=count)
+                 for (period, dimension, bucket), count in counts.items()],
+                batch_size=chunk_size,
+            )
+        written[metric] = len(counts)
+    return written
+
+
+def series(metric, period, start=None, end=None, dimension=None, cumulative=False):
+    """
+    {dimension: [(bucket, count), ...]} for the buckets between start and end,
+    both rounded down to their bucket. Buckets without rows are left out.
+    With cumulative=True each count is the running total of every earlier bucket,
+    including the ones before start.
+    """
+    rows = ReportRollup.objects.filter(metric=metric, period=period).exclude(count=0)
+    if dimension is not None:
+        rows = rows.filter(dimension=dimension)
+
+    totals = Counter()
+    if start is not None:
+        start = bucket_start(start, period)
+        if cumulative:
+            totals.update(dict(
+                rows.filter(bucket__lt=start).order_by().values_list('dimension').annotate(Sum('count'))
+            ))
+        rows = rows.filter(bucket__gte=start)
+    if end is not None:
+        rows = rows.filter(bucket__lte=bucket_start(end, period))
+
+    result = {}
+    for dimension, bucket, count in rows.order_by('dimension', 'bucket').values_list('dimension', 'bucket', 'count'):
+        if cumulative:
+            totals[dimension] += count
+            count = totals[dimension]
+        result.setdefault(dimension, []).append((bucket, count))
+    return result
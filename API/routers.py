@@ -0,0 +1,83 @@
+"""
+Read-replica routing.
+
+Reads go to the primary unless the code runs inside use_replica(), which the
+read-only views (ReplicaReadMixin in mixins.py) and the dashboard statistics
+enter. Inside it every read of the request uses the same replica, picked from
+settings.API_READ_REPLICAS, until the block writes anything: from then on it
+reads its own writes from the primary. Writes always go to the primary.
+
+Replicas lag behind the primary, so responses served from them may miss a
+write that committed less than API_READ_REPLICA_MAX_LAG seconds ago.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class _ReadState:
+    __slots__ = ('alias',)
+
+    def __init__(self, alias):
+        self.alias = alias
+
+
+_read_state = ContextVar('api_read_replica', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'API_READ_REPLICAS', []))
+
+
+def max_lag():
+    return getattr(settings, 'API_READ_REPLICA_MAX_LAG', 1)
+
+
+@contextmanager
+def use_replica():
+    """Route the reads made in this block to one replica (no-op without replicas or when nested)"""
+    replicas = get_replicas()
+    if not replicas or _read_state.get() is not None:
+        yield
+        return
+    token = _read_state.set(_ReadState(random.choice(replicas)))
+    try:
+        yield
+    finally:
+        _read_state.reset(token)
+
+
+def read_alias():
+    """Alias the reads of the current context go to"""
+    state = _read_state.get()
+    if state is None or state.alias is None:
+        return DEFAULT_DB_ALIAS
+    return state.alias
+
+
+def reading_from_replica():
+    return read_alias() != DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_state.get() is None:
+            return None
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _read_state.get()
+        if state is not None:
+            # Read your own writes for the rest of the block
+            state.alias = None
+        # Explicit, otherwise instances read from a replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
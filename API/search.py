@@ -0,0 +1,174 @@
+"""
+Prefix search over users (name, email, phone) and salles (name, phone).
+
+Every indexed value is split into lowercase, accent-free words and each word
+contributes its prefixes of MIN_PREFIX to MAX_PREFIX characters as SearchToken
+rows, keeping the best weight per prefix: a match in the name weighs more than
+one in the email or the phone, and a complete word more than a partial one.
+A query word is then an equality lookup on the (kind, prefix) index, and a
+query of several words keeps the objects matching all of them, starting from
+its rarest prefix, ranked by the sum of their weights. The rarest prefix is
+found with bounded counts: a probe stops after PROBE_LIMIT index entries, and
+only when every prefix reaches it are they counted again with a ten times
+higher limit, up to MAX_PROBE_LIMIT. A prefix held by every row ("user" in
+every e-mail address) is then read about as far as the rarest one, not to its
+end.
+
+The rows are rewritten in the same transaction as the object by the receivers
+in signals.py; rebuild() (see the rebuild_search_index management command)
+recomputes them from the tables.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import User, Salle, SearchToken
+
+MIN_PREFIX = 2
+MAX_PREFIX = SearchToken._meta.get_field('prefix').max_length
+# Index entries first read per prefix to find the rarest one, and prefixes probed per query.
+# Past MAX_PROBE_LIMIT entries any of the prefixes makes for a long scan, take the first.
+PROBE_LIMIT = 1000
+MAX_PROBE_LIMIT = 100000
+MAX_PROBES = 4
+
+# kind -> (model, {field: weight})
+INDEXED = {
+    'user': (User, {'name': 4, 'email': 3, 'phone': 2}),
+    'salle': (Salle, {'name': 4, 'phone': 2}),
+}
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def words(value):
+    """Lowercase words of a value with the accents removed"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _WORD.findall(value.lower())
+
+
+def _field_words(field, value):
+    if field == 'phone':
+        # Phone numbers are matched on their digits, whatever the separators
+        digits = ''.join(words(value))
+        return [digits] if digits else []
+    return words(value)
+
+
+def tokens(kind, instance):
+    """{prefix: weight} of an object"""
+    _, fields = INDEXED[kind]
+    weights = {}
+    for field, field_weight in fields.items():
+        for word in _field_words(field, getattr(instance, field)):
+            for length in range(MIN_PREFIX, min(len(word), MAX_PREFIX) + 1):
+                prefix = word[:length]
+                # Complete words rank above partial ones
+                weight = field_weight * 2 + (length == len(word))
+                if weight > weights.get(prefix, 0):
+                    weights[prefix] = weight
+    return weights
+
+
+def _rows(kind, instances):
+    return [
+        SearchToken(kind=kind, object_id=instance.pk, prefix=prefix, weight=weight)
+        for instance in instances
+        for prefix, weight in tokens(kind, instance).items()
+    ]
+
+
+def index(kind, instances, replace=True, batch_size=2000):
+    """Write the rows of the given objects, replacing their current ones unless they were just created"""
+    rows = _rows(kind, instances)
+    if not replace:
+        SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+        return
+    # Joins the transaction of the write without a savepoint: a failure rolls the write back anyway
+    with transaction.atomic(savepoint=False):
+        unindex(kind, [instance.pk for instance in instances])
+        SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def unindex(kind, pks):
+    SearchToken.objects.filter(kind=kind, object_id__in=list(pks)).delete()
+
+
+def rebuild(kinds=None, chunk_size=2000):
+    """Recompute the rows of every user and/or salle, returns {kind: rows written}"""
+    written = {}
+    for kind in kinds or INDEXED:
+        model, fields = INDEXED[kind]
+        with transaction.atomic():
+            SearchToken.objects.filter(kind=kind).delete()
+            written[kind] = 0
+            last_pk = None
+            while True:
+                queryset = model.objects.order_by('pk').only('pk', *fields)
+                if last_pk is not None:
+                    queryset = queryset.filter(pk__gt=last_pk)
+                chunk = list(queryset[:chunk_size])
+                if not chunk:
+                    break
+                rows = _rows(kind, chunk)
+                SearchToken.objects.bulk_create(rows, batch_size=chunk_size)
+                written[kind] += len(rows)
+                last_pk = chunk[-1].pk
+    return written
+
+
+def query_prefixes(query):
+    """Distinct prefixes looked up for a query, words shorter than MIN_PREFIX are ignored"""
+    prefixes = []
+    for word in words(query):
+        prefix = word[:MAX_PREFIX]
+        if len(prefix) >= MIN_PREFIX and prefix not in prefixes:
+            prefixes.append(prefix)
+    return prefixes
+
+
+def _rarest(kind, prefixes):
+    """The prefix of the fewest objects, counted no further than needed; None when one has none"""
+    # The longest prefixes are usually the rarest
+    probed = sorted(prefixes, key=len, reverse=True)[:MAX_PROBES]
+    limit = PROBE_LIMIT
+    while True:
+        frequencies = {}
+        for prefix in probed:
+            frequencies[prefix] = SearchToken.objects.filter(kind=kind, prefix=prefix)[:limit].count()
+            if not frequencies[prefix]:
+                return None
+        rarest = min(probed, key=frequencies.get)
+        if frequencies[rarest] < limit or len(probed) == 1 or limit >= MAX_PROBE_LIMIT:
+            return rarest
+        # Every probe stopped at the limit, count further to tell them apart
+        limit *= 10
+
+
+def search(kind, query, limit=20):
+    """[(object id, score)] of the objects matching every word of the query, best first"""
+    prefixes = query_prefixes(query)
+    if not prefixes:
+        return []
+    matches = SearchToken.objects.filter(kind=kind, prefix__in=prefixes)
+    if len(prefixes) == 1:
+        # Served by the (kind, prefix, weight, object_id) index alone
+        return list(matches.order_by('-weight', 'object_id').values_list('object_id', 'weight')[:limit])
+
+    # Only the objects holding the rarest prefix can match, group those instead of every
+    # object holding a common one
+    rarest = _rarest(kind, prefixes)
+    if rarest is None:
+        return []
+    candidates = SearchToken.objects.filter(kind=kind, prefix=rarest).values('object_id')
+    return list(
+        matches.filter(object_id__in=candidates)
+        .values_list('object_id').order_by()
+        .annotate(matched=Count('pk'), score=Sum('weight'))
+        .filter(matched=len(prefixes))
+        .order_by('-score', 'object_id')
+        .values_list('object_id', 'score')[:limit]
+    )
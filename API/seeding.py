@@ -0,0 +1,106 @@
+"""
+Deterministic dataset generator for benchmarks and local testing.
+
+The same arguments always produce the same rows: names, phones, dates and
+links are drawn from a random.Random seeded with `seed`.
+Rows are written with bulk_create and bypass the model signals, so rebuild
+the cached statistics (reconcile_stats), the report rollups (rebuild_rollups)
+and the search index (rebuild_search_index) after seeding.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+
+DEFAULT_PASSWORD = 'password123'
+EMAIL_DOMAIN = 'seed.example'
+
+# Named dataset sizes for the seed_data command and the benchmarks
+SCALES = {
+    'small': {'admins': 5, 'users': 1000, 'salles': 50, 'links': 3000},
+    '10k': {'admins': 20, 'users': 10000, 'salles': 200, 'links': 30000},
+    '100k': {'admins': 50, 'users': 100000, 'salles': 1000, 'links': 300000},
+    '1m': {'admins': 200, 'users': 1000000, 'salles': 5000, 'links': 3000000},
+}
+
+
+def seed(admins=5, users=1000, salles=50, links=3000, seed=0, batch_size=5000, days=730, stdout=None, apps=None):
+    """
+    Insert admins, users, salles and user-salle links with bulk_create, batch_size
+    rows at a time so that memory stays flat at the 1m scale.
+    Every account gets DEFAULT_PASSWORD (hashed once and shared).
+    Links are spread evenly over the users, each user linked to distinct salles,
+    so `links` is capped at users * salles.
+    apps is the registry of a migration state, to seed an older schema through
+    its historical models (see benchmarks/index_plans.py).
+    """
+    if apps is not None:
+        User, Salle, User_Salle = (apps.get_model('API', name) for name in ('User', 'Salle', 'User_Salle'))
+    else:
+        User, Salle, User_Salle = models.User, models.Salle, models.User_Salle
+    rng = random.Random(seed)
+    now = timezone.now().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    span = int((now - start).total_seconds())
+    password = make_password(DEFAULT_PASSWORD)
+
+    def created_at():
+        return start + timedelta(seconds=rng.randrange(span))
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    def insert(model, count, build):
+        for batch_start in range(0, count, batch_size):
+            model.objects.bulk_create([build(i) for i in range(batch_start, min(count, batch_start + batch_size))])
+
+    with transaction.atomic():
+        insert(User, admins, lambda i: User(
+            email=f'admin{i}@{EMAIL_DOMAIN}', name=f'Admin {i}', phone=f'06{rng.randrange(10**8):08d}',
+            is_admin=True, is_staff=True, password=password, date_creation=created_at(),
+        ))
+        admin_ids = list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}', is_admin=True)
+                         .order_by('id_user').values_list('id_user', flat=True))
+        log(f'{len(admin_ids)} admins')
+
+        insert(User, users, lambda i: User(
+            email=f'user{i}@{EMAIL_DOMAIN}', name=f'User {i}', phone=f'07{rng.randrange(10**8):08d}',
+            is_active=rng.random() > 0.05, password=password, date_creation=created_at(),
+            admin_creator_id=rng.choice(admin_ids) if admin_ids else None,
+        ))
+        user_ids = list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}', is_admin=False)
+                        .order_by('id_user').values_list('id_user', flat=True))
+        log(f'{len(user_ids)} users')
+
+        if not admin_ids:
+            salles = 0
+        insert(Salle, salles, lambda i: Salle(
+            name=f'Salle {i}', phone=f'05{rng.randrange(10**8):08d}', date_creation=created_at(),
+            admin_creator_id=rng.choice(admin_ids),
+        ))
+        salle_ids = list(Salle.objects.order_by('-id_salle').values_list('id_salle', flat=True)[:salles])
+        salle_ids.reverse()
+        log(f'{len(salle_ids)} salles')
+
+        links = min(links, len(user_ids) * len(salle_ids))
+        created_links = 0
+        batch = []
+        for index, id_user in enumerate(user_ids):
+            per_user = links // len(user_ids) + (1 if index < links % len(user_ids) else 0)
+            for id_salle in rng.sample(salle_ids, per_user):
+                batch.append(User_Salle(id_user_id=id_user, id_salle_id=id_salle, date_creation=created_at(),
+                                        admin_creator_id=rng.choice(admin_ids)))
+            if len(batch) >= batch_size:
+                User_Salle.objects.bulk_create(batch)
+                created_links += len(batch)
+                batch = []
+        User_Salle.objects.bulk_create(batch)
+        created_links += len(batch)
+        log(f'{created_links} links')
+
+    return {'admins': len(admin_ids), 'users': len(user_ids), 'salles': len(salle_ids), 'links': created_links}
@@ -1,35 +1,84 @@
+from django.db import models
+from django.urls import reverse
 from rest_framework import serializers
-from django.contrib.auth import authenticate
-from .models import User, Salle, User_Salle
+from . import deletions, fieldsets, report_jobs, stats
+from .models import User, Salle, User_Salle, DeletionJob, ReportJob
+from .search import MIN_PREFIX, query_prefixes
+
+
+class NormalizedEmailField(serializers.EmailField):
+    """Email as User.objects.normalize_email() stores it, already when the uniqueness check runs"""
+
+    def to_internal_value(self, data):
+        return User.objects.normalize_email(super().to_internal_value(data))
+
+
+# Field mapping of the serializers writing users
+USER_FIELD_MAPPING = {**serializers.ModelSerializer.serializer_field_mapping, models.EmailField: NormalizedEmailField}
+
+
+class QueryPlanMixin:
+    """
+    Lets a serializer declare the relations it reads so views can fetch them
+    up front with select_related()/only() instead of one SELECT per row.
+    related_projections maps a foreign key to the fields read from the related row.
+    Given a sparse fieldset (fieldsets.py) as context['fieldset'], the serializer
+    and the plan keep only the selected fields, and the relations that are not
+    expanded become primary keys.
+    """
+    related_projections = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get('fieldset')
+        if fieldset is not None:
+            for name in [name for name, field in self.fields.items()
+                         if name not in fieldset.fields and not field.write_only]:
+                del self.fields[name]
+            for relation in self.related_projections:
+                if relation in self.fields and not fieldset.expanded(relation):
+                    # Rendered from the foreign key column, without reading the related row
+                    self.fields[relation] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    @classmethod
+    def get_fieldset(cls, request):
+        readable = [name for name in cls.Meta.fields
+                    if not getattr(cls._declared_fields.get(name), 'write_only', False)]
+        return fieldsets.from_request(request, readable, list(cls.related_projections))
+
+    @classmethod
+    def get_only_fields(cls, fieldset=None):
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        selected = cls.Meta.fields if fieldset is None else fieldset.fields
+        only = [name for name in selected if name in concrete]
+        for relation, related_fields in cls.related_projections.items():
+            if fieldset is not None and relation not in fieldset.fields:
+                continue
+            if relation not in only:
+                only.append(relation)
+            if fieldset is None or fieldset.expanded(relation):
+                only.extend(f'{relation}__{name}' for name in related_fields)
+        return only
+
+    @classmethod
+    def setup_queryset(cls, queryset, fieldset=None):
+        joined = [relation for relation in cls.related_projections
+                  if fieldset is None or (relation in fieldset.fields and fieldset.expanded(relation))]
+        if joined:
+            queryset = queryset.select_related(*joined)
+        return queryset.only(*cls.get_only_fields(fieldset))
+
 
 class LoginSerializer(serializers.Serializer):
+    """Login credentials; they are checked by logins.verify_credentials() in the async login view"""
     email = serializers.EmailField()
     password = serializers.CharField(style={'input_type': 'password'})
 
-    def validate(self, data):
-        email = data.get('email')
-        password = data.get('password')
-
-        if email and password:
-            # Since USERNAME_FIELD = 'email', Django will look up the user by email,
-            # but authenticate() expects the parameter to be named 'username'
-            user = authenticate(request=self.context.get('request'), 
-                               username=email,  # Using 'username' parameter which maps to email
-                               password=password)
-            
-            if not user:
-                raise serializers.ValidationError('Unable to log in with provided credentials.')
-            if not user.is_active:
-                raise serializers.ValidationError('User account is disabled.')
-        else:
-            raise serializers.ValidationError('Must include "email" and "password".')
-
-        data['user'] = user
-        return data
-
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(QueryPlanMixin, serializers.ModelSerializer):
     admin_creator = serializers.SerializerMethodField()
+    related_projections = {'admin_creator': ('id_user', 'name')}
     
     class Meta:
         model = User
@@ -47,11 +96,18 @@ class UserSerializer(serializers.ModelSerializer):
 
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
+    serializer_field_mapping = USER_FIELD_MAPPING
     
     class Meta:
         model = User
         fields = ['id_user', 'email', 'name', 'phone', 'password', 'is_admin']
         read_only_fields = ['id_user']  # Make id_user read-only
+
+    def validate_is_admin(self, value):
+        request = self.context.get('request')
+        if value and request is not None and request.user.is_scoped_admin:
+            raise serializers.ValidationError("Admins limited to some salles can't create admins.")
+        return value
     
     def create(self, validated_data):
         # Get the admin user who is creating this account
@@ -76,9 +132,18 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return representation
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserImportSerializer(UserCreateSerializer):
+    """Validates one row of a bulk import; email uniqueness is checked for the whole batch in bulk.py"""
+
+    class Meta(UserCreateSerializer.Meta):
+        extra_kwargs = {'email': {'validators': []}}
+
+
+class UserUpdateSerializer(QueryPlanMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False, style={'input_type': 'password'})
     admin_creator = serializers.SerializerMethodField()
+    related_projections = {'admin_creator': ('id_user', 'name')}
+    serializer_field_mapping = USER_FIELD_MAPPING
     
     class Meta:
         model = User
@@ -92,6 +157,12 @@ class UserUpdateSerializer(serializers.ModelSerializer):
                 'name': obj.admin_creator.name
             }
         return None
+
+    def validate_is_admin(self, value):
+        request = self.context.get('request')
+        if value and request is not None and request.user.is_scoped_admin:
+            raise serializers.ValidationError("Admins limited to some salles can't grant admin rights.")
+        return value
     
     def update(self, instance, validated_data):
         # Handle password separately
@@ -107,8 +178,9 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         return instance
     
 
-class SalleSerializer(serializers.ModelSerializer):
+class SalleSerializer(QueryPlanMixin, serializers.ModelSerializer):
     admin_creator = serializers.SerializerMethodField()
+    related_projections = {'admin_creator': ('id_user', 'name')}
     
     class Meta:
         model = Salle
@@ -124,6 +196,17 @@ class SalleSerializer(serializers.ModelSerializer):
         return None
 
 
+class SalleDetailSerializer(SalleSerializer):
+    """SalleSerializer plus the number of links of the salle, read from the dashboard counters (stats.py)"""
+    link_count = serializers.SerializerMethodField()
+
+    class Meta(SalleSerializer.Meta):
+        fields = SalleSerializer.Meta.fields + ['link_count']
+
+    def get_link_count(self, obj):
+        return stats.get_salle_link_count(obj.pk)
+
+
 class SalleCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Salle
@@ -157,6 +240,8 @@ class UserSalleLinkSerializer(serializers.ModelSerializer):
         # Check if the link already exists
         if User_Salle.objects.filter(id_user=data['id_user'], id_salle=data['id_salle']).exists():
             raise serializers.ValidationError("This user is already linked to this salle.")
+        if deletions.pending_ids('user', [data['id_user'].pk]) or deletions.pending_ids('salle', [data['id_salle'].pk]):
+            raise serializers.ValidationError("This user or salle is being deleted.")
         return data
     
     def create(self, validated_data):
@@ -172,10 +257,159 @@ class UserSalleLinkSerializer(serializers.ModelSerializer):
         return link
 
 
-class UserSalleListSerializer(serializers.ModelSerializer):
+class UserSalleBulkLinkSerializer(serializers.Serializer):
+    """Many users x many salles, used to link or unlink them all in one request"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    salle_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_user_ids(self, value):
+        value = list(dict.fromkeys(value))
+        found = set(User.objects.filter(id_user__in=value).values_list('id_user', flat=True))
+        missing = [id_user for id_user in value if id_user not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown users: {missing}")
+        return value
+
+    def validate_salle_ids(self, value):
+        value = list(dict.fromkeys(value))
+        found = set(Salle.objects.filter(id_salle__in=value).values_list('id_salle', flat=True))
+        missing = [id_salle for id_salle in value if id_salle not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown salles: {missing}")
+        return value
+
+    def validate(self, data):
+        max_pairs = self.context.get('max_pairs')
+        if max_pairs and len(data['user_ids']) * len(data['salle_ids']) > max_pairs:
+            raise serializers.ValidationError(f"Cannot link more than {max_pairs} user-salle pairs at once.")
+        pending = deletions.pending_ids('user', data['user_ids'])
+        if pending:
+            raise serializers.ValidationError(f"Users being deleted: {sorted(pending)}")
+        pending = deletions.pending_ids('salle', data['salle_ids'])
+        if pending:
+            raise serializers.ValidationError(f"Salles being deleted: {sorted(pending)}")
+        return data
+
+
+class AdminScopeSerializer(serializers.Serializer):
+    """Whether an admin is limited to some salles, and which (see access.py)"""
+    is_scoped_admin = serializers.BooleanField()
+    salle_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=True)
+
+    def validate_salle_ids(self, value):
+        value = list(dict.fromkeys(value))
+        found = set(Salle.objects.filter(id_salle__in=value).values_list('id_salle', flat=True))
+        missing = [id_salle for id_salle in value if id_salle not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown salles: {missing}")
+        return value
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'kind', 'object_id', 'status', 'attempts', 'total', 'deleted', 'progress',
+                  'error', 'created', 'started', 'finished']
+
+    def get_progress(self, obj):
+        """Share of the dependent rows deleted, from 0 to 1"""
+        if obj.status == DeletionJob.DONE:
+            return 1.0
+        if not obj.total:
+            return 0.0
+        return round(min(obj.deleted / obj.total, 1.0), 4)
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'report', 'format', 'params', 'status', 'attempts', 'error', 'rows', 'size',
+                  'created', 'started', 'finished', 'expires', 'download']
+
+    def get_download(self, obj):
+        if obj.status != ReportJob.DONE or 'request' not in self.context:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('admin-report-job-download', kwargs={'id': obj.pk})
+        )
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """A report to queue, see report_jobs.REPORTS"""
+    report = serializers.ChoiceField(choices=list(report_jobs.REPORTS))
+    format = serializers.ChoiceField(choices=report_jobs.FORMATS, default='csv')
+    # Only the users report takes one, as the user export's ?role=
+    role = serializers.ChoiceField(choices=['admin', 'user'], required=False)
+
+    def validate(self, data):
+        if 'role' in data and data['report'] != 'users':
+            raise serializers.ValidationError("role only applies to the users report.")
+        return data
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    """Query parameters of the report endpoints"""
+    period = serializers.ChoiceField(choices=['day', 'week'], default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    dimension = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("start must be before end.")
+        return data
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Query parameters of the search endpoint"""
+    q = serializers.CharField(max_length=200)
+    type = serializers.ChoiceField(choices=['user', 'salle', 'all'], default='all')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate_q(self, value):
+        if not query_prefixes(value):
+            raise serializers.ValidationError(f"Enter at least one word of {MIN_PREFIX} characters or more.")
+        return value
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    """Query parameters of the changes endpoint"""
+    since = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """One sub-request of a batch"""
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False, allow_null=True)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    concurrent = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        max_requests = self.context.get('max_requests')
+        if max_requests and len(value) > max_requests:
+            raise serializers.ValidationError(f"Cannot run more than {max_requests} requests in one batch.")
+        return value
+
+
+class UserSalleListSerializer(QueryPlanMixin, serializers.ModelSerializer):
     admin_creator = serializers.SerializerMethodField()
     id_user = serializers.SerializerMethodField()
     id_salle = serializers.SerializerMethodField()
+    related_projections = {
+        'admin_creator': ('id_user', 'name'),
+        'id_user': ('id_user', 'name'),
+        'id_salle': ('id_salle', 'name'),
+    }
     
     class Meta:
         model = User_Salle
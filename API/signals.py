@@ -0,0 +1,378 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from . import access, changes, logins, membership, rollups, search, stats, versions
+from .authentication import invalidate_token
+from .models import User, Salle, User_Salle, ManagedSalle, Change
+
+
+# Sent by bulk.py after bulk_create(), which bypasses post_save.
+# Receives sender (the model) and instances (the created objects, with primary keys set).
+post_bulk_create = Signal()
+
+# Sent by deletions.py after deleting rows in batches, skipping the per-row post_delete.
+# Receives sender (the model) and instances (the deleted objects, primary keys still set).
+post_bulk_delete = Signal()
+
+
+# Dashboard counters: adjust after the transaction commits so rolled back writes don't count
+
+@receiver(pre_save, sender=User)
+def remember_user_flags(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {'is_admin', 'is_active'} & set(update_fields):
+        return
+    instance._stats_previous = (
+        User.objects.filter(pk=instance.pk).values_list('is_admin', 'is_active').first()
+    )
+
+
+@receiver(post_save, sender=User)
+def count_saved_user(sender, instance, created, **kwargs):
+    if created:
+        deltas = stats.user_deltas(instance.is_admin, instance.is_active)
+    else:
+        previous = instance.__dict__.pop('_stats_previous', None)
+        if previous is None:
+            return
+        deltas = stats.user_deltas(*previous, sign=-1)
+        for name, delta in stats.user_deltas(instance.is_admin, instance.is_active).items():
+            deltas[name] = deltas.get(name, 0) + delta
+    transaction.on_commit(lambda: stats.adjust(**deltas))
+
+
+@receiver(post_bulk_create, sender=User)
+def count_bulk_created_users(sender, instances, **kwargs):
+    deltas = {}
+    for user in instances:
+        for name, delta in stats.user_deltas(user.is_admin, user.is_active).items():
+            deltas[name] = deltas.get(name, 0) + delta
+    transaction.on_commit(lambda: stats.adjust(**deltas))
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    deltas = stats.user_deltas(instance.is_admin, instance.is_active, sign=-1)
+    transaction.on_commit(lambda: stats.adjust(**deltas))
+
+
+@receiver(post_save, sender=Salle)
+def count_saved_salle(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: stats.adjust(total_gyms=1))
+
+
+@receiver(post_delete, sender=Salle)
+def count_deleted_salle(sender, instance, **kwargs):
+    id_salle = instance.pk
+
+    def forget():
+        stats.adjust(total_gyms=-1)
+        stats.forget_salle(id_salle)
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=User_Salle)
+def count_saved_link(sender, instance, created, **kwargs):
+    if created:
+        id_salle = instance.id_salle_id
+        transaction.on_commit(lambda: stats.adjust_salle_links(id_salle, 1))
+
+
+@receiver(post_bulk_create, sender=User_Salle)
+def count_bulk_created_links(sender, instances, **kwargs):
+    per_salle = {}
+    for link in instances:
+        per_salle[link.id_salle_id] = per_salle.get(link.id_salle_id, 0) + 1
+
+    def adjust():
+        for id_salle, delta in per_salle.items():
+            stats.adjust_salle_links(id_salle, delta)
+    transaction.on_commit(adjust)
+
+
+@receiver(post_delete, sender=User_Salle)
+def count_deleted_link(sender, instance, **kwargs):
+    id_salle = instance.id_salle_id
+    transaction.on_commit(lambda: stats.adjust_salle_links(id_salle, -1))
+
+
+@receiver(post_bulk_delete, sender=User_Salle)
+def count_bulk_deleted_links(sender, instances, **kwargs):
+    per_salle = {}
+    for link in instances:
+        per_salle[link.id_salle_id] = per_salle.get(link.id_salle_id, 0) - 1
+
+    def adjust():
+        for id_salle, delta in per_salle.items():
+            stats.adjust_salle_links(id_salle, delta)
+    transaction.on_commit(adjust)
+
+
+# Report rollups: written in the same transaction, so they roll back with the rows
+
+@receiver(post_save, sender=User)
+def roll_up_saved_user(sender, instance, created, **kwargs):
+    if created:
+        rollups.record('users', [instance])
+
+
+@receiver(post_bulk_create, sender=User)
+def roll_up_bulk_created_users(sender, instances, **kwargs):
+    rollups.record('users', instances)
+
+
+@receiver(post_delete, sender=User)
+def roll_up_deleted_user(sender, instance, **kwargs):
+    rollups.record('users', [instance], sign=-1)
+    if instance.is_admin:
+        # on_delete=SET_NULL cleared the admin_creator of the users this admin created
+        rollups.merge_dimension('users', instance.pk)
+
+
+@receiver(post_save, sender=Salle)
+def roll_up_saved_salle(sender, instance, created, **kwargs):
+    if created:
+        rollups.record('salles', [instance])
+
+
+@receiver(post_delete, sender=Salle)
+def roll_up_deleted_salle(sender, instance, **kwargs):
+    rollups.record('salles', [instance], sign=-1)
+
+
+@receiver(post_save, sender=User_Salle)
+def roll_up_saved_link(sender, instance, created, **kwargs):
+    if created:
+        rollups.record('links', [instance])
+
+
+@receiver(post_bulk_create, sender=User_Salle)
+def roll_up_bulk_created_links(sender, instances, **kwargs):
+    rollups.record('links', instances)
+
+
+@receiver(post_delete, sender=User_Salle)
+def roll_up_deleted_link(sender, instance, **kwargs):
+    rollups.record('links', [instance], sign=-1)
+
+
+@receiver(post_bulk_delete, sender=User_Salle)
+def roll_up_bulk_deleted_links(sender, instances, **kwargs):
+    rollups.record('links', instances, sign=-1)
+
+
+# Token authentication cache, evicted once the write is committed: a request
+# racing the transaction would otherwise cache the old row again for the TTL
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    key, id_user = instance.key, instance.user_id
+
+    def forget():
+        invalidate_token(key)
+        logins.forget_user_token(id_user)
+        # The token keys other processes cached at login are stamped with it
+        versions.touch(Token)
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    id_user = instance.pk
+
+    def forget():
+        for key in Token.objects.filter(user_id=id_user).values_list('key', flat=True):
+            invalidate_token(key)
+    transaction.on_commit(forget)
+
+
+# Membership adjacency index, patched once the link writes commit
+
+@receiver(post_save, sender=User_Salle)
+def index_saved_link(sender, instance, created, **kwargs):
+    if created:
+        pairs = [(instance.id_user_id, instance.id_salle_id)]
+        transaction.on_commit(lambda: membership.apply_links(pairs, added=True))
+
+
+@receiver(post_bulk_create, sender=User_Salle)
+def index_bulk_created_links(sender, instances, **kwargs):
+    pairs = [(link.id_user_id, link.id_salle_id) for link in instances]
+    transaction.on_commit(lambda: membership.apply_links(pairs, added=True))
+
+
+@receiver(post_delete, sender=User_Salle)
+def unindex_deleted_link(sender, instance, **kwargs):
+    pairs = [(instance.id_user_id, instance.id_salle_id)]
+    transaction.on_commit(lambda: membership.apply_links(pairs, added=False))
+
+
+@receiver(post_bulk_delete, sender=User_Salle)
+def unindex_bulk_deleted_links(sender, instances, **kwargs):
+    pairs = [(link.id_user_id, link.id_salle_id) for link in instances]
+    transaction.on_commit(lambda: membership.apply_links(pairs, added=False))
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    id_user = instance.pk
+    transaction.on_commit(lambda: membership.forget(membership.USER, id_user))
+
+
+@receiver(post_delete, sender=Salle)
+def unindex_deleted_salle(sender, instance, **kwargs):
+    id_salle = instance.pk
+    transaction.on_commit(lambda: membership.forget(membership.SALLE, id_salle))
+
+
+# Search prefixes: rewritten in the same transaction, so they roll back with the rows
+
+def _indexed_fields_changed(kind, update_fields):
+    _, fields = search.INDEXED[kind]
+    return update_fields is None or bool(set(fields) & set(update_fields))
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, created, update_fields=None, **kwargs):
+    if created or _indexed_fields_changed('user', update_fields):
+        search.index('user', [instance], replace=not created)
+
+
+@receiver(post_bulk_create, sender=User)
+def index_bulk_created_users(sender, instances, **kwargs):
+    search.index('user', instances, replace=False)
+
+
+@receiver(post_delete, sender=User)
+def unindex_searched_user(sender, instance, **kwargs):
+    search.unindex('user', [instance.pk])
+
+
+@receiver(post_save, sender=Salle)
+def index_saved_salle(sender, instance, created, update_fields=None, **kwargs):
+    if created or _indexed_fields_changed('salle', update_fields):
+        search.index('salle', [instance], replace=not created)
+
+
+@receiver(post_delete, sender=Salle)
+def unindex_searched_salle(sender, instance, **kwargs):
+    search.unindex('salle', [instance.pk])
+
+
+# Change journal for delta sync: written in the same transaction, so it rolls back with the rows
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Salle)
+@receiver(post_save, sender=User_Salle)
+def journal_saved(sender, instance, **kwargs):
+    changes.record(changes.kind_of(sender), [instance.pk])
+
+
+@receiver(post_bulk_create, sender=User)
+@receiver(post_bulk_create, sender=User_Salle)
+def journal_bulk_created(sender, instances, **kwargs):
+    changes.record(changes.kind_of(sender), [instance.pk for instance in instances])
+
+
+@receiver(pre_delete, sender=User)
+def remember_created_users(sender, instance, **kwargs):
+    if instance.is_admin:
+        # on_delete=SET_NULL clears their admin_creator with an UPDATE that sends no signal
+        instance._changes_created_users = list(User.objects.filter(admin_creator=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Salle)
+@receiver(post_delete, sender=User_Salle)
+def journal_deleted(sender, instance, **kwargs):
+    changes.record(changes.kind_of(sender), [instance.pk], action=Change.DELETE)
+    changes.record('user', instance.__dict__.pop('_changes_created_users', ()))
+
+
+@receiver(post_bulk_delete, sender=User_Salle)
+def journal_bulk_deleted(sender, instances, **kwargs):
+    changes.record(changes.kind_of(sender), [instance.pk for instance in instances], action=Change.DELETE)
+
+
+# last_login, written in batches by the flusher in logins.py
+
+@receiver(user_logged_in)
+def record_last_login(sender, request, user, **kwargs):
+    user.last_login = timezone.now()
+    logins.last_login_flusher.record(user.pk, user.last_login)
+
+
+# Access index of the scoped admins (see access.py), dropped once the write is committed
+
+@receiver(post_save, sender=ManagedSalle)
+@receiver(post_delete, sender=ManagedSalle)
+def forget_managing_admin(sender, instance, **kwargs):
+    id_admin = instance.admin_id
+    transaction.on_commit(lambda: access.forget(id_admin))
+
+
+@receiver(post_save, sender=User_Salle)
+@receiver(post_delete, sender=User_Salle)
+def forget_link_admins(sender, instance, **kwargs):
+    access.forget_salles_on_commit([instance.id_salle_id])
+
+
+@receiver(post_bulk_create, sender=User_Salle)
+@receiver(post_bulk_delete, sender=User_Salle)
+def forget_bulk_link_admins(sender, instances, **kwargs):
+    access.forget_salles_on_commit({link.id_salle_id for link in instances})
+
+
+@receiver(post_save, sender=User)
+def forget_user_access(sender, instance, created, update_fields=None, **kwargs):
+    # The user's own entry and their creator's; when is_admin may have changed, also
+    # the entries of the admins managing the user's salles
+    admin_ids = [instance.pk] + ([instance.admin_creator_id] if instance.admin_creator_id else [])
+    role_saved = not created and (update_fields is None or 'is_admin' in update_fields)
+    id_user = instance.pk
+
+    def forget():
+        access.forget(*admin_ids)
+        if role_saved:
+            salle_ids = membership.salle_ids_for_user(id_user)
+            if salle_ids:
+                access.forget_salles(salle_ids)
+    transaction.on_commit(forget)
+
+
+@receiver(post_bulk_create, sender=User)
+def forget_creators_access(sender, instances, **kwargs):
+    admin_ids = {user.admin_creator_id for user in instances if user.admin_creator_id}
+    if admin_ids:
+        transaction.on_commit(lambda: access.forget(*admin_ids))
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user_access(sender, instance, **kwargs):
+    id_user = instance.pk
+    transaction.on_commit(lambda: access.forget(id_user))
+
+
+# Change markers for conditional GET, touched once the write is committed
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Salle)
+@receiver(post_save, sender=User_Salle)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Salle)
+@receiver(post_delete, sender=User_Salle)
+@receiver(post_bulk_create, sender=User)
+@receiver(post_bulk_create, sender=User_Salle)
+@receiver(post_bulk_delete, sender=User_Salle)
+@receiver(post_save, sender=ManagedSalle)
+@receiver(post_delete, sender=ManagedSalle)
+def touch_version(sender, **kwargs):
+    transaction.on_commit(lambda: versions.touch(sender))
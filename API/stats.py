@@ -0,0 +1,144 @@
+"""
+Dashboard counters kept in the cache.
+
+The counters are adjusted incrementally from the model signals in signals.py
+and rebuilt from the database by reconcile() (see the reconcile_stats
+management command) whenever they are missing or may have drifted.
+A missing counter is rebuilt from a read replica when one is configured (see
+routers.py); reconcile_stats reads the primary.
+
+Every API worker and the management commands write to API_STATS_CACHE, so it
+must be a cache they all share (checks.py warns about a process-local one).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from . import access, routers
+from .models import User, Salle, User_Salle
+
+KEY_PREFIX = 'stats'
+COUNTERS = ('regular_users', 'admin_users', 'active_users', 'inactive_users', 'total_gyms', 'total_links')
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_STATS_CACHE', 'default')]
+
+
+def _key(name):
+    return f'{KEY_PREFIX}:{name}'
+
+
+def _salle_key(id_salle):
+    return f'{KEY_PREFIX}:salle_links:{id_salle}'
+
+
+def _adjust(key, delta):
+    if not delta:
+        return
+    cache = get_cache()
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        else:
+            cache.decr(key, -delta)
+    except ValueError:
+        # Counter not primed yet, the next read rebuilds it from the database
+        pass
+
+
+def adjust(**deltas):
+    for name, delta in deltas.items():
+        _adjust(_key(name), delta)
+
+
+def user_deltas(is_admin, is_active, sign=1):
+    """Counter deltas for adding (sign=1) or removing (sign=-1) one user"""
+    return {
+        'admin_users' if is_admin else 'regular_users': sign,
+        'active_users' if is_active else 'inactive_users': sign,
+    }
+
+
+def adjust_salle_links(id_salle, delta):
+    _adjust(_salle_key(id_salle), delta)
+    adjust(total_links=delta)
+
+
+def forget_salle(id_salle):
+    get_cache().delete(_salle_key(id_salle))
+
+
+def reconcile():
+    """Recompute every counter from the database and store it in the cache"""
+    user_counts = User.objects.aggregate(
+        regular_users=Count('pk', filter=Q(is_admin=False)),
+        admin_users=Count('pk', filter=Q(is_admin=True)),
+        active_users=Count('pk', filter=Q(is_active=True)),
+        inactive_users=Count('pk', filter=Q(is_active=False)),
+    )
+    counters = dict(user_counts)
+    counters['total_gyms'] = Salle.objects.count()
+    counters['total_links'] = User_Salle.objects.count()
+
+    values = {_key(name): value for name, value in counters.items()}
+    values.update({_salle_key(id_salle): 0 for id_salle in Salle.objects.values_list('pk', flat=True)})
+    per_salle = User_Salle.objects.values_list('id_salle').annotate(links=Count('pk')).order_by()
+    values.update({_salle_key(id_salle): links for id_salle, links in per_salle})
+    get_cache().set_many(values, timeout=None)
+    return counters
+
+
+def get_dashboard_stats():
+    cached = get_cache().get_many([_key(name) for name in COUNTERS])
+    if len(cached) != len(COUNTERS):
+        with routers.use_replica():
+            return reconcile()
+    return {name: cached[_key(name)] for name in COUNTERS}
+
+
+def get_scoped_dashboard_stats(user):
+    """
+    The counters restricted to the reach of a scoped admin (see access.py): the
+    users and salles of their access sets and the links of those salles
+    """
+    user_access = access.get(user)
+    with routers.use_replica():
+        user_counts = access.restrict(User.objects.all(), user, {access.USER: 'pk'}).aggregate(
+            active_users=Count('pk', filter=Q(is_active=True)),
+            inactive_users=Count('pk', filter=Q(is_active=False)),
+        )
+    return {
+        'regular_users': len(user_access.user_ids),
+        # The access sets hold no admin
+        'admin_users': 0,
+        **user_counts,
+        'total_gyms': len(user_access.salle_ids),
+        'total_links': sum(get_salle_link_counts(user_access.salle_ids).values()),
+    }
+
+
+def get_salle_link_counts(salle_ids):
+    """{id_salle: link count}, with one query for the salles missing from the cache"""
+    cache = get_cache()
+    keys = {_salle_key(id_salle): id_salle for id_salle in salle_ids}
+    counts = {keys[key]: count for key, count in cache.get_many(list(keys)).items()}
+    missing = [id_salle for id_salle in salle_ids if id_salle not in counts]
+    if missing:
+        with routers.use_replica():
+            found = dict(User_Salle.objects.filter(id_salle_id__in=missing).values_list('id_salle')
+                         .annotate(links=Count('pk')).order_by())
+        loaded = {id_salle: found.get(id_salle, 0) for id_salle in missing}
+        cache.set_many({_salle_key(id_salle): links for id_salle, links in loaded.items()}, timeout=None)
+        counts.update(loaded)
+    return counts
+
+
+def get_salle_link_count(id_salle):
+    cache = get_cache()
+    count = cache.get(_salle_key(id_salle))
+    if count is None:
+        with routers.use_replica():
+            count = User_Salle.objects.filter(id_salle_id=id_salle).count()
+        cache.set(_salle_key(id_salle), count, timeout=None)
+    return count
@@ -1,3 +1,1816 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import sqlite3
+import tempfile
+import threading
+
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_delete
+from django.db.utils import ConnectionHandler
+from django.test import (AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .db import pool as db_pool
+from .db.backends.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from . import (access, authentication, batch, bulk, changes, checks, deletions, exports, logins, membership, metrics,
+               report_jobs, rollups, routers, search, seeding, stats, versions)
+from .fieldsets import Fieldset
+from .fast_serializers import FastUserSerializer, FastSalleSerializer, FastUserSalleListSerializer
+from .pagination import SalleCursorPagination
+from .models import User, Salle, User_Salle, ReportRollup, SearchToken, Change, DeletionJob, ReportJob, ManagedSalle
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import UserSerializer, SalleSerializer, UserSalleListSerializer
+from .signals import post_bulk_create, post_bulk_delete
+
+
+class FastSerializerParityTests(TestCase):
+    """The fast list serializers must render byte-identical JSON to the DRF serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.user = User.objects.create_user(
+            'user@example.com', 'pw', name='Ünïcode "quoted"', phone='0600000000', admin_creator=cls.admin,
+            is_active=False,
+        )
+        cls.user.last_login = datetime(2025, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        cls.user.save(update_fields=['last_login'])
+        User.objects.create_user('plain@example.com', 'pw', name='Plain',
+                                 date_creation=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        cls.salle = Salle.objects.create(name='Salle A', phone='0500000000', admin_creator=cls.admin)
+        Salle.objects.create(name='Salle B', admin_creator=cls.admin,
+                             date_creation=datetime(2024, 6, 1, 12, 0, tzinfo=dt_timezone.utc))
+        User_Salle.objects.create(id_user=cls.user, id_salle=cls.salle, admin_creator=cls.admin)
+        User_Salle.objects.create(id_user=cls.admin, id_salle=cls.salle, admin_creator=cls.admin)
+
+    def setUp(self):
+        membership.clear()
+
+    def assertParity(self, model, serializer_class, fast_serializer_class, fieldset=None):
+        queryset = model.objects.order_by('pk')
+        if fieldset is not None:
+            fast_serializer_class = fast_serializer_class.sparse(fieldset)
+        expected = JSONRenderer().render(serializer_class(
+            serializer_class.setup_queryset(queryset, fieldset), many=True, context={'fieldset': fieldset}).data)
+        actual = JSONRenderer().render(fast_serializer_class(fast_serializer_class.project(queryset)).data)
+        self.assertEqual(actual, expected)
+
+    def test_user_parity(self):
+        self.assertParity(User, UserSerializer, FastUserSerializer)
+
+    def test_salle_parity(self):
+        self.assertParity(Salle, SalleSerializer, FastSalleSerializer)
+
+    def test_link_parity(self):
+        self.assertParity(User_Salle, UserSalleListSerializer, FastUserSalleListSerializer)
+
+    def test_sparse_parity(self):
+        cases = [
+            (User, UserSerializer, FastUserSerializer, ('name', 'last_login'), ()),
+            (User, UserSerializer, FastUserSerializer, ('id_user', 'admin_creator'), ()),
+            (User, UserSerializer, FastUserSerializer, ('admin_creator', 'date_creation'), ('admin_creator',)),
+            (Salle, SalleSerializer, FastSalleSerializer, ('id_salle', 'name', 'phone', 'date_creation', 'admin_creator'), ()),
+            (User_Salle, UserSalleListSerializer, FastUserSalleListSerializer, ('id', 'id_user', 'id_salle'), ('id_salle',)),
+        ]
+        for model, serializer_class, fast_serializer_class, fields, expand in cases:
+            with self.subTest(model=model.__name__, fields=fields, expand=expand):
+                self.assertParity(model, serializer_class, fast_serializer_class, Fieldset(fields, frozenset(expand)))
+
+    @override_settings(TIME_ZONE='Africa/Casablanca')
+    def test_parity_outside_utc(self):
+        self.assertParity(User, UserSerializer, FastUserSerializer)
+        self.assertParity(User_Salle, UserSalleListSerializer, FastUserSalleListSerializer)
+
+    @override_settings(REST_FRAMEWORK={'DATETIME_FORMAT': '%Y-%m-%d %H:%M'})
+    def test_parity_with_custom_datetime_format(self):
+        self.assertParity(User, UserSerializer, FastUserSerializer)
+
+    def test_list_endpoints_match_serializers(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        cases = [
+            ('/api/admin-dashboard/users/', User.objects.order_by('id_user'), UserSerializer),
+            ('/api/admin-dashboard/salles/', Salle.objects.order_by('id_salle'), SalleSerializer),
+            ('/api/admin-dashboard/links/', User_Salle.objects.order_by('id'), UserSalleListSerializer),
+        ]
+        for url, queryset, serializer_class in cases:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['results'], serializer_class(queryset, many=True).data)
+
+        response = client.get(f'/api/admin-dashboard/salles/{self.salle.id_salle}/users/')
+        queryset = User.objects.filter(salle_Links__id_salle=self.salle)
+        self.assertEqual(response.json(), UserSerializer(queryset, many=True).data)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=cls.admin)
+                     for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_fields(self):
+        response = self.client.get('/api/admin-dashboard/users/?fields=id_user,name,admin_creator&page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'id_user': self.admin.pk, 'name': 'Admin', 'admin_creator': None},
+            {'id_user': self.users[0].pk, 'name': 'User 0', 'admin_creator': self.admin.pk},
+        ])
+        # The cursor still works without its ordering columns in the output
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([user['id_user'] for user in response.json()['results']], [self.users[1].pk, self.users[2].pk])
+
+        response = self.client.get('/api/admin-dashboard/users/?fields=name,admin_creator&expand=admin_creator')
+        self.assertEqual(response.json()['results'][1], {'name': 'User 0', 'admin_creator': {'id_user': self.admin.pk, 'name': 'Admin'}})
+
+    def test_projection_reaches_sql(self):
+        url = f'/api/admin-dashboard/users/{self.users[0].pk}/?fields=name,admin_creator'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {'name': 'User 0', 'admin_creator': self.admin.pk})
+        sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"email"', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin-dashboard/users/?fields=id_user')
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+        self.assertNotIn('"name"', queries[-1]['sql'])
+
+    def test_unknown_names(self):
+        response = self.client.get('/api/admin-dashboard/salles/?fields=name,password&expand=phone')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+        # Write-only fields can't be selected
+        response = self.client.get(f'/api/admin-dashboard/users/{self.users[0].pk}/?fields=password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_writes_ignore_fieldsets(self):
+        response = self.client.patch(f'/api/admin-dashboard/users/{self.users[0].pk}/?fields=name',
+                                     {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], 'user0@example.com')
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        # Bulk imported: most rows share one timestamp
+        same_time = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        cls.salles = Salle.objects.bulk_create([
+            Salle(name=f'Salle {i}', admin_creator=cls.admin, date_creation=same_time) for i in range(6)
+        ] + [Salle(name='Later', admin_creator=cls.admin, date_creation=datetime(2025, 1, 2, tzinfo=dt_timezone.utc))])
+        cls.expected = list(Salle.objects.order_by('date_creation', 'id_salle').values_list('id_salle', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url, link='next'):
+        ids, sql = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            ids += [salle['id_salle'] for salle in data['results']]
+            sql.append(queries[-1]['sql'])
+            url = data[link]
+            if url:
+                # Every cursor is a position, never an offset within one
+                cursor = parse_qs(urlparse(url).query)['cursor'][0]
+                self.assertNotIn('o', parse_qs(base64.b64decode(cursor).decode()))
+        return ids, sql
+
+    def test_stable_order_across_pages(self):
+        ids, sql = self.walk('/api/admin-dashboard/salles/?ordering=date_creation&page_size=2')
+        self.assertEqual(ids, self.expected)
+        self.assertFalse([query for query in sql if 'OFFSET' in query])
+
+        ids, _ = self.walk('/api/admin-dashboard/salles/?ordering=-date_creation&page_size=2')
+        self.assertEqual(ids, self.expected[::-1])
+
+    def test_previous_links(self):
+        url = '/api/admin-dashboard/salles/?ordering=date_creation&page_size=2'
+        last_page = None
+        while url:
+            last_page = self.client.get(url).json()
+            url = last_page['next']
+        ids, _ = self.walk(last_page['previous'], link='previous')
+        # Pages come back newest first, each in ascending order
+        pages = [ids[start:start + 2] for start in range(0, len(ids), 2)]
+        self.assertEqual([salle for page in reversed(pages) for salle in page], self.expected[:-1])
+        self.assertIsNone(self.client.get('/api/admin-dashboard/salles/').json()['previous'])
+
+    def test_page_size_cap(self):
+        with mock.patch.object(SalleCursorPagination, 'max_page_size', 3):
+            response = self.client.get('/api/admin-dashboard/salles/?page_size=5000')
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertEqual(len(self.client.get('/api/admin-dashboard/salles/?page_size=4').json()['results']), 4)
+
+    def test_invalid_cursor(self):
+        cursor = base64.b64encode(b'p=not-a-date|1').decode()
+        response = self.client.get(f'/api/admin-dashboard/salles/?ordering=date_creation&cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.salle = Salle.objects.create(name='Salle', admin_creator=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def expected(self):
+        return {
+            'regular_users': User.objects.filter(is_admin=False).count(),
+            'admin_users': User.objects.filter(is_admin=True).count(),
+            'active_users': User.objects.filter(is_active=True).count(),
+            'inactive_users': User.objects.filter(is_active=False).count(),
+            'total_gyms': Salle.objects.count(),
+            'total_links': User_Salle.objects.count(),
+        }
+
+    def test_counters_follow_writes(self):
+        self.assertEqual(stats.get_dashboard_stats(), self.expected())
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('user@example.com', 'pw', name='User')
+        with self.captureOnCommitCallbacks(execute=True):
+            link = User_Salle.objects.create(id_user=user, id_salle=self.salle, admin_creator=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Salle.objects.create(name='Other', admin_creator=self.admin)
+        self.assertEqual(stats.get_dashboard_stats(), self.expected())
+        self.assertEqual(stats.get_salle_link_count(self.salle.pk), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            link.delete()
+            other.delete()
+        self.assertEqual(stats.get_dashboard_stats(), self.expected())
+        self.assertEqual(stats.get_salle_link_count(self.salle.pk), 0)
+
+        # Served from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/admin-dashboard/')
+        self.assertEqual(response.json()['stats'], self.expected())
+
+    def test_reconcile_repairs_drift(self):
+        user = User.objects.create_user('user@example.com', 'pw', name='User')
+        User_Salle.objects.create(id_user=user, id_salle=self.salle, admin_creator=self.admin)
+        stats.reconcile()
+        stats.adjust(regular_users=5)
+        stats.adjust_salle_links(self.salle.pk, 3)
+
+        call_command('reconcile_stats', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(stats.get_dashboard_stats(), self.expected())
+        self.assertEqual(stats.get_salle_link_count(self.salle.pk), 1)
+
+    def test_salle_link_count(self):
+        users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}') for i in range(2)]
+        url = f'/api/admin-dashboard/salles/{self.salle.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.json()['link_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in users:
+                User_Salle.objects.create(id_user=user, id_salle=self.salle, admin_creator=self.admin)
+        # A link write changes the ETag of the salle
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json()['link_count'], 2)
+        self.assertEqual(self.client.get(f'{url}?fields=name,link_count').json(), {'name': 'Salle', 'link_count': 2})
+
+    @override_settings(API_STATS_CACHE='default')
+    def test_process_local_cache_check(self):
+        self.assertEqual([(warning.id, warning.msg) for warning in checks.check_shared_caches(None)], [
+            ('API.W001', "API_STATS_CACHE uses the process-local cache 'default'."),
+            ('API.W001', "API_VERSION_CACHE uses the process-local cache 'default'."),
+        ])
+        stderr = io.StringIO()
+        call_command('reconcile_stats', stdout=io.StringIO(), stderr=stderr)
+        self.assertIn("process-local cache 'default'", stderr.getvalue())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.user = User.objects.create_user('user@example.com', 'pw', name='User', admin_creator=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_not_modified(self):
+        for url in ('/api/admin-dashboard/users/', f'/api/admin-dashboard/users/{self.user.pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertIn('ETag', response)
+
+    def test_write_changes_etag(self):
+        url = '/api/admin-dashboard/users/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/admin-dashboard/users/{self.user.pk}/', {'name': 'Renamed'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', [user['name'] for user in response.json()['results']])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}},
+        API_VERSION_CACHE='shared',
+    )
+    def test_markers_are_read_from_the_version_cache(self):
+        url = '/api/admin-dashboard/users/'
+        etag = self.client.get(url)['ETag']
+        # Another process writing a user moves the marker in the shared cache
+        caches['shared'].incr(versions._key(User))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BulkImportTests(TestCase):
+    url = '/api/admin-dashboard/users/bulk-import/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        User.objects.create_user('taken@example.com', 'pw', name='Taken')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_json_import(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, [
+                {'email': 'one@example.com', 'name': 'One', 'phone': '0600000001', 'password': 'secret1'},
+                {'email': 'two@example.com', 'name': 'Two', 'phone': '0600000000', 'password': 'secret2', 'is_admin': True},
+            ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['failed']), (2, 0))
+        two = User.objects.get(email='two@example.com')
+        self.assertEqual(response.json()['users'][1], {'row': 2, 'id_user': two.pk, 'email': 'two@example.com'})
+        self.assertTrue(two.check_password('secret2'))
+        self.assertEqual((two.is_admin, two.phone, two.admin_creator), (True, '0600000000', self.admin))
+        self.assertEqual(SearchToken.objects.filter(kind='user', object_id=two.pk).exists(), True)
+
+    def test_csv_import(self):
+        body = 'email,name,phone,password\nthree@example.com,Three,0600000000,secret3\nfour@example.com,Four,0600000000,secret4\n'
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.json()['created'], 2)
+        upload = io.BytesIO(b'email,name,phone,password\nfive@example.com,Five,0600000000,secret5\n')
+        upload.name = 'users.csv'
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertTrue(User.objects.get(email='five@example.com').check_password('secret5'))
+
+    def test_row_errors(self):
+        response = self.client.post(self.url, [
+            {'email': 'not-an-email', 'name': 'Bad', 'phone': '0600000000', 'password': 'secret'},
+            {'email': 'ok@example.com', 'name': 'Ok', 'phone': '0600000000', 'password': 'secret'},
+            {'email': 'noname@example.com', 'phone': '0600000000', 'password': 'secret'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in response.json()['errors']],
+                         [(1, ['email']), (3, ['name'])])
+
+        # Nothing created answers 400
+        response = self.client.post(self.url, [{'email': 'bad', 'name': 'Bad', 'phone': '0600000000', 'password': 'secret'}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_duplicate_emails(self):
+        response = self.client.post(self.url, [
+            {'email': 'new@example.com', 'name': 'New', 'phone': '0600000000', 'password': 'secret'},
+            {'email': 'NEW@example.com', 'name': 'Again', 'phone': '0600000000', 'password': 'secret'},
+            {'email': 'Taken@example.com', 'name': 'Taken', 'phone': '0600000000', 'password': 'secret'},
+        ], format='json')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'], [
+            {'row': 2, 'errors': {'email': ['Duplicate email in this import.']}},
+            {'row': 3, 'errors': {'email': ['User with this email already exists.']}},
+        ])
+        self.assertEqual(User.objects.filter(email__iexact='taken@example.com').count(), 1)
+
+    def test_emails_are_lowercased_on_both_paths(self):
+        response = self.client.post('/api/admin-dashboard/users/create/', {
+            'email': 'Taken@Example.com', 'name': 'Taken', 'phone': '0600000000', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+        response = self.client.post('/api/admin-dashboard/users/create/', {
+            'email': 'Single@Example.com', 'name': 'Single', 'phone': '0600000000', 'password': 'secret'}, format='json')
+        self.assertEqual(response.json()['email'], 'single@example.com')
+        response = self.client.post(self.url, [
+            {'email': 'Bulk@Example.com', 'name': 'Bulk', 'phone': '0600000000', 'password': 'secret'},
+            {'email': 'SINGLE@example.com', 'name': 'Again', 'phone': '0600000000', 'password': 'secret'},
+        ], format='json')
+        self.assertEqual(response.json()['users'], [{'row': 1, 'id_user': User.objects.get(email='bulk@example.com').pk,
+                                                     'email': 'bulk@example.com'}])
+        self.assertEqual(response.json()['errors'], [{'row': 2, 'errors': {'email': ['User with this email already exists.']}}])
+
+    @override_settings(API_BULK_IMPORT={'MIN_POOL_ROWS': 2, 'HASH_WORKERS': 2})
+    def test_pool_path(self):
+        with mock.patch.object(bulk, '_hash_pool', None):
+            hashes = bulk.hash_passwords(['first', 'second', 'third'])
+            self.assertIsNotNone(bulk._hash_pool)
+            pool = bulk._hash_pool
+        self.addCleanup(pool.shutdown)
+        self.assertEqual(pool._mp_context.get_start_method(), 'spawn')
+        self.assertEqual([check_password(password, hashed) for password, hashed in zip(['first', 'second', 'third'], hashes)],
+                         [True, True, True])
+
+
+class BulkLinkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=cls.admin)
+                     for i in range(2)]
+        cls.salles = [Salle.objects.create(name=f'Salle {i}', phone='0600000000', admin_creator=cls.admin)
+                      for i in range(2)]
+
+    def setUp(self):
+        membership.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.announced = []
+
+        def announce(sender, instances, **kwargs):
+            self.announced.extend((link.pk, link.id_user_id, link.id_salle_id) for link in instances)
+        post_bulk_create.connect(announce, sender=User_Salle)
+        self.addCleanup(post_bulk_create.disconnect, announce, sender=User_Salle)
+
+    def link_all(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/admin-dashboard/links/bulk-create/', {
+                'user_ids': [user.pk for user in self.users], 'salle_ids': [salle.pk for salle in self.salles]}, format='json')
+
+    def test_bulk_link(self):
+        User_Salle.objects.create(id_user=self.users[0], id_salle=self.salles[0], admin_creator=self.admin)
+        response = self.link_all()
+        self.assertEqual(response.json(), {'created': 3, 'existing': 1})
+        self.assertEqual(sorted(self.announced), sorted(User_Salle.objects.exclude(
+            id_user=self.users[0], id_salle=self.salles[0]).values_list('pk', 'id_user_id', 'id_salle_id')))
+        self.assertEqual(sorted(membership.user_ids_for_salle(self.salles[1].pk)), [user.pk for user in self.users])
+
+    def test_pair_linked_concurrently(self):
+        bulk_create = User_Salle.objects.bulk_create
+
+        def racing_bulk_create(links, *args, **kwargs):
+            # Another request links the last pair between the existing pairs query and the insert
+            if not User_Salle.objects.filter(id_user=self.users[1], id_salle=self.salles[1]).exists():
+                User_Salle.objects.create(id_user=self.users[1], id_salle=self.salles[1], admin_creator=self.admin)
+            return bulk_create(links, *args, **kwargs)
+        with mock.patch.object(User_Salle.objects, 'bulk_create', side_effect=racing_bulk_create):
+            response = self.link_all()
+        self.assertEqual(response.json(), {'created': 3, 'existing': 1})
+        self.assertEqual(User_Salle.objects.count(), 4)
+        raced = User_Salle.objects.get(id_user=self.users[1], id_salle=self.salles[1])
+        self.assertEqual(len(self.announced), 3)
+        self.assertNotIn(raced.pk, [pk for pk, _, _ in self.announced])
+
+    def test_bulk_unlink(self):
+        self.link_all()
+        deleted = []
+
+        def record(sender, instances, **kwargs):
+            deleted.append(sorted(link.pk for link in instances))
+        post_bulk_delete.connect(record, sender=User_Salle)
+        self.addCleanup(post_bulk_delete.disconnect, record, sender=User_Salle)
+        kept = User_Salle.objects.get(id_user=self.users[1], id_salle=self.salles[1])
+        unlinked = sorted(User_Salle.objects.filter(id_user=self.users[0]).values_list('pk', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin-dashboard/links/bulk-delete/', {
+                'user_ids': [self.users[0].pk], 'salle_ids': [salle.pk for salle in self.salles]}, format='json')
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(deleted, [unlinked])
+        self.assertEqual(list(User_Salle.objects.filter(id_salle=self.salles[1]).values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(list(membership.user_ids_for_salle(self.salles[0].pk)), [self.users[1].pk])
+
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        'created': datetime(2025, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'day': date(2025, 3, 1),
+        'amount': Decimal('12.50'),
+        'lazy': gettext_lazy('Invalid token.'),
+        'errors': {'email': [ErrorDetail('Enter a valid email address.', code='invalid')]},
+        1: 'integer key',
+        'separators': 'line\u2028paragraph\u2029',
+        'nested': [{'id_user': 1, 'name': 'Zïneb', 'admin_creator': None, 'is_admin': True}],
+    }
+
+    def test_renderer_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_renderer_falls_back_without_orjson(self):
+        with mock.patch('API.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_renderer_indents_like_drf(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.payload, 'application/json; indent=4'),
+            JSONRenderer().render(self.payload, 'application/json; indent=4'),
+        )
+
+    def test_parser_matches_drf(self):
+        body = '{"user_ids": [1, 2], "name": "Zïneb", "ratio": 0.5, "admin": null}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_parser_rejects_invalid_json(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"user_ids": [1, 2'))
+
+
+@override_settings(API_QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Every read endpoint must stay within its API_QUERY_BUDGETS entry, whatever the number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed(admins=2, users=20, salles=4, links=40)
+        search.rebuild()
+        cls.admin = User.objects.filter(is_admin=True).first()
+        cls.user = User.objects.filter(is_admin=False).first()
+
+    def setUp(self):
+        cache.clear()
+        membership.clear()
+        self.client = APIClient()
+        response = self.client.post('/api/login/', {'email': self.admin.email, 'password': seeding.DEFAULT_PASSWORD},
+                                    format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+
+    def read_urls(self):
+        salle = Salle.objects.first()
+        return [
+            '/api/admin-dashboard/',
+            '/api/admin-dashboard/metrics/',
+            '/api/admin-dashboard/users/',
+            '/api/admin-dashboard/users/?role=user',
+            f'/api/admin-dashboard/users/{self.user.id_user}/',
+            '/api/admin-dashboard/salles/',
+            f'/api/admin-dashboard/salles/{salle.id_salle}/',
+            '/api/admin-dashboard/links/',
+            f'/api/admin-dashboard/links/?salle_id={salle.id_salle}',
+            f'/api/admin-dashboard/links/{User_Salle.objects.first().id}/',
+            f'/api/admin-dashboard/users/{self.user.id_user}/salles/',
+            f'/api/admin-dashboard/salles/{salle.id_salle}/users/',
+            '/api/admin-dashboard/reports/new-users/?period=week',
+            '/api/admin-dashboard/reports/salle-growth/?start=2020-01-01',
+            '/api/admin-dashboard/search/?q=user',
+            '/api/admin-dashboard/search/?q=user 12&type=all',
+            '/api/admin-dashboard/changes/?since=0',
+        ]
+
+    def test_read_endpoints_within_budget(self):
+        for url in self.read_urls():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        User.objects.bulk_create([
+            User(email=f'extra{i}@example.com', name=f'Extra {i}', admin_creator=self.admin) for i in range(30)
+        ])
+        User_Salle.objects.bulk_create([
+            User_Salle(id_user=user, id_salle=salle, admin_creator=self.admin)
+            for user in User.objects.filter(salle_Links__isnull=True)
+            for salle in Salle.objects.all()
+        ])
+        self.test_read_endpoints_within_budget()
+
+    def test_user_dashboard_within_budget(self):
+        client = APIClient()
+        response = client.post('/api/login/', {'email': self.user.email, 'password': seeding.DEFAULT_PASSWORD},
+                               format='json')
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        self.assertEqual(client.get('/api/user-dashboard/').status_code, 200)
+
+    def test_scoped_admin_within_budget(self):
+        scoped = User.objects.create_user('scoped@example.com', seeding.DEFAULT_PASSWORD, name='Scoped',
+                                          is_admin=True, is_scoped_admin=True)
+        link = User_Salle.objects.first()
+        ManagedSalle.objects.create(admin=scoped, salle=link.id_salle)
+        client = APIClient()
+        response = client.post('/api/login/', {'email': scoped.email, 'password': seeding.DEFAULT_PASSWORD},
+                               format='json')
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        for url in (
+            '/api/admin-dashboard/',
+            '/api/admin-dashboard/users/',
+            f'/api/admin-dashboard/users/{link.id_user_id}/',
+            '/api/admin-dashboard/salles/',
+            f'/api/admin-dashboard/salles/{link.id_salle_id}/',
+            '/api/admin-dashboard/links/',
+            f'/api/admin-dashboard/links/{link.pk}/',
+            f'/api/admin-dashboard/users/{link.id_user_id}/salles/',
+            f'/api/admin-dashboard/salles/{link.id_salle_id}/users/',
+        ):
+            with self.subTest(url=url):
+                # Cold token, access and membership caches: the worst case
+                authentication.clear()
+                access.clear()
+                membership.clear()
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_budget_exceeded_raises(self):
+        with override_settings(API_QUERY_BUDGETS={'admin-user-list': {'GET': 0}}):
+            with self.assertRaises(metrics.QueryBudgetExceeded):
+                self.client.get('/api/admin-dashboard/users/')
+
+    def test_budgets_are_per_method(self):
+        url = f'/api/admin-dashboard/users/{self.user.id_user}/'
+        with override_settings(API_QUERY_BUDGETS={'admin-user-detail': {'GET': 0}}):
+            for method in ('get', 'head'):
+                with self.subTest(method=method), self.assertRaises(metrics.QueryBudgetExceeded):
+                    getattr(self.client, method)(url)
+            # The read budget doesn't apply to writes
+            self.assertEqual(self.client.delete(url).status_code, 204)
+
+    async def test_async_requests_are_measured(self):
+        metrics.registry.reset()
+        with override_settings(API_QUERY_BUDGETS={'login': {'POST': 0}}), self.assertRaises(metrics.QueryBudgetExceeded):
+            await AsyncClient().post('/api/login/', {'email': self.user.email, 'password': seeding.DEFAULT_PASSWORD},
+                                     content_type='application/json')
+        self.assertGreater(metrics.registry.snapshot()['login']['queries']['max'], 0)
+
+
+class SeedingTests(TestCase):
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('email').values_list('email', 'name', 'phone', 'is_admin', 'is_active', 'date_creation')),
+            list(Salle.objects.order_by('name').values_list('name', 'phone', 'date_creation')),
+            sorted(User_Salle.objects.values_list('id_user__email', 'id_salle__name', 'date_creation')),
+        )
+
+    def test_same_seed_gives_same_dataset(self):
+        counts = seeding.seed(admins=2, users=15, salles=4, links=30, seed=7, batch_size=4)
+        self.assertEqual(counts, {'admins': 2, 'users': 15, 'salles': 4, 'links': 30})
+        first = self.snapshot()
+        users, salles, links = first
+        # Dates are drawn relative to now, so compare the other columns
+        User.objects.all().delete()
+        seeding.seed(admins=2, users=15, salles=4, links=30, seed=7, batch_size=4)
+        second = self.snapshot()
+        self.assertEqual([row[:5] for row in second[0]], [row[:5] for row in users])
+        self.assertEqual([row[:2] for row in second[1]], [row[:2] for row in salles])
+        self.assertEqual([row[:2] for row in second[2]], [row[:2] for row in links])
+
+    def test_links_are_capped_at_every_pair(self):
+        counts = seeding.seed(admins=1, users=3, salles=2, links=100)
+        self.assertEqual(counts['links'], 6)
+
+
+class RollupTests(TestCase):
+    """The incrementally maintained buckets must always match a rebuild from the base tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.salle = Salle.objects.create(name='Salle A', admin_creator=cls.admin,
+                                         date_creation=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+
+    def buckets(self):
+        return sorted(ReportRollup.objects.exclude(count=0).values_list('metric', 'period', 'dimension', 'bucket', 'count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.buckets()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.buckets())
+
+    def create_users(self, *days):
+        return [
+            User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=self.admin,
+                                     date_creation=datetime(2025, 1, day, 12, tzinfo=dt_timezone.utc))
+            for i, day in enumerate(days)
+        ]
+
+    def test_incremental_matches_rebuild(self):
+        users = self.create_users(6, 7, 13)
+        User_Salle.objects.create(id_user=users[0], id_salle=self.salle, admin_creator=self.admin,
+                                  date_creation=datetime(2025, 1, 6, tzinfo=dt_timezone.utc))
+        User_Salle.objects.bulk_create([
+            User_Salle(id_user=user, id_salle=self.salle, admin_creator=self.admin) for user in users[1:]
+        ])
+        # bulk_create skips post_save, bulk.py sends post_bulk_create instead
+        post_bulk_create.send(sender=User_Salle, instances=list(User_Salle.objects.exclude(id_user=users[0])))
+        self.assertMatchesRebuild()
+
+        users[2].delete()
+        self.assertMatchesRebuild()
+        self.admin.delete()
+        self.assertMatchesRebuild()
+
+    def test_collector_delete_is_batched(self):
+        # A salle deleted right away writes its link buckets and journal rows once, whatever its number of links
+        queries = []
+        for count in (2, 6):
+            salle = Salle.objects.create(name=f'Salle {count}', admin_creator=self.admin)
+            for i in range(count):
+                user = User.objects.create_user(f'user{count}-{i}@example.com', 'pw', name=f'User {i}')
+                User_Salle.objects.create(id_user=user, id_salle=salle, admin_creator=self.admin,
+                                          date_creation=datetime(2025, 1, 6 + i % 2, tzinfo=dt_timezone.utc))
+            with CaptureQueriesContext(connection) as context:
+                self.assertIsNone(deletions.request(salle))
+            queries.append(len(context.captured_queries))
+            self.assertMatchesRebuild()
+        self.assertEqual(queries[0], queries[1])
+
+    def test_week_buckets_start_on_monday(self):
+        self.create_users(6, 7, 13)
+        series = rollups.series('users', 'week', dimension=self.admin.pk)
+        self.assertEqual(series[self.admin.pk], [(date(2025, 1, 6), 2), (date(2025, 1, 13), 1)])
+
+    def test_report_endpoint(self):
+        users = self.create_users(6, 7, 13)
+        for user in users:
+            User_Salle.objects.create(id_user=user, id_salle=self.salle, admin_creator=self.admin,
+                                      date_creation=user.date_creation)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.get('/api/admin-dashboard/reports/salle-growth/?start=2025-01-07')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['series'], [{
+            'dimension': self.salle.pk,
+            'name': 'Salle A',
+            'points': [{'bucket': '2025-01-07', 'count': 2}, {'bucket': '2025-01-13', 'count': 3}],
+        }])
+
+        response = client.get('/api/admin-dashboard/reports/new-users/?period=week&end=2025-01-12')
+        self.assertEqual(response.json()['series'][0]['points'], [{'bucket': '2025-01-06', 'count': 2}])
+
+        self.assertEqual(client.get('/api/admin-dashboard/reports/unknown/').status_code, 404)
+        self.assertEqual(client.get('/api/admin-dashboard/reports/new-users/?period=month').status_code, 400)
+
+
+class MembershipIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}') for i in range(3)]
+        cls.salles = [Salle.objects.create(name=f'Salle {i}', admin_creator=cls.admin) for i in range(2)]
+        User_Salle.objects.create(id_user=cls.users[0], id_salle=cls.salles[0], admin_creator=cls.admin)
+        User_Salle.objects.create(id_user=cls.users[2], id_salle=cls.salles[0], admin_creator=cls.admin)
+
+    def setUp(self):
+        membership.clear()
+
+    def user_ids(self, salle):
+        return list(membership.user_ids_for_salle(salle.pk))
+
+    def test_links_are_patched_on_commit(self):
+        salle = self.salles[0]
+        self.assertEqual(self.user_ids(salle), [self.users[0].pk, self.users[2].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            User_Salle.objects.create(id_user=self.users[1], id_salle=salle, admin_creator=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            User_Salle.objects.filter(id_user=self.users[0]).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user_ids(salle), [self.users[1].pk, self.users[2].pk])
+
+    def test_uncommitted_links_are_not_indexed(self):
+        salle = self.salles[1]
+        self.assertEqual(self.user_ids(salle), [])
+        User_Salle.objects.create(id_user=self.users[1], id_salle=salle, admin_creator=self.admin)
+        self.assertEqual(self.user_ids(salle), [])
+
+    def test_cascade_delete(self):
+        self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [self.salles[0].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salles[0].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [])
+
+    def test_relationship_view_uses_one_query_once_indexed(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = f'/api/admin-dashboard/salles/{self.salles[0].pk}/users/'
+        self.assertEqual([row['id_user'] for row in client.get(url).json()], [self.users[0].pk, self.users[2].pk])
+        with self.assertNumQueries(1):
+            client.get(url)
+        # Long id lists fall back to the join
+        with mock.patch.object(membership, 'MAX_IN_IDS', 1):
+            self.assertEqual(len(client.get(url).json()), 2)
+
+
+class TokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user@example.com', 'pw', name='User')
+
+    def setUp(self):
+        authentication._local_tokens.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_after_first_request(self):
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 200)
+
+    def test_deactivated_user_rejected(self):
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 401)
+
+    def test_deleted_token_rejected(self):
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 401)
+
+    def test_evicted_on_commit(self):
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 200)
+        stale = authentication._local_tokens.get(self.token.key)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+            # A request racing the transaction caches the row it read before the commit
+            authentication._local_tokens.set(self.token.key, stale)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get('/api/user-dashboard/').status_code, 401)
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user@example.com', 'secret', name='User')
+
+    def login(self, email='user@example.com', password='secret'):
+        return self.client.post('/api/login/', {'email': email, 'password': password}, content_type='application/json')
+
+    def test_login_returns_token(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['token'], Token.objects.get(user=self.user).key)
+        self.assertEqual(body, {
+            'token': body['token'], 'user_id': self.user.id_user, 'email': 'user@example.com', 'is_admin': False,
+            'redirect_url': 'api/user-dashboard/',
+        })
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.login().json()['token'], body['token'])
+
+    def test_cached_key_of_a_token_deleted_elsewhere(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            key = self.login().json()['token']
+        # Deleted by another process: only the shared Token change marker tells this one
+        with mock.patch.object(logins, 'forget_user_token'), self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=key).delete()
+        token = self.login().json()['token']
+        self.assertNotEqual(token, key)
+        self.assertEqual(token, Token.objects.get(user=self.user).key)
+
+    def test_login_accepts_form_data(self):
+        response = self.client.post('/api/login/', {'email': 'user@example.com', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_credentials(self):
+        inactive = User.objects.create_user('inactive@example.com', 'secret', name='Inactive', is_active=False)
+        for email, password in [('user@example.com', 'wrong'), ('nobody@example.com', 'secret'), (inactive.email, 'secret')]:
+            with self.subTest(email=email):
+                response = self.login(email, password)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'non_field_errors': ['Unable to log in with provided credentials.']})
+        self.assertIn('email', self.login('not-an-email').json())
+        response = self.client.post('/api/login/', '{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_client(self):
+        response = await AsyncClient().post('/api/login/', {'email': 'user@example.com', 'password': 'secret'},
+                                            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_id'], self.user.id_user)
+
+    @override_settings(API_LOGIN={'LAST_LOGIN_FLUSH_INTERVAL': 60})
+    def test_last_login_is_flushed_in_batches(self):
+        flusher = logins.LastLoginFlusher()
+        first = datetime(2025, 3, 1, 8, 0, tzinfo=dt_timezone.utc)
+        with mock.patch.object(logins.threading, 'Thread'):
+            flusher.record(self.user.pk, first.replace(hour=9))
+            flusher.record(self.user.pk, first)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        # One UPDATE for the batch and one INSERT into the change journal, in a transaction
+        # (a savepoint and its release here)
+        with self.assertNumQueries(4):
+            self.assertEqual(flusher.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, first.replace(hour=9))
+        self.assertTrue(Change.objects.filter(kind='user', object_id=self.user.pk).exists())
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = []
+
+        def connect():
+            connection = sqlite3.connect(':memory:', check_same_thread=False)
+            self.opened.append(connection)
+            return connection
+        return db_pool.ConnectionPool(connect, lambda connection: connection.execute('SELECT 1'), **options)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        self.assertEqual(pool.snapshot()['connections_created'], 1)
+        self.assertEqual(pool.snapshot()['in_use'], 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.checkout()
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.snapshot()['timeouts'], 1)
+        self.assertEqual(pool.snapshot()['waits'], 1)
+
+    def test_broken_idle_connection_is_replaced(self):
+        pool = self.make_pool(check_idle=0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.close()
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.snapshot()['health_check_failures'], 1)
+        self.assertEqual(pool.snapshot()['open'], 1)
+
+    def test_old_connections_are_recycled(self):
+        pool = self.make_pool(max_lifetime=0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertEqual(pool.snapshot()['open'], 0)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_pooled_backend(self):
+        with tempfile.NamedTemporaryFile(suffix='.sqlite3') as database:
+            settings_dict = ConnectionHandler({'default': {
+                'ENGINE': 'API.db.backends.sqlite3', 'NAME': database.name, 'OPTIONS': {'pool': {'max_size': 2}},
+            }}).settings['default']
+            for _ in range(3):
+                wrapper = PooledSQLiteWrapper(settings_dict, 'pooled')
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                wrapper.close()
+            stats = db_pool.snapshot()['pooled']
+            self.assertEqual(stats['connections_created'], 1)
+            self.assertEqual(stats['checkouts'], 3)
+            self.assertEqual(stats['idle'], 1)
+            db_pool.close_all()
+
+
+@override_settings(API_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """'replica' is a separate test database, its rows stand for what replication copied so far"""
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        User.objects.create_user('primary@example.com', 'pw', name='Primary only')
+        User.objects.using('replica').bulk_create([
+            User(id_user=cls.admin.pk, email='admin@example.com', name='Admin', is_admin=True),
+            User(email='replica@example.com', name='Replica only'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_reads_replica(self):
+        response = self.client.get('/api/admin-dashboard/users/')
+        self.assertEqual([row['email'] for row in response.json()['results']],
+                         ['admin@example.com', 'replica@example.com'])
+        # The table changed less than API_READ_REPLICA_MAX_LAG seconds ago
+        self.assertNotIn('ETag', response)
+        with override_settings(API_READ_REPLICA_MAX_LAG=-60):
+            self.assertIn('ETag', self.client.get('/api/admin-dashboard/users/'))
+
+    def test_create_reads_and_writes_primary(self):
+        response = self.client.post('/api/admin-dashboard/users/create/', {
+            'email': 'new@example.com', 'name': 'New', 'phone': '0600000000', 'password': 'secret',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['email'], 'new@example.com')
+        self.assertTrue(User.objects.filter(email='new@example.com').exists())
+        self.assertFalse(User.objects.using('replica').filter(email='new@example.com').exists())
+
+    def test_dashboard_stats_read_replica(self):
+        stats = self.client.get('/api/admin-dashboard/').json()['stats']
+        self.assertEqual((stats['admin_users'], stats['regular_users']), (1, 1))
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_reads_follow_writes_to_primary(self):
+        with routers.use_replica():
+            self.assertEqual(routers.read_alias(), 'replica')
+            self.assertEqual(User.objects.filter(email='replica@example.com').count(), 1)
+            User.objects.filter(pk=self.admin.pk).update(name='Renamed')
+            self.assertEqual(routers.read_alias(), 'default')
+            self.assertEqual(User.objects.get(pk=self.admin.pk).name, 'Renamed')
+        self.assertEqual(routers.read_alias(), 'default')
+
+    def test_instances_read_from_replica_are_saved_to_primary(self):
+        with routers.use_replica():
+            user = User.objects.get(email='admin@example.com')
+        self.assertEqual(user._state.db, 'replica')
+        user.name = 'Saved'
+        user.save(update_fields=['name'])
+        self.assertEqual(User.objects.get(pk=user.pk).name, 'Saved')
+        self.assertEqual(User.objects.using('replica').get(pk=user.pk).name, 'Admin')
+
+    @override_settings(API_READ_REPLICAS=[])
+    def test_without_replicas(self):
+        with routers.use_replica():
+            self.assertEqual(routers.read_alias(), 'default')
+        response = self.client.get('/api/admin-dashboard/users/')
+        self.assertIn('primary@example.com', [row['email'] for row in response.json()['results']])
+
+
+class SearchTests(TestCase):
+    """The incrementally maintained prefixes must always match a rebuild from the base tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.dupont = User.objects.create_user('jean.dupont@example.com', 'pw', name='Jean Dupont',
+                                              phone='06 12 34 56 78', admin_creator=cls.admin)
+        cls.dupuis = User.objects.create_user('marie@example.com', 'pw', name='Marie Dupuis', admin_creator=cls.admin)
+        cls.salle = Salle.objects.create(name='Salle Défense', phone='01-23-45', admin_creator=cls.admin)
+
+    def rows(self):
+        return sorted(SearchToken.objects.values_list('kind', 'object_id', 'prefix', 'weight'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        search.rebuild()
+        self.assertEqual(incremental, self.rows())
+
+    def test_incremental_matches_rebuild(self):
+        self.assertMatchesRebuild()
+        self.dupont.name = 'Jean Durand'
+        self.dupont.save()
+        self.assertMatchesRebuild()
+        self.dupuis.delete()
+        self.salle.delete()
+        self.assertMatchesRebuild()
+
+    def test_unrelated_update_keeps_prefixes(self):
+        self.dupont.name = 'Jean Durand'
+        self.dupont.save(update_fields=['is_active'])
+        self.assertEqual(search.search('user', 'durand'), [])
+
+    def test_ranking(self):
+        # Both names start with "dup", only Dupont has the complete word
+        self.assertEqual([pk for pk, _ in search.search('user', 'dup')], [self.dupont.pk, self.dupuis.pk])
+        self.assertEqual([pk for pk, _ in search.search('user', 'dupuis')], [self.dupuis.pk])
+        # Every word must match, in any field
+        self.assertEqual([pk for pk, _ in search.search('user', 'jean dup')], [self.dupont.pk])
+        self.assertEqual(search.search('user', 'jean dupuis'), [])
+        # Accents, case and phone separators are ignored
+        self.assertEqual([pk for pk, _ in search.search('salle', 'DEFENSE')], [self.salle.pk])
+        self.assertEqual([pk for pk, _ in search.search('user', '061234')], [self.dupont.pk])
+        self.assertEqual([pk for pk, _ in search.search('salle', '012345')], [self.salle.pk])
+
+    def test_rarest_prefix(self):
+        with mock.patch.object(search, 'PROBE_LIMIT', 1):
+            # Both counts stop at the limit, the second round tells them apart
+            with self.assertNumQueries(4):
+                self.assertEqual(search._rarest('user', ['example', 'dupont']), 'dupont')
+            with self.assertNumQueries(1):
+                self.assertIsNone(search._rarest('user', ['exam', 'durand']))
+            self.assertEqual([pk for pk, _ in search.search('user', 'example dupont')], [self.dupont.pk])
+
+    def test_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/admin-dashboard/search/?q=dup&type=user&limit=1')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(list(results), ['user'])
+        self.assertEqual([(item['id_user'], item['name']) for item in results['user']], [(self.dupont.pk, 'Jean Dupont')])
+        self.assertIn('score', results['user'][0])
+
+        results = client.get('/api/admin-dashboard/search/?q=defen').json()['results']
+        self.assertEqual(results['user'], [])
+        self.assertEqual([item['id_salle'] for item in results['salle']], [self.salle.pk])
+
+        self.assertEqual(client.get('/api/admin-dashboard/search/?q=a').status_code, 400)
+        client.force_authenticate(self.dupont)
+        self.assertEqual(client.get('/api/admin-dashboard/search/?q=dup').status_code, 403)
+
+
+@override_settings(API_CHANGES={'SETTLE_SECONDS': 0})
+class ChangeJournalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.cursor = self.client.get('/api/admin-dashboard/changes/').json()['cursor']
+
+    def sync(self, **params):
+        response = self.client.get('/api/admin-dashboard/changes/', {'since': self.cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.cursor = data['cursor']
+        return data
+
+    def ids(self, data, key):
+        return [item[next(iter(item))] for item in data[key]['upserted']], data[key]['deleted']
+
+    def test_writes_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            creator = User.objects.create_user('creator@example.com', 'pw', name='Creator', is_admin=True)
+            user = User.objects.create_user('user@example.com', 'pw', name='User', admin_creator=creator)
+            salle = Salle.objects.create(name='Salle', admin_creator=self.admin)
+            link = User_Salle.objects.create(id_user=user, id_salle=salle, admin_creator=self.admin)
+            user.name = 'Renamed'
+            user.save()
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'users'), ([creator.pk, user.pk], []))
+        self.assertEqual(data['users']['upserted'][1]['name'], 'Renamed')
+        self.assertEqual(self.ids(data, 'salles'), ([salle.pk], []))
+        self.assertEqual(self.ids(data, 'links'), ([link.pk], []))
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.ids(self.sync(), 'users'), ([], []))
+
+        # The salle delete cascades to its links; the creator's delete clears admin_creator on its users
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/admin-dashboard/salles/{salle.pk}/')
+            self.client.delete(f'/api/admin-dashboard/users/{creator.pk}/')
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'salles'), ([], [salle.pk]))
+        self.assertEqual(self.ids(data, 'links'), ([], [link.pk]))
+        self.assertEqual(self.ids(data, 'users'), ([user.pk], [creator.pk]))
+        self.assertIsNone(data['users']['upserted'][0]['admin_creator'])
+
+    def test_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}') for i in range(3)]
+        data = self.sync(limit=2)
+        self.assertEqual(self.ids(data, 'users'), ([users[0].pk, users[1].pk], []))
+        self.assertTrue(data['has_more'])
+        data = self.sync(limit=2)
+        self.assertEqual(self.ids(data, 'users'), ([users[2].pk], []))
+        self.assertFalse(data['has_more'])
+
+    def test_unsettled_rows_are_held_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('user@example.com', 'pw', name='User')
+        with override_settings(API_CHANGES={'SETTLE_SECONDS': 60}):
+            self.assertEqual(self.ids(self.sync(), 'users'), ([], []))
+        self.assertEqual(self.ids(self.sync(), 'users'), ([user.pk], []))
+
+    def test_journal_commits_with_the_write(self):
+        # A failing journal insert takes the write down with it, instead of committing it unjournaled
+        with mock.patch.object(changes, 'record', side_effect=DatabaseError('journal')):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/admin-dashboard/salles/create/', {'name': 'Salle', 'phone': '0500000000'},
+                                 format='json')
+        self.assertFalse(Salle.objects.filter(name='Salle').exists())
+
+        response = self.client.post('/api/admin-dashboard/salles/create/', {'name': 'Salle', 'phone': '0500000000'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.ids(self.sync(), 'salles'), ([Salle.objects.get(name='Salle').pk], []))
+
+    def test_pruned_cursor_expires(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}') for i in range(3)]
+        Change.objects.filter(object_id__in=[users[0].pk, users[1].pk]).update(
+            created=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        # users[1]'s row is the marker, older ones go: users[0]'s and the admin's from setUpTestData
+        self.assertEqual(changes.prune(retention_days=30), 2)
+
+        response = self.client.get('/api/admin-dashboard/changes/', {'since': self.cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['cursor'], changes.latest_cursor())
+        # Clients past the pruned rows are not affected
+        marker = Change.objects.order_by('id').first()
+        self.assertEqual(marker.action, Change.PRUNED)
+        self.cursor = marker.pk
+        self.assertEqual(self.ids(self.sync(), 'users'), ([users[2].pk], []))
+
+
+@override_settings(API_DELETION={'BACKGROUND_MIN_DEPENDENTS': 3, 'BATCH_SIZE': 2}, API_CHANGES={'SETTLE_SECONDS': 0})
+class DeletionJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=cls.admin)
+                     for i in range(4)]
+        cls.salle = Salle.objects.create(name='Salle', phone='0600000000', admin_creator=cls.admin)
+
+    def setUp(self):
+        membership.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def link(self, users, salle):
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in users:
+                User_Salle.objects.create(id_user=user, id_salle=salle, admin_creator=self.admin)
+
+    def run_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = deletions.claim()
+            job = deletions.run(job)
+        self.assertIsNone(deletions.claim())
+        return job
+
+    def test_few_dependents_delete_right_away(self):
+        self.link(self.users[:2], self.salle)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/admin-dashboard/salles/{self.salle.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Salle.objects.filter(pk=self.salle.pk).exists())
+        self.assertFalse(DeletionJob.objects.exists())
+
+    def test_salle_deleted_in_batches(self):
+        self.link(self.users, self.salle)
+        cursor = changes.latest_cursor()
+        response = self.client.delete(f'/api/admin-dashboard/salles/{self.salle.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], DeletionJob.PENDING)
+        self.assertEqual(response.json()['total'], 4)
+        self.assertTrue(Salle.objects.filter(pk=self.salle.pk).exists())
+
+        # No new links while it is pending, and a second DELETE gives the same job
+        new_user = User.objects.create_user('late@example.com', 'pw', name='Late')
+        refused = self.client.post('/api/admin-dashboard/links/create/',
+                                   {'id_user': new_user.pk, 'id_salle': self.salle.pk}, format='json')
+        self.assertEqual(refused.status_code, 400)
+        second = self.client.delete(f'/api/admin-dashboard/salles/{self.salle.pk}/')
+        self.assertEqual(second.json()['id'], DeletionJob.objects.get().pk)
+
+        job = self.run_jobs()
+        self.assertEqual((job.status, job.deleted), (DeletionJob.DONE, 4))
+        self.assertFalse(Salle.objects.filter(pk=self.salle.pk).exists())
+        self.assertFalse(User_Salle.objects.exists())
+        self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [])
+        self.assertEqual(stats.get_salle_link_count(self.salle.pk), 0)
+        incremental = sorted(ReportRollup.objects.exclude(count=0).values_list('metric', 'period', 'dimension', 'bucket', 'count'))
+        rollups.rebuild()
+        self.assertEqual(incremental, sorted(ReportRollup.objects.exclude(count=0).values_list('metric', 'period', 'dimension', 'bucket', 'count')))
+        deleted, _, _ = changes.changes_since(cursor)
+        self.assertEqual(len(deleted['link']), 4)
+        self.assertEqual(deleted['salle'], {self.salle.pk: Change.DELETE})
+
+        response = self.client.get(response['Location'])
+        self.assertEqual((response.json()['status'], response.json()['progress']), (DeletionJob.DONE, 1.0))
+
+    @override_settings(API_DELETION={'RECONCILE_INTERVAL': 0})
+    def test_finished_job_reconciles_local_caches(self):
+        self.link(self.users[:1], self.salle)
+        deletions.reconcile()
+        self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [self.salle.pk])
+        # What a worker process does: the rows go, and only its own local entries with them
+        User_Salle.objects.all()._raw_delete(User_Salle.objects.db)
+        versions.touch(DeletionJob)
+        self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [self.salle.pk])
+
+        self.client.get('/api/admin-dashboard/')
+        self.assertEqual(list(membership.salle_ids_for_user(self.users[0].pk)), [])
+        self.assertFalse(deletions.reconcile())
+
+    def test_admin_deleted_in_batches(self):
+        other = User.objects.create_user('other@example.com', 'pw', name='Other', is_admin=True)
+        self.link(self.users, self.salle)
+        self.client.force_authenticate(other)
+        response = self.client.delete(f'/api/admin-dashboard/users/{self.admin.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.admin.refresh_from_db()
+        self.assertFalse(self.admin.is_active)
+
+        job = self.run_jobs()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertFalse(User.objects.filter(pk=self.admin.pk).exists())
+        self.assertFalse(Salle.objects.exists())
+        self.assertFalse(User_Salle.objects.exists())
+        self.assertEqual(User.objects.filter(pk__in=[user.pk for user in self.users], admin_creator=None).count(), 4)
+
+    def test_bulk_unlink_sends_one_bulk_signal(self):
+        self.link(self.users, self.salle)
+        cursor = changes.latest_cursor()
+        per_row = []
+
+        def count_deleted(sender, instance, **kwargs):
+            per_row.append(instance.pk)
+        post_delete.connect(count_deleted, sender=User_Salle)
+        self.addCleanup(post_delete.disconnect, count_deleted, sender=User_Salle)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin-dashboard/links/bulk-delete/', {
+                'user_ids': [user.pk for user in self.users[:3]], 'salle_ids': [self.salle.pk]}, format='json')
+        self.assertEqual(response.json(), {'deleted': 3})
+        self.assertEqual(per_row, [])
+        self.assertEqual(list(membership.user_ids_for_salle(self.salle.pk)), [self.users[3].pk])
+        self.assertEqual(stats.get_salle_link_count(self.salle.pk), 1)
+        incremental = sorted(ReportRollup.objects.exclude(count=0).values_list('metric', 'period', 'dimension', 'bucket', 'count'))
+        rollups.rebuild()
+        self.assertEqual(incremental, sorted(ReportRollup.objects.exclude(count=0).values_list('metric', 'period', 'dimension', 'bucket', 'count')))
+        deleted, _, _ = changes.changes_since(cursor)
+        self.assertEqual(len(deleted['link']), 3)
+
+    @override_settings(API_DELETION={'BACKGROUND_MIN_DEPENDENTS': 3, 'BATCH_SIZE': 2, 'RETRY_DELAY': 0})
+    def test_failed_stage_is_retried(self):
+        self.link(self.users, self.salle)
+        self.client.delete(f'/api/admin-dashboard/salles/{self.salle.pk}/')
+        with mock.patch.object(deletions, '_delete_links', side_effect=RuntimeError('boom')), \
+                self.assertLogs('API.deletions', 'ERROR'):
+            job = deletions.run(deletions.claim())
+        self.assertEqual((job.status, job.attempts, job.error), (DeletionJob.PENDING, 1, 'boom'))
+        self.assertTrue(Salle.objects.filter(pk=self.salle.pk).exists())
+
+        job = self.run_jobs()
+        self.assertEqual((job.status, job.attempts, job.deleted), (DeletionJob.DONE, 2, 4))
+        self.assertFalse(Salle.objects.filter(pk=self.salle.pk).exists())
+
+    @override_settings(API_DELETION={'BACKGROUND_MIN_DEPENDENTS': 3, 'BATCH_SIZE': 2, 'MAX_ATTEMPTS': 2,
+                                     'RETRY_DELAY': 0})
+    def test_failed_job_gives_the_user_back(self):
+        other = User.objects.create_user('other@example.com', 'pw', name='Other', is_admin=True)
+        self.link(self.users, self.salle)
+        self.client.force_authenticate(other)
+        self.client.delete(f'/api/admin-dashboard/users/{self.admin.pk}/')
+        with mock.patch.object(deletions, '_delete_salles', side_effect=RuntimeError('boom')), \
+                self.assertLogs('API.deletions', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            job = deletions.run(deletions.claim())
+            self.assertEqual((job.status, job.attempts, job.deleted), (DeletionJob.PENDING, 1, 4))
+            job = deletions.run(deletions.claim())
+        self.assertEqual((job.status, job.attempts, job.error), (DeletionJob.FAILED, 2, 'boom'))
+        self.assertIsNone(deletions.claim())
+        self.admin.refresh_from_db()
+        self.assertTrue(self.admin.is_active)
+        self.assertTrue(Salle.objects.filter(pk=self.salle.pk).exists())
+        # Links to the salle can be created again
+        response = self.client.post('/api/admin-dashboard/links/create/',
+                                    {'id_user': self.users[0].pk, 'id_salle': self.salle.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User, {i}', admin_creator=cls.admin)
+                     for i in range(4)]
+        cls.salle = Salle.objects.create(name='Salle', phone='0600000000', admin_creator=cls.admin)
+        User_Salle.objects.create(id_user=cls.users[0], id_salle=cls.salle, admin_creator=cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, content = self.export('/api/admin-dashboard/users/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.csv"')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], [name for name, _ in exports.EXPORT_COLUMNS[User]])
+        self.assertEqual([row[0] for row in rows[1:]], [str(user.pk) for user in [self.admin, *self.users]])
+        user = dict(zip(rows[0], rows[2]))
+        self.assertEqual((user['email'], user['name'], user['is_admin'], user['admin_creator_name']),
+                         ('user0@example.com', 'User, 0', 'False', 'Admin'))
+
+    def test_ndjson(self):
+        response, content = self.export('/api/admin-dashboard/links/export/?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="links.ndjson"')
+        link = User_Salle.objects.get()
+        self.assertEqual([json.loads(line) for line in content.splitlines()], [{
+            'id': link.pk, 'id_user': self.users[0].pk, 'user_name': 'User, 0', 'id_salle': self.salle.pk,
+            'salle_name': 'Salle', 'admin_creator_id': self.admin.pk, 'admin_creator_name': 'Admin',
+            'date_creation': UserSalleListSerializer(link).data['date_creation'],
+        }])
+
+    def test_role_filter(self):
+        _, content = self.export('/api/admin-dashboard/users/export/?format=ndjson&role=admin')
+        self.assertEqual([json.loads(line)['id_user'] for line in content.splitlines()], [self.admin.pk])
+        _, content = self.export('/api/admin-dashboard/users/export/?format=ndjson&role=user')
+        self.assertEqual([json.loads(line)['id_user'] for line in content.splitlines()], [user.pk for user in self.users])
+
+    @override_settings(API_EXPORT_CHUNK_SIZE=2)
+    def test_chunk_boundaries(self):
+        for users, queries in ((self.users, 3), (self.users[:3], 2), (self.users[:1], 1)):
+            with self.subTest(rows=len(users)):
+                User.objects.exclude(pk__in=[user.pk for user in users]).exclude(pk=self.admin.pk).delete()
+                response = self.client.get('/api/admin-dashboard/users/export/?format=ndjson&role=user')
+                # Rows are read while the response streams, one query per chunk
+                with CaptureQueriesContext(connection) as context:
+                    content = b''.join(response.streaming_content).decode()
+                self.assertEqual([json.loads(line)['id_user'] for line in content.splitlines()], [user.pk for user in users])
+                self.assertEqual(len(context.captured_queries), queries)
+
+
+class ReportJobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.TemporaryDirectory()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media.name))
+        cls.addClassCleanup(cls.media.cleanup)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=cls.admin)
+                     for i in range(2)]
+        cls.salle = Salle.objects.create(name='Salle', phone='0600000000', admin_creator=cls.admin)
+        for user in cls.users:
+            User_Salle.objects.create(id_user=user, id_salle=cls.salle, admin_creator=cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def submit(self, **body):
+        response = self.client.post('/api/admin-dashboard/report-jobs/', body, format='json')
+        self.assertEqual(response.status_code, 202)
+        return response
+
+    def download(self, job):
+        response = self.client.get(f'/api/admin-dashboard/report-jobs/{job.pk}/download/')
+        if not response.streaming:
+            return response, None
+        content = b''.join(response.streaming_content)
+        response.close()
+        return response, content
+
+    def test_membership_report(self):
+        response = self.submit(report='membership', format='csv')
+        job = ReportJob.objects.get(pk=response.json()['id'])
+        self.assertEqual(self.download(job)[0].status_code, 409)
+
+        job = report_jobs.run(report_jobs.claim())
+        self.assertEqual((job.status, job.rows), (ReportJob.DONE, 2))
+        detail = self.client.get(response['Location']).json()
+        self.assertTrue(detail['download'].endswith(f'/report-jobs/{job.pk}/download/'))
+
+        response, content = self.download(job)
+        self.assertEqual(response.status_code, 200)
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0].split(','), ['id', 'admin_creator.id_user', 'admin_creator.name', 'id_user.id_user',
+                                               'id_user.name', 'id_salle.id_salle', 'id_salle.name', 'date_creation'])
+        self.assertEqual(len(lines), 3)
+
+    def test_records_are_the_list_items(self):
+        self.submit(report='users', format='ndjson')
+        job = report_jobs.run(report_jobs.claim())
+        records = [json.loads(line) for line in self.download(job)[1].decode().splitlines()]
+        self.assertEqual(records, UserSerializer(User.objects.order_by('pk'), many=True).data)
+
+    def test_admin_activity_report(self):
+        self.submit(report='admin-activity', format='ndjson')
+        job = report_jobs.run(report_jobs.claim())
+        rows = [json.loads(line) for line in self.download(job)[1].decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['id_user'], rows[0]['users_created'], rows[0]['salles_created'], rows[0]['links_created']),
+                         (self.admin.pk, 2, 1, 2))
+
+    @override_settings(API_REPORT_JOBS={'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 0})
+    def test_retries(self):
+        self.submit(report='salles')
+        with mock.patch.dict(report_jobs.REPORTS, salles=mock.Mock(side_effect=RuntimeError('boom'))), \
+                self.assertLogs('API.report_jobs', 'ERROR'):
+            job = report_jobs.run(report_jobs.claim())
+            self.assertEqual((job.status, job.attempts, job.error), (ReportJob.QUEUED, 1, 'boom'))
+            job = report_jobs.run(report_jobs.claim())
+        self.assertEqual((job.status, job.attempts), (ReportJob.FAILED, 2))
+        self.assertIsNone(report_jobs.claim())
+
+    @override_settings(API_REPORT_JOBS={'MAX_RUNNING': 1, 'MAX_QUEUED_PER_USER': 2})
+    def test_limits(self):
+        self.submit(report='users', role='admin')
+        self.submit(report='salles')
+        response = self.client.post('/api/admin-dashboard/report-jobs/', {'report': 'salles'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post('/api/admin-dashboard/report-jobs/', {'report': 'salles', 'role': 'admin'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        job = report_jobs.claim()
+        self.assertIsNone(report_jobs.claim())
+        job = report_jobs.run(job)
+        self.assertEqual(job.rows, 1)
+        self.assertIsNotNone(report_jobs.claim())
+
+    def test_expiry(self):
+        self.submit(report='salles')
+        job = report_jobs.run(report_jobs.claim())
+        path = job.result.path
+        ReportJob.objects.filter(pk=job.pk).update(expires=timezone.now())
+        self.assertEqual(report_jobs.expire(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.download(job)[0].status_code, 410)
+
+    def test_jobs_are_private(self):
+        self.submit(report='salles')
+        other = User.objects.create_user('other@example.com', 'pw', name='Other', is_admin=True)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/admin-dashboard/report-jobs/').json(), [])
+        job = ReportJob.objects.get()
+        self.assertEqual(self.client.get(f'/api/admin-dashboard/report-jobs/{job.pk}/').status_code, 404)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(API_REPORT_JOBS={'MAX_RUNNING': 1})
+class ReportJobClaimTests(TransactionTestCase):
+    """claim() from two workers at once, each on its own connection"""
+
+    def test_concurrent_claims_respect_max_running(self):
+        admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        for _ in range(2):
+            ReportJob.objects.create(requested_by=admin, report='salles', format='csv')
+        # Both workers read MAX_RUNNING before either claims, only the queue lock keeps the second one out
+        barrier = threading.Barrier(2, timeout=1)
+        setting = report_jobs._setting
+
+        def waiting_setting(name, default):
+            if name == 'MAX_RUNNING':
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError:
+                    pass
+            return setting(name, default)
+
+        claimed = []
+
+        def worker():
+            try:
+                claimed.append(report_jobs.claim())
+            finally:
+                connection.close()
+
+        with mock.patch.object(report_jobs, '_setting', side_effect=waiting_setting):
+            workers = [threading.Thread(target=worker) for _ in range(2)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        self.assertEqual(len([job for job in claimed if job is not None]), 1)
+        self.assertEqual(ReportJob.objects.filter(status=ReportJob.RUNNING).count(), 1)
+
+
+class AdminScopeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.scoped = User.objects.create_user('scoped@example.com', 'pw', name='Scoped', is_admin=True,
+                                              is_scoped_admin=True)
+        cls.salles = [Salle.objects.create(name=f'Salle {i}', phone='0600000000', admin_creator=cls.admin)
+                      for i in range(2)]
+        cls.users = [User.objects.create_user(f'user{i}@example.com', 'pw', name=f'User {i}', admin_creator=cls.admin)
+                     for i in range(2)]
+        cls.links = [
+            User_Salle.objects.create(id_user=cls.users[0], id_salle=cls.salles[0], admin_creator=cls.admin),
+            User_Salle.objects.create(id_user=cls.admin, id_salle=cls.salles[0], admin_creator=cls.admin),
+            User_Salle.objects.create(id_user=cls.users[1], id_salle=cls.salles[1], admin_creator=cls.admin),
+        ]
+        ManagedSalle.objects.create(admin=cls.scoped, salle=cls.salles[0])
+
+    def setUp(self):
+        access.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.scoped)
+
+    def test_dashboard_counts_the_scope(self):
+        response = self.client.get('/api/admin-dashboard/')
+        self.assertEqual(response.status_code, 200)
+        # users[0] is the only non-admin of salle 0; its links include the admin's
+        self.assertEqual(response.json()['stats'], {
+            'regular_users': 1, 'admin_users': 0, 'active_users': 1, 'inactive_users': 0,
+            'total_gyms': 1, 'total_links': 2,
+        })
+
+    def ids(self, url, key):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row[key] for row in response.json()['results']]
+
+    def test_lists_are_scoped(self):
+        # Admins in the managed salles stay out of reach
+        self.assertEqual(self.ids('/api/admin-dashboard/users/', 'id_user'), [self.users[0].pk])
+        self.assertEqual(self.ids('/api/admin-dashboard/salles/', 'id_salle'), [self.salles[0].pk])
+        self.assertEqual(self.ids('/api/admin-dashboard/links/', 'id'), [self.links[0].pk, self.links[1].pk])
+        response = self.client.get(f'/api/admin-dashboard/salles/{self.salles[0].pk}/users/')
+        self.assertEqual([row['id_user'] for row in response.json()], [self.users[0].pk])
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(len(self.ids('/api/admin-dashboard/users/', 'id_user')), 4)
+
+    def test_rejected_before_any_query(self):
+        self.client.get(f'/api/admin-dashboard/users/{self.users[0].pk}/')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/admin-dashboard/users/{self.users[1].pk}/')
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/api/admin-dashboard/salles/{self.salles[1].pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/admin-dashboard/links/{self.links[2].pk}/').status_code, 404)
+
+        self.client.force_authenticate(self.users[0])
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/admin-dashboard/users/{self.users[0].pk}/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['detail'], 'Only admin users can manage user accounts')
+
+    def test_refusal_bodies(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.put(f'/api/admin-dashboard/users/{self.users[1].pk}/change-password/',
+                                   {'new_password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'Only administrators can change passwords'})
+        response = self.client.get('/api/admin-dashboard/')
+        self.assertEqual(response.json(), {'error': 'Unauthorized access', 'redirect': '/user-dashboard/'})
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/user-dashboard/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'Unauthorized access', 'redirect': 'api/admin-dashboard/'})
+
+    def test_full_admin_endpoints(self):
+        self.assertEqual(self.client.delete(f'/api/admin-dashboard/salles/{self.salles[0].pk}/').status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/admin-dashboard/users/{self.users[0].pk}/').status_code, 403)
+        self.assertEqual(self.client.post('/api/admin-dashboard/salles/create/',
+                                          {'name': 'New', 'phone': '0600000000'}, format='json').status_code, 403)
+        self.assertEqual(self.client.get('/api/admin-dashboard/metrics/').status_code, 403)
+        response = self.client.patch(f'/api/admin-dashboard/salles/{self.salles[0].pk}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # Deleting one's own account used to fail with a 500
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(f'/api/admin-dashboard/users/{self.admin.pk}/').status_code, 403)
+
+    def test_writes_stay_in_scope(self):
+        response = self.client.post('/api/admin-dashboard/links/create/',
+                                    {'id_user': self.users[1].pk, 'id_salle': self.salles[0].pk}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/api/admin-dashboard/links/bulk-create/',
+                                    {'user_ids': [self.users[0].pk], 'salle_ids': [self.salles[1].pk]}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/api/admin-dashboard/users/create/', {
+            'email': 'boss@example.com', 'name': 'Boss', 'phone': '0600000000', 'password': 'secret', 'is_admin': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # A user the scoped admin creates is within reach, and can join a managed salle
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin-dashboard/users/create/', {
+                'email': 'new@example.com', 'name': 'New', 'phone': '0600000000', 'password': 'secret',
+            }, format='json')
+        id_user = response.json()['id_user']
+        response = self.client.post('/api/admin-dashboard/links/create/',
+                                    {'id_user': id_user, 'id_salle': self.salles[0].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_index_follows_writes(self):
+        url = '/api/admin-dashboard/users/'
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            User_Salle.objects.create(id_user=self.users[1], id_salle=self.salles[0], admin_creator=self.admin)
+        self.client.force_authenticate(self.scoped)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.ids(url, 'id_user'), [self.users[0].pk, self.users[1].pk])
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/admin-dashboard/users/{self.scoped.pk}/scope/',
+                                       {'is_scoped_admin': True, 'salle_ids': [self.salles[1].pk]}, format='json')
+        self.assertEqual(response.json()['salle_ids'], [self.salles[1].pk])
+        self.client.force_authenticate(self.scoped)
+        self.assertEqual(self.ids('/api/admin-dashboard/salles/', 'id_salle'), [self.salles[1].pk])
+        self.assertEqual(self.ids(url, 'id_user'), [self.users[1].pk])
+
+
+class BatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        cls.user = User.objects.create_user('user@example.com', 'pw', name='User', admin_creator=cls.admin)
+        cls.token = Token.objects.create(user=cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def post(self, requests, **options):
+        return self.client.post('/api/batch/', {'requests': requests, **options}, format='json')
+
+    def test_runs_in_order(self):
+        response = self.post([
+            {'path': f'/api/admin-dashboard/users/{self.user.pk}/?fields=name'},
+            {'method': 'POST', 'path': '/api/admin-dashboard/salles/create/', 'body': {'name': 'Salle A', 'phone': '0500000000'}},
+            {'path': '/api/admin-dashboard/salles/?fields=name'},
+            {'method': 'PATCH', 'path': f'/api/admin-dashboard/users/{self.user.pk}/', 'body': {'phone': 'x' * 50}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 201, 200, 400])
+        self.assertEqual(responses[0]['body'], {'name': 'User'})
+        self.assertIn('ETag', responses[0]['headers'])
+        self.assertEqual(responses[2]['body']['results'], [{'name': 'Salle A'}])
+        self.assertIn('phone', responses[3]['body'])
+
+    def test_sub_requests_keep_their_permissions(self):
+        self.client.force_authenticate(self.user)
+        responses = self.post([{'path': '/api/user-dashboard/'}, {'path': '/api/admin-dashboard/'}]).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 403])
+
+    def test_rejected_sub_requests(self):
+        responses = self.post([
+            {'path': '/api/unknown/'},
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}},
+            {'path': '/api/admin-dashboard/users/export/'},
+            {'method': 'POST', 'path': '/api/login/', 'body': {}},
+        ]).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [404, 400, 400, 400])
+
+    @override_settings(API_BATCH={'MAX_REQUESTS': 2})
+    def test_size_is_capped(self):
+        response = self.post([{'path': '/api/admin-dashboard/'}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/batch/', {}, format='json').status_code, 400)
+
+    def test_authenticates_once(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.post([{'path': '/api/user-dashboard/'}] * 3)
+        self.assertEqual(sum('authtoken_token' in query['sql'] for query in queries), 1)
+
+
+class ConcurrentBatchTests(TransactionTestCase):
+    """Concurrent sub-requests run on other threads, with their own connections: the rows must be committed"""
+
+    def test_concurrent_reads(self):
+        admin = User.objects.create_user('admin@example.com', 'pw', name='Admin', is_admin=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        requests = [
+            {'path': '/api/admin-dashboard/'},
+            {'path': '/api/admin-dashboard/users/'},
+            {'method': 'POST', 'path': '/api/admin-dashboard/salles/create/', 'body': {'name': 'Salle A', 'phone': '0500000000'}},
+            {'path': '/api/admin-dashboard/salles/'},
+            {'path': f'/api/admin-dashboard/users/{admin.pk}/'},
+        ]
+        with mock.patch.object(batch, '_execute_in_thread', wraps=batch._execute_in_thread) as in_thread:
+            response = client.post('/api/batch/', {'requests': requests, 'concurrent': True}, format='json')
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 201, 200, 200])
+        # The write waits for the reads before it and is seen by the ones after it
+        self.assertEqual([salle['name'] for salle in responses[3]['body']['results']], ['Salle A'])
+        self.assertEqual(in_thread.call_count, 4)
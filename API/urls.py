@@ -5,20 +5,35 @@ from .views import (
     AdminUserCreateView, AdminUserListView, AdminUserDetailView, 
     AdminSalleListView, AdminSalleCreateView, AdminSalleDetailView,
     AdminSalleUsersView, AdminUserSalleLinkDetailView, AdminUserSalleLinkListView,
-    AdminUserSalleLinkView, AdminUserSallesView, AdminUserChangePasswordView
+    AdminUserSalleLinkView, AdminUserSallesView, AdminUserChangePasswordView,
+    AdminUserBulkImportView, AdminUserSalleBulkLinkView, AdminUserSalleBulkUnlinkView,
+    AdminUserExportView, AdminSalleExportView, AdminUserSalleLinkExportView, AdminMetricsView,
+    AdminReportView, AdminSearchView, AdminChangesView, AdminDeletionJobView,
+    AdminReportJobListView, AdminReportJobDetailView, AdminReportJobDownloadView, AdminScopeView, BatchView,
 )
 
 urlpatterns = [
     # Login URLS
     path('login/', LoginView.as_view(), name='login'),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('user-dashboard/', UserDashboardView.as_view(), name='user-dashboard'),
     path('admin-dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin-dashboard/metrics/', AdminMetricsView.as_view(), name='admin-metrics'),
+    path('admin-dashboard/reports/<str:report>/', AdminReportView.as_view(), name='admin-report'),
+    path('admin-dashboard/search/', AdminSearchView.as_view(), name='admin-search'),
+    path('admin-dashboard/changes/', AdminChangesView.as_view(), name='admin-changes'),
+    path('admin-dashboard/deletions/<int:id>/', AdminDeletionJobView.as_view(), name='admin-deletion-detail'),
+    path('admin-dashboard/report-jobs/', AdminReportJobListView.as_view(), name='admin-report-job-list'),
+    path('admin-dashboard/report-jobs/<int:id>/', AdminReportJobDetailView.as_view(), name='admin-report-job-detail'),
+    path('admin-dashboard/report-jobs/<int:id>/download/', AdminReportJobDownloadView.as_view(), name='admin-report-job-download'),
     
     # Admin user management URLs
     path('admin-dashboard/users/', AdminUserListView.as_view(), name='admin-user-list'),
     path('admin-dashboard/users/create/', AdminUserCreateView.as_view(), name='admin-user-create'),
+    path('admin-dashboard/users/bulk-import/', AdminUserBulkImportView.as_view(), name='admin-user-bulk-import'),
     path('admin-dashboard/users/<int:id_user>/', AdminUserDetailView.as_view(), name='admin-user-detail'),
     path('admin-dashboard/users/<int:id_user>/change-password/', AdminUserChangePasswordView.as_view(), name='admin-user-change-password'),
+    path('admin-dashboard/users/<int:id_user>/scope/', AdminScopeView.as_view(), name='admin-user-scope'),
 
     # Admin salle management URLs
     path('admin-dashboard/salles/', AdminSalleListView.as_view(), name='admin-salle-list'),
@@ -28,9 +43,16 @@ urlpatterns = [
     # Admin user-salle link management URLs
     path('admin-dashboard/links/', AdminUserSalleLinkListView.as_view(), name='admin-link-list'),
     path('admin-dashboard/links/create/', AdminUserSalleLinkView.as_view(), name='admin-link-create'),
+    path('admin-dashboard/links/bulk-create/', AdminUserSalleBulkLinkView.as_view(), name='admin-link-bulk-create'),
+    path('admin-dashboard/links/bulk-delete/', AdminUserSalleBulkUnlinkView.as_view(), name='admin-link-bulk-delete'),
     path('admin-dashboard/links/<int:id>/', AdminUserSalleLinkDetailView.as_view(), name='admin-link-detail'),
     
     # List Relationships views
     path('admin-dashboard/users/<int:user_id>/salles/', AdminUserSallesView.as_view(), name='admin-user-salles'),
     path('admin-dashboard/salles/<int:salle_id>/users/', AdminSalleUsersView.as_view(), name='admin-salle-users'),
+
+    # Streaming exports (?format=csv or ?format=ndjson)
+    path('admin-dashboard/users/export/', AdminUserExportView.as_view(), name='admin-user-export'),
+    path('admin-dashboard/salles/export/', AdminSalleExportView.as_view(), name='admin-salle-export'),
+    path('admin-dashboard/links/export/', AdminUserSalleLinkExportView.as_view(), name='admin-link-export'),
 ]
\ No newline at end of file
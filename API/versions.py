@@ -0,0 +1,55 @@
+"""
+Per-table change markers used for conditional GET (ETag / Last-Modified).
+
+Each model has a marker in the cache holding the time of its last write, in
+nanoseconds. The signals in signals.py touch it after every committed write,
+so a list or detail response is unchanged as long as the markers of the tables
+it reads are unchanged.
+
+API_VERSION_CACHE must be a cache every process shares (checks.py warns about
+a process-local one): a write handled by one worker, or by a management command
+such as run_deletion_jobs, has to move the markers every other worker reads, or
+they keep answering 304 with stale data.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_VERSION_CACHE', 'default')]
+
+
+def _key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def touch(model):
+    get_cache().set(_key(model), time.time_ns(), timeout=None)
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Unknown after a cache flush: start a new version so old ETags stop matching
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def validators(models, *scope):
+    """
+    Return (etag, last_modified) for a response built from the given models.
+    scope holds whatever else the response depends on (user, URL, format).
+    last_modified is a UNIX timestamp rounded up to the next second.
+    """
+    versions = get_versions(models)
+    digest = hashlib.md5('|'.join(map(str, [*versions, *scope])).encode(), usedforsecurity=False)
+    return quote_etag(digest.hexdigest()), math.ceil(max(versions) / 1e9)
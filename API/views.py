@@ -1,52 +1,90 @@
+import io
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404, render
-from django.utils import timezone
+from django.urls import reverse
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import login
+from rest_framework.exceptions import ParseError, PermissionDenied
+from django.contrib.auth import alogin
 from .serializers import LoginSerializer, UserSerializer
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication
 from rest_framework import generics, permissions
-from .serializers import (UserCreateSerializer, UserUpdateSerializer, SalleSerializer, 
-                          SalleCreateSerializer, UserSalleLinkSerializer, UserSalleListSerializer)
-from .models import User, Salle, User_Salle
+from rest_framework.parsers import MultiPartParser
+from .serializers import (UserCreateSerializer, UserUpdateSerializer, SalleSerializer, SalleDetailSerializer, 
+                          SalleCreateSerializer, UserSalleLinkSerializer, UserSalleListSerializer,
+                          UserImportSerializer, UserSalleBulkLinkSerializer)
+from .models import User, Salle, User_Salle, Change, DeletionJob, ReportJob
+from .filters import filter_users_by_role, filter_links
+from .permissions import IsAdmin, IsFullAdmin, IsRegularUser, check_access
+from .fast_serializers import FastUserSerializer, FastSalleSerializer, FastUserSalleListSerializer
+from .mixins import AtomicWriteMixin, QueryPlanViewMixin, ConditionalGetMixin, FastListMixin, ReplicaReadMixin
+from . import access, batch, bulk, changes, deletions, report_jobs, exports, logins, membership, metrics, rollups, routers, search, stats
+from .parsers import CSVParser, FastJSONParser, read_csv
+from .renderers import CSVExportRenderer, NDJSONExportRenderer
+from .db import pool as db_pool
+from .pagination import UserCursorPagination, SalleCursorPagination, UserSalleCursorPagination
+from .serializers import (AdminScopeSerializer, BatchRequestSerializer, ChangesQuerySerializer, DeletionJobSerializer, ReportJobSerializer,
+                          ReportJobCreateSerializer, ReportQuerySerializer, SearchQuerySerializer)
 from django.contrib.auth.hashers import check_password
 
 
-class LoginView(APIView):
-    permission_classes = [AllowAny]
-    
-    def post(self, request):
-        serializer = LoginSerializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        
-        user = serializer.validated_data['user']
-        
-        # Update last_login timestamp
-        user.last_login = timezone.now()
-        user.save(update_fields=['last_login'])
-        
-        login(request, user)
-        
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    Async login: the password hash is verified in the bounded pool of
+    logins.py and last_login is written in batches, so under ASGI
+    (ReportingBackend/asgi.py) login spikes don't pin the workers on PBKDF2.
+    """
+
+    async def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                data = FastJSONParser().parse(io.BytesIO(request.body))
+            except ParseError as exc:
+                return JsonResponse({'detail': exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            data = request.POST
+        serializer = LoginSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await logins.verify_credentials(request, **serializer.validated_data)
+        if user is None:
+            return JsonResponse({'non_field_errors': ['Unable to log in with provided credentials.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        # Sends user_logged_in, which queues the last_login update (see signals.py)
+        await alogin(request, user)
+
         # Create or get token
-        token, created = Token.objects.get_or_create(user=user)
-        
+        token_key = await logins.get_token_key(user)
+
         # Create response with token and redirect information
         response_data = {
-            'token': token.key,
+            'token': token_key,
             'user_id': user.id_user,
             'email': user.email,
             'is_admin': user.is_admin,
             'redirect_url': 'api/admin-dashboard/' if user.is_admin else 'api/user-dashboard/'
         }
-        
-        return Response(response_data, status=status.HTTP_200_OK)
+
+        return JsonResponse(response_data, status=status.HTTP_200_OK)
 
 
 class UserDashboardView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsRegularUser]
+    admin_message = {
+        'error': 'Unauthorized access',
+        'redirect': 'api/admin-dashboard/'
+    }
 
     def get(self, request):
 
@@ -55,12 +93,6 @@ class UserDashboardView(APIView):
         #print(f"User: {request.user}")
         #print(f"Headers: {request.headers}")
 
-        if request.user.is_admin:
-            return Response({
-                'error': 'Unauthorized access',
-                'redirect': 'api/admin-dashboard/'
-            }, status=status.HTTP_403_FORBIDDEN)
-            
         user_data = UserSerializer(request.user).data
         return Response({
             'message': 'User Dashboard',
@@ -69,37 +101,34 @@ class UserDashboardView(APIView):
 
 
 class AdminDashboardView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+    admin_message = {
+        'error': 'Unauthorized access',
+        'redirect': '/user-dashboard/'
+    }
     
     def get(self, request):
-        if not request.user.is_admin:
-            return Response({
-                'error': 'Unauthorized access',
-                'redirect': '/user-dashboard/'
-            }, status=status.HTTP_403_FORBIDDEN)
-            
         user_data = UserSerializer(request.user).data
-        # Count total users for dashboard stats
-        user_count = User.objects.filter(is_admin=False).count()
-        admin_count = User.objects.filter(is_admin=True).count()
-        # Count total gyms (salles)
-        gym_count = Salle.objects.count()
+        if request.user.is_scoped_admin:
+            # Only what their salles reach (see access.py)
+            dashboard_stats = stats.get_scoped_dashboard_stats(request.user)
+        else:
+            # Counters are maintained in the cache by the model signals (see stats.py)
+            dashboard_stats = stats.get_dashboard_stats()
         
         return Response({
             'message': 'Admin Dashboard',
             'user': user_data,
-            'stats': {
-                'regular_users': user_count,
-                'admin_users': admin_count,
-                'total_gyms': gym_count
-            }
+            'stats': dashboard_stats
         })
 
 
 # Create user account
-class AdminUserCreateView(generics.CreateAPIView):
+class AdminUserCreateView(AtomicWriteMixin, generics.CreateAPIView):
     serializer_class = UserCreateSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can create new users"
     
     #For debugging
     def create(self, request, *args, **kwargs):
@@ -110,108 +139,128 @@ class AdminUserCreateView(generics.CreateAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         return context
-    
-    def perform_create(self, serializer):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can create new users")
-        serializer.save()
+
+
+# Bulk import users from a JSON array, a text/csv body or a CSV file upload (field "file")
+class AdminUserBulkImportView(APIView):
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can import users"
+    parser_classes = [FastJSONParser, CSVParser, MultiPartParser]
+
+    def post(self, request):
+        if 'file' in request.FILES:
+            rows = read_csv(request.FILES['file'])
+        else:
+            rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of users or a CSV file"},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        max_rows = getattr(settings, 'API_BULK_IMPORT', {}).get('MAX_ROWS', 10000)
+        if len(rows) > max_rows:
+            return Response({"error": f"Cannot import more than {max_rows} users at once"},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        created, errors = bulk.import_users(rows, UserImportSerializer, admin_creator=request.user)
+
+        return Response({
+            'created': len(created),
+            'failed': len(errors),
+            'users': [{'row': number, 'id_user': user.id_user, 'email': user.email} for number, user in created],
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
 
 
 # List of All Users with possibility to filter by Admins or Regular Users
-class AdminUserListView(generics.ListAPIView):
+class AdminUserListView(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, QueryPlanViewMixin, generics.ListAPIView):
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer_class = FastUserSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can view user list"
+    version_models = (User,)
+    pagination_class = UserCursorPagination
     
     def get_queryset(self):
-        user = self.request.user
-        if not user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can view user list")
-        
-        # Get the role filter parameter
-        role_filter = self.request.query_params.get('role', None)
-        queryset = User.objects.all()
-        
         # Apply role filter if provided
-        if role_filter is not None:
-            if role_filter.lower() == 'admin':
-                queryset = queryset.filter(is_admin=True)
-            elif role_filter.lower() == 'user':
-                queryset = queryset.filter(is_admin=False)
-        
-        return queryset
+        role_filter = self.request.query_params.get('role', None)
+        queryset = filter_users_by_role(User.objects.all(), role_filter)
+        return access.restrict(queryset, self.request.user, {access.USER: 'pk'})
 
 
-class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
+def _deletion_response(request, job):
+    """204 when the object was deleted right away, 202 with the job deleting it in the background"""
+    if job is None:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    location = reverse('admin-deletion-detail', kwargs={'id': job.pk})
+    return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': request.build_absolute_uri(location)})
+
+
+class AdminUserDetailView(AtomicWriteMixin, ReplicaReadMixin, ConditionalGetMixin, QueryPlanViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserUpdateSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can manage user accounts"
+    scope_kwargs = {'id_user': access.USER}
+    full_admin_methods = ('DELETE',)
+    version_models = (User,)
     queryset = User.objects.all()
     lookup_field = 'id_user'
     
-    def get_object(self):
-        obj = super().get_object()
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can manage user accounts")
-        return obj
-    
+    def destroy(self, request, *args, **kwargs):
+        return _deletion_response(request, self.perform_destroy(self.get_object()))
+
     def perform_destroy(self, instance):
         # Add any custom logic before deletion if needed
         # For example, prevent admins from deleting themselves
         if instance == self.request.user:
-            raise permissions.PermissionDenied("You cannot delete your own account")
-        instance.delete()
+            raise PermissionDenied("You cannot delete your own account")
+        return deletions.request(instance, requested_by=self.request.user)
 
 
-class AdminSalleListView(generics.ListAPIView):
+class AdminSalleListView(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, QueryPlanViewMixin, generics.ListAPIView):
     serializer_class = SalleSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer_class = FastSalleSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can view salle list"
+    version_models = (Salle, User)
+    pagination_class = SalleCursorPagination
     
     def get_queryset(self):
-        user = self.request.user
-        if not user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can view salle list")
-        return Salle.objects.all()
+        return access.restrict(Salle.objects.all(), self.request.user, {access.SALLE: 'pk'})
 
 
-class AdminSalleCreateView(generics.CreateAPIView):
+class AdminSalleCreateView(AtomicWriteMixin, generics.CreateAPIView):
     serializer_class = SalleCreateSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can create new salles"
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
         return context
-    
-    def perform_create(self, serializer):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can create new salles")
-        serializer.save()
 
 
-class AdminSalleDetailView(generics.RetrieveUpdateDestroyAPIView):
-    serializer_class = SalleSerializer
-    permission_classes = [permissions.IsAuthenticated]
+class AdminSalleDetailView(AtomicWriteMixin, ReplicaReadMixin, ConditionalGetMixin, QueryPlanViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = SalleDetailSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can manage salles"
+    scope_kwargs = {'id_salle': access.SALLE}
+    full_admin_methods = ('DELETE',)
+    # User_Salle for link_count
+    version_models = (Salle, User, User_Salle)
     queryset = Salle.objects.all()
     lookup_field = 'id_salle'
     
-    def get_object(self):
-        obj = super().get_object()
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can manage salles")
-        return obj
-    
-    def perform_update(self, serializer):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can update salles")
-        serializer.save()
-    
+    def destroy(self, request, *args, **kwargs):
+        return _deletion_response(request, self.perform_destroy(self.get_object()))
+
     def perform_destroy(self, instance):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can delete salles")
-        instance.delete()
+        return deletions.request(instance, requested_by=self.request.user)
 
 
-class AdminUserSalleLinkView(generics.CreateAPIView):
+class AdminUserSalleLinkView(AtomicWriteMixin, generics.CreateAPIView):
     serializer_class = UserSalleLinkSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can create user-salle links"
     
     #For debugging
     def create(self, request, *args, **kwargs):
@@ -219,90 +268,134 @@ class AdminUserSalleLinkView(generics.CreateAPIView):
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can create user-salle links")
+        check_access(self.request.user, access.USER, [serializer.validated_data['id_user'].pk])
+        check_access(self.request.user, access.SALLE, [serializer.validated_data['id_salle'].pk])
         serializer.save()
     
     
-class AdminUserSalleLinkListView(generics.ListAPIView):
+class AdminUserSalleBulkLinkView(APIView):
+    """Link every given user to every given salle in one request"""
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can create user-salle links"
+
+    def post(self, request):
+        serializer = UserSalleBulkLinkSerializer(data=request.data, context={'max_pairs': _bulk_link_max_pairs()})
+        serializer.is_valid(raise_exception=True)
+        check_access(request.user, access.USER, serializer.validated_data['user_ids'])
+        check_access(request.user, access.SALLE, serializer.validated_data['salle_ids'])
+
+        created, existing = bulk.link_users_to_salles(
+            serializer.validated_data['user_ids'],
+            serializer.validated_data['salle_ids'],
+            admin_creator=request.user
+        )
+        return Response({'created': len(created), 'existing': existing}, status=status.HTTP_201_CREATED)
+
+
+class AdminUserSalleBulkUnlinkView(APIView):
+    """Remove every link between the given users and salles in one request"""
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can delete user-salle links"
+
+    def post(self, request):
+        serializer = UserSalleBulkLinkSerializer(data=request.data, context={'max_pairs': _bulk_link_max_pairs()})
+        serializer.is_valid(raise_exception=True)
+        check_access(request.user, access.USER, serializer.validated_data['user_ids'])
+        check_access(request.user, access.SALLE, serializer.validated_data['salle_ids'])
+
+        deleted = bulk.unlink_users_from_salles(
+            serializer.validated_data['user_ids'],
+            serializer.validated_data['salle_ids']
+        )
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+def _bulk_link_max_pairs():
+    return getattr(settings, 'API_BULK_IMPORT', {}).get('MAX_LINK_PAIRS', 100000)
+
+    
+class AdminUserSalleLinkListView(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, QueryPlanViewMixin, generics.ListAPIView):
     serializer_class = UserSalleListSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer_class = FastUserSalleListSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can view user-salle links"
+    version_models = (User_Salle, User, Salle)
+    pagination_class = UserSalleCursorPagination
     
     def get_queryset(self):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can view user-salle links")
-        
         # Filter parameters
         user_id = self.request.query_params.get('user_id', None)
         salle_id = self.request.query_params.get('salle_id', None)
         
-        queryset = User_Salle.objects.all()
-        
         # Apply filters if provided
-        if user_id:
-            queryset = queryset.filter(id_user__id_user=user_id)
-        if salle_id:
-            queryset = queryset.filter(id_salle__id_salle=salle_id)
-            
-        return queryset
+        queryset = filter_links(User_Salle.objects.all(), user_id, salle_id)
+        return access.restrict(queryset, self.request.user, {access.SALLE: 'id_salle'})
 
 
-class AdminUserSalleLinkDetailView(generics.RetrieveDestroyAPIView):
+class AdminUserSalleLinkDetailView(AtomicWriteMixin, ReplicaReadMixin, ConditionalGetMixin, QueryPlanViewMixin, generics.RetrieveDestroyAPIView):
     serializer_class = UserSalleListSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    queryset = User_Salle.objects.all()
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can manage user-salle links"
+    version_models = (User_Salle, User, Salle)
     lookup_field = 'id'
-    
-    def get_object(self):
-        obj = super().get_object()
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can manage user-salle links")
-        return obj
+
+    def get_queryset(self):
+        # Links out of a scoped admin's salles are not found
+        return access.restrict(User_Salle.objects.all(), self.request.user, {access.SALLE: 'id_salle'})
 
 
-class AdminUserSallesView(generics.ListAPIView):
+class AdminUserSallesView(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, QueryPlanViewMixin, generics.ListAPIView):
     """View to get all salles for a specific user"""
     serializer_class = SalleSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer_class = FastSalleSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can view this information"
+    scope_kwargs = {'user_id': access.USER}
+    version_models = (Salle, User_Salle, User)
     
     def get_queryset(self):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can view this information")
-        
         user_id = self.kwargs.get('user_id')
         if not user_id:
             return Salle.objects.none()
             
-        # Get all salles linked to this user
-        return Salle.objects.filter(user_Links__id_user__id_user=user_id)
+        # Get all salles linked to this user, from the adjacency index (see membership.py)
+        salle_ids = membership.salle_ids_for_user(user_id)
+        if len(salle_ids) > membership.MAX_IN_IDS:
+            queryset = Salle.objects.filter(user_Links__id_user__id_user=user_id).order_by('pk')
+        else:
+            queryset = Salle.objects.filter(pk__in=list(salle_ids)).order_by('pk')
+        return access.restrict(queryset, self.request.user, {access.SALLE: 'pk'})
 
 
-class AdminSalleUsersView(generics.ListAPIView):
+class AdminSalleUsersView(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, QueryPlanViewMixin, generics.ListAPIView):
     """View to get all users for a specific salle"""
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer_class = FastUserSerializer
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can view this information"
+    scope_kwargs = {'salle_id': access.SALLE}
+    version_models = (User, User_Salle)
     
     def get_queryset(self):
-        if not self.request.user.is_admin:
-            raise permissions.PermissionDenied("Only admin users can view this information")
-        
         salle_id = self.kwargs.get('salle_id')
         if not salle_id:
             return User.objects.none()
             
-        # Get all users linked to this salle
-        return User.objects.filter(salle_Links__id_salle__id_salle=salle_id)
+        # Get all users linked to this salle, from the adjacency index (see membership.py)
+        user_ids = membership.user_ids_for_salle(salle_id)
+        if len(user_ids) > membership.MAX_IN_IDS:
+            queryset = User.objects.filter(salle_Links__id_salle__id_salle=salle_id).order_by('pk')
+        else:
+            queryset = User.objects.filter(pk__in=list(user_ids)).order_by('pk')
+        return access.restrict(queryset, self.request.user, {access.USER: 'pk'})
 
 
 class AdminUserChangePasswordView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdmin]
+    admin_message = {'error': "Only administrators can change passwords"}
+    scope_kwargs = {'id_user': access.USER}
     
     def put(self, request, id_user):
-        # Check if current user is an admin
-        if not request.user.is_admin:
-            return Response({"error": "Only administrators can change passwords"}, 
-                          status=status.HTTP_403_FORBIDDEN)
-            
         user = get_object_or_404(User, id_user=id_user)
         
         new_password = request.data.get('new_password')
@@ -314,6 +407,339 @@ class AdminUserChangePasswordView(APIView):
         
         # Set new password
         user.set_password(new_password)
-        user.save()
+        with transaction.atomic():
+            user.save()
         
-        return Response({"message": "Password changed successfully"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"message": "Password changed successfully"}, status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    """
+    Streams a whole table as CSV (default) or NDJSON, picked with ?format=csv|ndjson
+    or the Accept header; rows are read in keyset chunks so memory stays flat
+    """
+    permission_classes = [IsAdmin]
+    admin_message = "Only admin users can export data"
+    renderer_classes = [CSVExportRenderer, NDJSONExportRenderer]
+    filename = None
+    # access.USER / access.SALLE -> field holding their id, for the scoped admins
+    scope_paths = {}
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get(self, request):
+        chunk_size = getattr(settings, 'API_EXPORT_CHUNK_SIZE', 2000)
+        renderer = request.accepted_renderer
+        # Rows are read while streaming, after get() returns: pin the queryset to the replica
+        with routers.use_replica():
+            queryset = access.restrict(self.get_queryset(), request.user, self.scope_paths).using(routers.read_alias())
+        if renderer.format == 'ndjson':
+            rows = exports.stream_ndjson(queryset, chunk_size)
+        else:
+            rows = exports.stream_csv(queryset, chunk_size)
+
+        response = StreamingHttpResponse(rows, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{renderer.format}"'
+        return response
+
+
+class AdminScopeView(APIView):
+    """
+    Limits an admin to some salles (see access.py), e.g.
+    PUT /api/admin-dashboard/users/<id_user>/scope/ {"is_scoped_admin": true, "salle_ids": [1, 2]}
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can manage admin scopes"
+
+    def get(self, request, id_user):
+        admin = get_object_or_404(User, id_user=id_user, is_admin=True)
+        return Response(self.scope(admin))
+
+    def put(self, request, id_user):
+        admin = get_object_or_404(User, id_user=id_user, is_admin=True)
+        serializer = AdminScopeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            admin.is_scoped_admin = serializer.validated_data['is_scoped_admin']
+            admin.save(update_fields=['is_scoped_admin'])
+            access.assign(admin, serializer.validated_data['salle_ids'])
+        return Response(self.scope(admin))
+
+    def scope(self, admin):
+        return {
+            'id_user': admin.id_user,
+            'is_scoped_admin': admin.is_scoped_admin,
+            'salle_ids': list(admin.managed_salles.order_by('salle_id').values_list('salle_id', flat=True)),
+        }
+
+
+class AdminUserExportView(ExportView):
+    filename = 'users'
+    scope_paths = {access.USER: 'pk'}
+
+    def get_queryset(self):
+        return filter_users_by_role(User.objects.all(), self.request.query_params.get('role', None))
+
+
+class AdminSalleExportView(ExportView):
+    filename = 'salles'
+    scope_paths = {access.SALLE: 'pk'}
+
+    def get_queryset(self):
+        return Salle.objects.all()
+
+
+class AdminUserSalleLinkExportView(ExportView):
+    filename = 'links'
+    scope_paths = {access.SALLE: 'id_salle'}
+
+    def get_queryset(self):
+        user_id = self.request.query_params.get('user_id', None)
+        salle_id = self.request.query_params.get('salle_id', None)
+        return filter_links(User_Salle.objects.all(), user_id, salle_id)
+
+
+class AdminMetricsView(APIView):
+    """
+    Per-endpoint histograms of SQL queries, SQL time, serialization time and latency,
+    and database connection pool counters (this process only)
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can view metrics"
+
+    def get(self, request):
+        return Response({
+            'query_budgets': getattr(settings, 'API_QUERY_BUDGETS', {}),
+            'endpoints': metrics.registry.snapshot(),
+            # Connection pools of the API.db.backends engines, empty without OPTIONS['pool']
+            'db_pools': db_pool.snapshot(),
+        })
+
+    def delete(self, request):
+        metrics.registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Time-series reports, served from the pre-aggregated buckets in rollups.py
+class AdminReportView(APIView):
+    """
+    One series of {bucket, count} points per dimension, e.g.
+    GET /api/admin-dashboard/reports/new-users/?period=week&start=2025-01-01
+    Buckets without rows are left out of the points.
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can view reports"
+    # report -> (rollup metric, cumulative, model naming the dimension)
+    reports = {
+        'new-users': ('users', False, User),
+        'new-salles': ('salles', False, User),
+        'salle-links': ('links', False, Salle),
+        'salle-growth': ('links', True, Salle),
+    }
+
+    def get(self, request, report):
+        if report not in self.reports:
+            return Response({"error": f"Unknown report, expected one of: {', '.join(self.reports)}"},
+                          status=status.HTTP_404_NOT_FOUND)
+        metric, cumulative, dimension_model = self.reports[report]
+
+        query = ReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        with routers.use_replica():
+            points = rollups.series(
+                metric, params['period'], start=params.get('start'), end=params.get('end'),
+                dimension=params.get('dimension'), cumulative=cumulative,
+            )
+            names = dict(
+                dimension_model.objects.filter(pk__in=points).values_list(dimension_model._meta.pk.attname, 'name')
+            ) if points else {}
+
+        return Response({
+            'report': report,
+            'period': params['period'],
+            'start': params.get('start'),
+            'end': params.get('end'),
+            'series': [
+                {
+                    'dimension': dimension,
+                    'name': names.get(dimension),
+                    'points': [{'bucket': bucket, 'count': count} for bucket, count in dimension_points],
+                }
+                for dimension, dimension_points in points.items()
+            ],
+        })
+
+
+class AdminSearchView(APIView):
+    """
+    Users and/or salles matching every word of q as a prefix, best first, e.g.
+    GET /api/admin-dashboard/search/?q=dup jea&type=user&limit=10
+    Each result is rendered like the list endpoints, plus its score.
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can search"
+    # type -> (search kind, model, fast serializer)
+    kinds = {
+        'user': ('user', User, FastUserSerializer),
+        'salle': ('salle', Salle, FastSalleSerializer),
+    }
+
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        types = list(self.kinds) if params['type'] == 'all' else [params['type']]
+
+        results = {}
+        with routers.use_replica():
+            for name in types:
+                kind, model, serializer_class = self.kinds[name]
+                ranked = search.search(kind, params['q'], limit=params['limit'])
+                rows = {}
+                if ranked:
+                    queryset = model.objects.filter(pk__in=[pk for pk, _ in ranked])
+                    rows = {row[0]: row for row in serializer_class.project(queryset)}
+                # Objects deleted since their prefixes were read are left out
+                found = [(pk, score) for pk, score in ranked if pk in rows]
+                data = serializer_class([rows[pk] for pk, _ in found]).data
+                results[name] = [{**item, 'score': score} for item, (_, score) in zip(data, found)]
+
+        return Response({'q': params['q'], 'results': results})
+
+
+class AdminChangesView(APIView):
+    """
+    Users, salles and links written or deleted since a cursor (see changes.py):
+    GET /api/admin-dashboard/changes/ gives the current cursor, then
+    GET /api/admin-dashboard/changes/?since=<cursor> the objects changed after it,
+    as the list endpoints render them, and the ids of the deleted ones.
+    Follow the returned cursor while has_more is true. An expired cursor
+    answers 410 Gone: pull the lists again from the cursor given with it.
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can sync changes"
+    # changes.KINDS kind -> (response key, model, fast serializer)
+    kinds = {
+        'user': ('users', User, FastUserSerializer),
+        'salle': ('salles', Salle, FastSalleSerializer),
+        'link': ('links', User_Salle, FastUserSalleListSerializer),
+    }
+
+    def get(self, request):
+        query = ChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        with routers.use_replica():
+            if 'since' not in params:
+                latest = {kind: {} for kind in self.kinds}
+                cursor, has_more = changes.latest_cursor(), False
+            else:
+                try:
+                    latest, cursor, has_more = changes.changes_since(params['since'], params.get('limit'))
+                except changes.CursorExpired:
+                    return Response({"error": "This cursor has expired, pull the lists again",
+                                     "cursor": changes.latest_cursor()}, status=status.HTTP_410_GONE)
+
+            data = {'cursor': cursor, 'has_more': has_more}
+            for kind, (key, model, serializer_class) in self.kinds.items():
+                upserted = [pk for pk, action in latest[kind].items() if action == Change.UPSERT]
+                rows = []
+                if upserted:
+                    rows = list(serializer_class.project(model.objects.filter(pk__in=upserted).order_by('pk')))
+                # Objects gone since their last write are reported as deleted
+                found = {row[0] for row in rows}
+                data[key] = {
+                    'upserted': serializer_class(rows).data,
+                    'deleted': sorted(pk for pk in latest[kind] if pk not in found),
+                }
+        return Response(data)
+
+
+class AdminDeletionJobView(APIView):
+    """Progress of a background deletion (see deletions.py), polled after a DELETE answered 202"""
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can view deletions"
+
+    def get(self, request, id):
+        job = get_object_or_404(DeletionJob, pk=id)
+        return Response(DeletionJobSerializer(job).data)
+
+
+class AdminReportJobListView(APIView):
+    """
+    Reports generated in the background (see report_jobs.py):
+    POST {"report": "membership", "format": "csv"} queues one and answers 202,
+    GET lists the caller's recent jobs. Poll the job, then download its file.
+    """
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can view report jobs"
+
+    def get(self, request):
+        jobs = ReportJob.objects.filter(requested_by=request.user).order_by('-id')[:50]
+        return Response(ReportJobSerializer(jobs, many=True, context={'request': request}).data)
+
+    def post(self, request):
+        serializer = ReportJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        params = {'role': data['role']} if 'role' in data else {}
+        try:
+            job = report_jobs.submit(request.user, data['report'], data['format'], params)
+        except report_jobs.QueueFull:
+            return Response({"error": "Too many reports queued, wait for one to finish"},
+                          status=status.HTTP_429_TOO_MANY_REQUESTS)
+        location = reverse('admin-report-job-detail', kwargs={'id': job.pk})
+        return Response(ReportJobSerializer(job, context={'request': request}).data,
+                        status=status.HTTP_202_ACCEPTED, headers={'Location': request.build_absolute_uri(location)})
+
+
+class AdminReportJobDetailView(APIView):
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can view report jobs"
+
+    def get(self, request, id):
+        job = get_object_or_404(ReportJob, pk=id, requested_by=request.user)
+        return Response(ReportJobSerializer(job, context={'request': request}).data)
+
+
+class AdminReportJobDownloadView(APIView):
+    """The file of a done report job: 409 while it is not ready, 410 once expired"""
+    permission_classes = [IsFullAdmin]
+    admin_message = "Only admin users can download reports"
+    batchable = False
+
+    def get(self, request, id):
+        job = get_object_or_404(ReportJob, pk=id, requested_by=request.user)
+        if job.status == ReportJob.EXPIRED:
+            return Response({"error": "This report has expired, request it again"}, status=status.HTTP_410_GONE)
+        if job.status != ReportJob.DONE:
+            return Response({"error": f"This report is {job.status}", "status": job.status},
+                          status=status.HTTP_409_CONFLICT)
+        content_type = 'application/x-ndjson' if job.format == 'ndjson' else 'text/csv'
+        return FileResponse(job.result.open('rb'), as_attachment=True, content_type=f'{content_type}; charset=utf-8',
+                            filename=f'{job.report}.{job.format}')
+
+
+class BatchView(APIView):
+    """
+    Runs the API requests listed in the body and returns their responses in one, e.g.
+    POST /api/batch/ {"requests": [{"path": "/api/admin-dashboard/"},
+                                   {"path": "/api/admin-dashboard/users/?page_size=20"}],
+                      "concurrent": true}
+    gives {"responses": [{"status", "headers", "body"}, ...]} in the same order, see batch.py.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    batchable = False
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(
+            data=request.data, context={'max_requests': getattr(settings, 'API_BATCH', {}).get('MAX_REQUESTS', 20)}
+        )
+        serializer.is_valid(raise_exception=True)
+        responses = batch.run(request, serializer.validated_data['requests'],
+                              concurrent=serializer.validated_data['concurrent'])
+        return Response({'responses': responses})
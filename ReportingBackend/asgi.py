@@ -2,6 +2,8 @@
 ASGI config for ReportingBackend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn ReportingBackend.asgi:application``)
+so the async login view runs on the event loop instead of a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
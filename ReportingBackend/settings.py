@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'API.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +95,13 @@ DATABASES = {
     }
 }
 
+# Read-only views and dashboard statistics read from one of API_READ_REPLICAS
+# (aliases of DATABASES) when set, everything else uses 'default' (see API/routers.py).
+# Responses from a replica within API_READ_REPLICA_MAX_LAG seconds of a write carry no ETag/Last-Modified.
+DATABASE_ROUTERS = ['API.routers.ReplicaRouter']
+API_READ_REPLICAS = []
+API_READ_REPLICA_MAX_LAG = 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +139,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Files written by the report job worker (see API/report_jobs.py), served by the API only
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -144,11 +155,164 @@ AUTH_USER_MODEL = 'API.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'API.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON when installed, stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'API.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'API.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 AUTH_PASSWORD_VALIDATORS = [] # Only for Testing, should be removed in production
+
+# Cache used by the API (dashboard counters, ...).
+# Local memory is per process: point this at a shared backend (Redis, Memcached)
+# when running several workers so that every worker sees the same counters.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+API_STATS_CACHE = 'default'
+# Per-table change markers behind the ETag/Last-Modified headers of the list and detail views.
+# Shared like the counters: a worker missing another's write would keep answering 304.
+API_VERSION_CACHE = 'default'
+
+# Resolved auth tokens are cached in process for TTL seconds (and in SHARED_CACHE
+# for SHARED_TTL seconds when set) to skip the Token+User query on every request
+API_TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+# Salle ids per user and user ids per salle for the relationship views, cached
+# like the tokens above; MAX_IN_IDS bounds the pk__in list before falling back to a join
+API_MEMBERSHIP_CACHE = {
+    'MAX_SIZE': 50000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+    'MAX_IN_IDS': 5000,
+}
+
+# Salles and users each scoped admin can reach (see API/access.py), cached like
+# the membership index above
+API_ACCESS_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+# Bulk endpoints: rows per user import, user x salle pairs per bulk link request,
+# rows per INSERT batch, password hashing processes (None uses every core), and
+# rows below which an import hashes its passwords in the request thread instead
+API_BULK_IMPORT = {
+    'MAX_ROWS': 10000,
+    'MAX_LINK_PAIRS': 100000,
+    'BATCH_SIZE': 500,
+    'HASH_WORKERS': None,
+    'MIN_POOL_ROWS': 8,
+}
+
+# Async login (see API/logins.py): HASH_WORKERS threads verify password hashes
+# (None: one per CPU); last_login is written every LAST_LOGIN_FLUSH_INTERVAL
+# seconds (0: on every login); token keys are cached per user for TOKEN_CACHE_TTL seconds, or until
+# a token is deleted (the Token change marker moves).
+API_LOGIN = {
+    'HASH_WORKERS': None,
+    'LAST_LOGIN_FLUSH_INTERVAL': 5,
+    'TOKEN_CACHE_SIZE': 10000,
+    'TOKEN_CACHE_TTL': 300,
+}
+
+# Delta sync (see API/changes.py): changes per page of the changes endpoint, journal rows
+# younger than SETTLE_SECONDS held back (longer than the longest write transaction),
+# and days of journal kept by prune_changes
+API_CHANGES = {
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 5000,
+    'SETTLE_SECONDS': 5,
+    'RETENTION_DAYS': 30,
+}
+
+# Batch endpoint (see API/batch.py): sub-requests per batch, and threads running
+# the consecutive GETs of a concurrent batch
+API_BATCH = {
+    'MAX_REQUESTS': 20,
+    'CONCURRENCY': 4,
+}
+
+# Background deletions (see API/deletions.py): users and salles with at least
+# BACKGROUND_MIN_DEPENDENTS links (and, for an admin, created salles and users)
+# are deleted by the run_deletion_jobs worker, BATCH_SIZE rows per transaction.
+# A running job whose heartbeat is older than STALE_AFTER seconds is taken over, a failed
+# one runs again after RETRY_DELAY seconds (doubled every time) up to MAX_ATTEMPTS runs.
+# API processes look for finished jobs at most every RECONCILE_INTERVAL seconds.
+API_DELETION = {
+    'BACKGROUND_MIN_DEPENDENTS': 1000,
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 2,
+    'STALE_AFTER': 300,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,
+    'RECONCILE_INTERVAL': 1,
+}
+
+# Report jobs (see API/report_jobs.py): jobs running at once across workers,
+# unfinished jobs per user, runs per job (retried after RETRY_DELAY seconds,
+# doubled every time), and seconds a file is kept once done
+API_REPORT_JOBS = {
+    'MAX_RUNNING': 2,
+    'MAX_QUEUED_PER_USER': 5,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,
+    'RESULT_TTL': 24 * 3600,
+    'POLL_INTERVAL': 2,
+    'STALE_AFTER': 600,
+}
+
+# Rows fetched per query by the streaming CSV/NDJSON exports
+API_EXPORT_CHUNK_SIZE = 2000
+
+# Maximum SQL queries per request, by URL name and HTTP method (HEAD takes the GET
+# budget, other methods are not checked; see API/metrics.py).
+# Over-budget requests log a warning, or raise when API_QUERY_BUDGET_STRICT is True.
+API_QUERY_BUDGETS = {
+    # User, session and first-login token writes; last_login is batched by the flusher
+    # (with LAST_LOGIN_FLUSH_INTERVAL 0 it is written and journaled in a transaction of its own)
+    'login': {'POST': 16},
+    'user-dashboard': {'GET': 1},
+    # Counters are served from the cache; a cold cache costs one reconciliation
+    'admin-dashboard': {'GET': 6},
+    'admin-metrics': {'GET': 1},
+    # Buckets, the totals before start for cumulative reports and the names of the dimensions
+    'admin-report': {'GET': 3},
+    # Per kind: a bounded count per word (queries of several words), ranked matches and their rows
+    'admin-search': {'GET': 8},
+    # Journal rows, then the current rows of the changed users, salles and links
+    'admin-changes': {'GET': 4},
+    # The rows, plus on cold caches the token and a scoped admin's access sets (see API/access.py)
+    'admin-user-list': {'GET': 3},
+    'admin-user-detail': {'GET': 3},
+    'admin-salle-list': {'GET': 3},
+    'admin-salle-detail': {'GET': 3},
+    'admin-link-list': {'GET': 3},
+    'admin-link-detail': {'GET': 3},
+    # and the adjacency index (see API/membership.py)
+    'admin-user-salles': {'GET': 4},
+    'admin-salle-users': {'GET': 4},
+}
+API_QUERY_BUDGET_STRICT = False
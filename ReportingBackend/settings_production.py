@@ -0,0 +1,64 @@
+"""
+Production profile: DJANGO_SETTINGS_MODULE=ReportingBackend.settings_production
+
+Every worker takes its MySQL connections from a bounded pool (API/db/pool.py):
+connections are returned to the pool at the end of each request (CONN_MAX_AGE = 0)
+and reused by the next one, pinged when they sat idle for DB_POOL_CHECK_IDLE
+seconds and recycled after DB_POOL_MAX_LIFETIME seconds. Size the pool per worker
+so that workers x DB_POOL_SIZE stays below the server's max_connections.
+Pool metrics are reported by the admin metrics endpoint.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# The dashboard counters and the ETag change markers live in this cache: every
+# worker, and the management commands writing or reconciling them, must share it
+# (see API/checks.py)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.environ['CACHE_LOCATION'],
+    }
+}
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'ENGINE': 'API.db.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_PORT', DATABASES['default']['PORT']),
+        # Hand the connection back to the pool after every request
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'pool': {
+                'max_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+                'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+                'check_idle': float(os.environ.get('DB_POOL_CHECK_IDLE', 30)),
+            },
+        },
+    }
+}
+
+# Optional read replica for the read-only views and dashboard statistics (see API/routers.py)
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    API_READ_REPLICAS = ['replica']
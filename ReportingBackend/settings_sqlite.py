@@ -0,0 +1,30 @@
+"""
+Local SQLite stand-in for the MySQL database, used by the benchmarks and for
+running the test suite without a MySQL server:
+
+    DJANGO_SETTINGS_MODULE=ReportingBackend.settings_sqlite python manage.py test
+
+SQLITE_NAME selects the database file (defaults to db.sqlite3 in the project).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+    },
+    # Stand-in read replica: a second connection to the same file unless
+    # SQLITE_REPLICA_NAME points elsewhere. Only used when listed in
+    # API_READ_REPLICAS; the tests get a separate database for it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_REPLICA_NAME', os.environ.get('SQLITE_NAME', BASE_DIR / 'db.sqlite3')),
+    },
+}
+
+# The in-memory test database is only visible to the connection of the test
+# thread, so write last_login inline instead of from the flusher thread
+API_LOGIN = {**API_LOGIN, 'LAST_LOGIN_FLUSH_INTERVAL': 0}  # noqa: F405
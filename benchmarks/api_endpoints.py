@@ -0,0 +1,341 @@
+"""
+Timed scenarios for every route in API/urls.py against a seeded SQLite stand-in.
+
+Reports p50/p95 latency, SQL queries per request and peak memory per request,
+and compares them with the stored baseline of the same scale:
+
+    python -m benchmarks.api_endpoints --scale small                  # compare with baselines/small.json
+    python -m benchmarks.api_endpoints --scale small --save-baseline  # record a new baseline
+    python -m benchmarks.api_endpoints --scale 1m --reuse-db          # keep the seeded database between runs
+
+Exits with status 1 when a scenario runs more queries than its baseline or its
+p95 latency grows beyond --tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BASELINES_DIR = BENCHMARKS_DIR / 'baselines'
+
+
+class Scenario:
+    def __init__(self, name, method, build, iterations=None, token='admin_token'):
+        self.name = name
+        self.url_name = name.split('[')[0]
+        self.method = method
+        self.build = build
+        self.iterations = iterations
+        # Key of the ctx token the requests are sent with
+        self.token = token
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def dashboard_page(ctx):
+    return [
+        {'path': '/api/admin-dashboard/'},
+        {'path': '/api/admin-dashboard/users/'},
+        {'path': '/api/admin-dashboard/salles/'},
+        {'path': f"/api/admin-dashboard/users/{ctx['id_user']}/salles/"},
+        {'path': f"/api/admin-dashboard/salles/{ctx['id_salle']}/users/"},
+    ]
+
+
+def scenarios(ctx):
+    """ctx holds the ids and tokens prepared by prepare(); build(i) returns (path, payload)"""
+    return [
+        Scenario('login', 'post', lambda i: ('/api/login/', {'email': ctx['admin_email'], 'password': ctx['password']}),
+                 iterations=5),
+        Scenario('user-dashboard', 'get', lambda i: ('/api/user-dashboard/', None), token='user_token'),
+        Scenario('admin-dashboard', 'get', lambda i: ('/api/admin-dashboard/', None)),
+        Scenario('admin-metrics', 'get', lambda i: ('/api/admin-dashboard/metrics/', None)),
+        Scenario('admin-report[new-users]', 'get', lambda i: ('/api/admin-dashboard/reports/new-users/?period=week', None)),
+        Scenario('admin-report[salle-growth]', 'get', lambda i: (
+            '/api/admin-dashboard/reports/salle-growth/?start=2000-01-01', None)),
+        Scenario('admin-search', 'get', lambda i: (f'/api/admin-dashboard/search/?q=user {i % 90 + 10}', None)),
+        Scenario('admin-search[one word]', 'get', lambda i: ('/api/admin-dashboard/search/?q=user', None)),
+        # Two prefixes every user holds, the probes have to count past their first limit
+        Scenario('admin-search[common words]', 'get', lambda i: ('/api/admin-dashboard/search/?q=user use&type=user', None)),
+        Scenario('admin-user-list', 'get', lambda i: ('/api/admin-dashboard/users/', None)),
+        Scenario('admin-user-list[role=user]', 'get', lambda i: ('/api/admin-dashboard/users/?role=user', None)),
+        Scenario('admin-user-list[fields=id_user,name]', 'get', lambda i: (
+            '/api/admin-dashboard/users/?fields=id_user,name', None)),
+        Scenario('admin-user-list[page 5]', 'get', lambda i: (ctx['user_page_5'], None)),
+        # A salle-scoped admin, narrowed by the access index: compare with the unscoped scenarios
+        Scenario('admin-user-list[scoped]', 'get', lambda i: ('/api/admin-dashboard/users/', None), token='scoped_token'),
+        Scenario('admin-user-create', 'post', lambda i: ('/api/admin-dashboard/users/create/', {
+            'email': f'bench-create-{i}@bench.example', 'name': f'Bench {i}', 'phone': '0600000000',
+            'password': 'benchmark', 'is_admin': False,
+        }), iterations=5),
+        Scenario('admin-user-bulk-import', 'post', lambda i: ('/api/admin-dashboard/users/bulk-import/', [
+            {'email': f'bench-import-{i}-{row}@bench.example', 'name': f'Import {row}', 'phone': '0600000000',
+             'password': 'benchmark'}
+            for row in range(20)
+        ]), iterations=3),
+        Scenario('admin-user-detail', 'get', lambda i: (f"/api/admin-dashboard/users/{ctx['id_user']}/", None)),
+        Scenario('admin-user-change-password', 'put', lambda i: (
+            f"/api/admin-dashboard/users/{ctx['id_user']}/change-password/", {'new_password': 'benchmark'}),
+            iterations=5),
+        Scenario('admin-salle-list', 'get', lambda i: ('/api/admin-dashboard/salles/', None)),
+        Scenario('admin-salle-create', 'post', lambda i: ('/api/admin-dashboard/salles/create/', {
+            'name': f'Bench salle {i}', 'phone': '0500000000'})),
+        Scenario('admin-salle-detail', 'get', lambda i: (f"/api/admin-dashboard/salles/{ctx['id_salle']}/", None)),
+        Scenario('admin-salle-detail[scoped]', 'get', lambda i: (
+            f"/api/admin-dashboard/salles/{ctx['id_salle']}/", None), token='scoped_token'),
+        Scenario('admin-user-scope', 'get', lambda i: (f"/api/admin-dashboard/users/{ctx['id_scoped']}/scope/", None)),
+        Scenario('admin-link-list', 'get', lambda i: ('/api/admin-dashboard/links/', None)),
+        Scenario('admin-link-list[salle_id]', 'get', lambda i: (
+            f"/api/admin-dashboard/links/?salle_id={ctx['id_salle']}", None)),
+        Scenario('admin-link-list[scoped]', 'get', lambda i: ('/api/admin-dashboard/links/', None), token='scoped_token'),
+        Scenario('admin-link-create', 'post', lambda i: ('/api/admin-dashboard/links/create/', {
+            'id_user': ctx['free_users'][i], 'id_salle': ctx['id_salle']})),
+        Scenario('admin-link-bulk-create', 'post', lambda i: ('/api/admin-dashboard/links/bulk-create/', {
+            'user_ids': ctx['free_users'], 'salle_ids': [ctx['other_salles'][i]]})),
+        Scenario('admin-link-bulk-delete', 'post', lambda i: ('/api/admin-dashboard/links/bulk-delete/', {
+            'user_ids': ctx['free_users'], 'salle_ids': [ctx['other_salles'][i]]})),
+        Scenario('admin-link-detail', 'get', lambda i: (f"/api/admin-dashboard/links/{ctx['id_link']}/", None)),
+        Scenario('admin-user-salles', 'get', lambda i: (f"/api/admin-dashboard/users/{ctx['id_user']}/salles/", None)),
+        Scenario('admin-salle-users', 'get', lambda i: (f"/api/admin-dashboard/salles/{ctx['id_salle']}/users/", None)),
+        Scenario('admin-salle-users[scoped]', 'get', lambda i: (
+            f"/api/admin-dashboard/salles/{ctx['id_salle']}/users/", None), token='scoped_token'),
+        Scenario('admin-changes', 'get', lambda i: ('/api/admin-dashboard/changes/?since=0', None)),
+        Scenario('admin-report-job-list', 'get', lambda i: ('/api/admin-dashboard/report-jobs/', None)),
+        Scenario('admin-report-job-detail', 'get', lambda i: (
+            f"/api/admin-dashboard/report-jobs/{ctx['id_report_job']}/", None)),
+        Scenario('admin-report-job-download', 'get', lambda i: (
+            f"/api/admin-dashboard/report-jobs/{ctx['id_report_job']}/download/", None), iterations=3),
+        Scenario('admin-deletion-detail', 'get', lambda i: (f"/api/admin-dashboard/deletions/{ctx['id_deletion']}/", None)),
+        # The burst of reads of the dashboard page, to compare with the sum of the scenarios above
+        Scenario('batch[dashboard page]', 'post', lambda i: ('/api/batch/', {'requests': dashboard_page(ctx)})),
+        Scenario('batch[dashboard page, concurrent]', 'post', lambda i: ('/api/batch/', {
+            'requests': dashboard_page(ctx), 'concurrent': True})),
+        Scenario('admin-user-export', 'get', lambda i: ('/api/admin-dashboard/users/export/', None), iterations=3),
+        Scenario('admin-salle-export', 'get', lambda i: ('/api/admin-dashboard/salles/export/', None), iterations=3),
+        Scenario('admin-link-export', 'get', lambda i: ('/api/admin-dashboard/links/export/', None), iterations=3),
+    ]
+
+
+def prepare(client_class, iterations):
+    from django.db.models import Count
+
+    from API import report_jobs, seeding
+    from API.models import User, Salle, User_Salle, ManagedSalle, DeletionJob
+
+    admin = User.objects.filter(is_admin=True, email__endswith=f'@{seeding.EMAIL_DOMAIN}').order_by('id_user').first()
+    user = User.objects.filter(is_admin=False, email__endswith=f'@{seeding.EMAIL_DOMAIN}').order_by('id_user').first()
+    busiest = User_Salle.objects.values('id_salle').annotate(n=Count('pk')).order_by('-n', 'id_salle')[0]['id_salle']
+
+    # Users without links, for the link creation scenarios
+    free_users = User.objects.bulk_create([
+        User(email=f'bench-free-{i}-{time.time_ns()}@bench.example', name=f'Free {i}', admin_creator=admin)
+        for i in range(max(iterations, 50) + 2)
+    ])
+    free_ids = list(User.objects.filter(email__startswith='bench-free-').order_by('-id_user')
+                    .values_list('id_user', flat=True)[:len(free_users)])
+    other_salles = list(Salle.objects.exclude(id_salle=busiest).order_by('id_salle')
+                        .values_list('id_salle', flat=True)[:iterations + 2])
+
+    # An admin limited to the busiest salle and a few others
+    scoped = User.objects.create_user(f'bench-scoped-{time.time_ns()}@bench.example', seeding.DEFAULT_PASSWORD,
+                                      name='Scoped', is_admin=True, is_scoped_admin=True)
+    ManagedSalle.objects.bulk_create([ManagedSalle(admin=scoped, salle_id=id_salle)
+                                      for id_salle in [busiest] + other_salles[:5]])
+
+    # A deletion waiting for its worker, for the progress polling scenario
+    doomed = User.objects.create(email=f'bench-doomed-{time.time_ns()}@bench.example', name='Doomed', is_active=False)
+    deletion = DeletionJob.objects.create(kind='user', object_id=doomed.id_user, requested_by=admin)
+
+    # A generated report, for the polling and download scenarios
+    report_job = report_jobs.submit(admin, 'salles')
+    report_jobs.run(report_jobs.claim())
+
+    def token_for(account):
+        response = client_class().post('/api/login/', {'email': account.email, 'password': seeding.DEFAULT_PASSWORD},
+                                        content_type='application/json')
+        return response.json()['token']
+
+    admin_client = client_class(HTTP_AUTHORIZATION=f'Token {token_for(admin)}')
+    next_url = '/api/admin-dashboard/users/'
+    for _ in range(5):
+        next_url = admin_client.get(next_url).json()['next'] or next_url
+
+    return {
+        'admin_email': admin.email,
+        'password': seeding.DEFAULT_PASSWORD,
+        'admin_token': admin_client.defaults['HTTP_AUTHORIZATION'],
+        'user_token': f'Token {token_for(user)}',
+        'scoped_token': f'Token {token_for(scoped)}',
+        'id_scoped': scoped.id_user,
+        'id_user': user.id_user,
+        'id_salle': busiest,
+        'id_deletion': deletion.id,
+        'id_report_job': report_job.id,
+        'id_link': User_Salle.objects.filter(id_salle=busiest).values_list('id', flat=True).first(),
+        'free_users': free_ids,
+        'other_salles': other_salles,
+        'user_page_5': next_url.split('testserver', 1)[-1],
+    }
+
+
+def send(client, scenario, index):
+    path, payload = scenario.build(index)
+    if payload is None:
+        response = getattr(client, scenario.method)(path)
+    else:
+        response = getattr(client, scenario.method)(path, json.dumps(payload), content_type='application/json')
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    if response.status_code >= 400:
+        raise RuntimeError(f'{scenario.name}: {path} answered {response.status_code}')
+    return response
+
+
+def run_scenario(scenario, ctx, client_class, iterations):
+    from django.db import connections
+
+    client = client_class(HTTP_AUTHORIZATION=ctx[scenario.token])
+    count = scenario.iterations or iterations
+
+    # Warm the token, stats and ETag caches like a steady-state client would
+    send(client, scenario, count)
+
+    latencies = []
+    queries = []
+    for index in range(count):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            send(client, scenario, index)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+
+    tracemalloc.start()
+    send(client, scenario, count + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    return {
+        'iterations': count,
+        'p50_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result['queries'] > reference['queries']:
+            regressions.append(f"{name}: {result['queries']} queries per request, baseline {reference['queries']}")
+        limit = reference['p95_ms'] * (1 + tolerance)
+        if result['p95_ms'] > limit and result['p95_ms'] - reference['p95_ms'] > min_delta_ms:
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {reference['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='small', help='Dataset size from API.seeding.SCALES')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--only', nargs='*', help='Run only these scenarios')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--reuse-db', action='store_true', help='Keep the seeded database for the next run')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative p95 growth')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='Ignore p95 growth smaller than this')
+    args = parser.parse_args(argv)
+
+    database = BENCHMARKS_DIR / f'api_{args.scale}.sqlite3'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReportingBackend.settings_sqlite')
+    os.environ['SQLITE_NAME'] = str(database)
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    # Report files are written by prepare(), keep them out of the project's media
+    media = tempfile.TemporaryDirectory()
+    settings.MEDIA_ROOT = media.name
+
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from API import seeding
+    from API.urls import urlpatterns
+
+    if args.scale not in seeding.SCALES:
+        parser.error(f'unknown scale {args.scale}, choose from {", ".join(seeding.SCALES)}')
+
+    setup_test_environment()
+    if not (args.reuse_db and database.exists()):
+        database.unlink(missing_ok=True)
+        call_command('migrate', verbosity=0)
+        started = time.perf_counter()
+        call_command('seed_data', scale=args.scale, verbosity=0, stdout=open(os.devnull, 'w'))
+        print(f'Seeded scale {args.scale} in {time.perf_counter() - started:.1f} s')
+
+    ctx = prepare(Client, args.iterations)
+    all_scenarios = scenarios(ctx)
+
+    api_routes = {pattern.name for pattern in urlpatterns if pattern.name}
+    missing = api_routes - {scenario.url_name for scenario in all_scenarios}
+    if missing:
+        print(f'Routes without a scenario: {", ".join(sorted(missing))}')
+
+    results = {}
+    print(f'{"scenario":<32}{"p50 ms":>10}{"p95 ms":>10}{"queries":>9}{"peak KB":>10}')
+    for scenario in all_scenarios:
+        if args.only and scenario.name not in args.only:
+            continue
+        result = results[scenario.name] = run_scenario(scenario, ctx, Client, args.iterations)
+        print(f'{scenario.name:<32}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+              f'{result["queries"]:>9}{result["peak_kb"]:>10.1f}')
+
+    if not args.reuse_db:
+        from django.db import connections
+        connections.close_all()
+        database.unlink(missing_ok=True)
+    media.cleanup()
+
+    baseline_file = BASELINES_DIR / f'{args.scale}.json'
+    if args.save_baseline:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        baseline = json.loads(baseline_file.read_text()) if baseline_file.exists() else {}
+        baseline.update(results)
+        baseline_file.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f'Baseline written to {baseline_file}')
+        return 0
+
+    if not baseline_file.exists():
+        print(f'No baseline for scale {args.scale}, run with --save-baseline to record one')
+        return 0
+    regressions = compare(results, json.loads(baseline_file.read_text()), args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Per-request cost of the database connection handling: a new connection per
+request (CONN_MAX_AGE = 0, Django's default), persistent connections
+(CONN_MAX_AGE = None with health checks) and the pool of API/db/pool.py.
+
+Each mode runs in its own process and serves --requests GETs of an admin
+endpoint, closing connections after every request like the request_finished
+signal does under WSGI:
+
+    python -m benchmarks.db_connections [--requests 500] [--path /api/admin-dashboard/users/1/]
+
+The seeded SQLite stand-in is used by default; with another settings module
+(e.g. a MySQL database filled by seed_data) the same modes are applied to its
+'default' database, where opening a connection costs a network handshake.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+MODES = ('new', 'persistent', 'pooled')
+
+
+def configure(mode):
+    """Adjust settings.DATABASES['default'] for a mode, before Django connects"""
+    from django.conf import settings
+
+    database = settings.DATABASES['default']
+    engine = database['ENGINE'].rsplit('.', 1)[-1]
+    database['ENGINE'] = f'django.db.backends.{engine}'
+    database['OPTIONS'] = {name: value for name, value in database.get('OPTIONS', {}).items() if name != 'pool'}
+    database['CONN_MAX_AGE'] = 0
+    if mode == 'persistent':
+        database['CONN_MAX_AGE'] = None
+        database['CONN_HEALTH_CHECKS'] = True
+    elif mode == 'pooled':
+        database['ENGINE'] = f'API.db.backends.{engine}'
+        database['OPTIONS']['pool'] = {'max_size': 4}
+
+
+def run_mode(mode, requests, path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES  # noqa: B018 - load the settings before changing them
+    configure(mode)
+    django.setup()
+
+    from django.db import close_old_connections
+    from django.db.backends.signals import connection_created
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from rest_framework.authtoken.models import Token
+
+    from API.db import pool
+    from API.models import User
+
+    setup_test_environment()
+    opened = []
+    connection_created.connect(lambda sender, connection, **kwargs: opened.append(connection.alias))
+
+    admin = User.objects.filter(is_admin=True).order_by('pk').first()
+    token, _ = Token.objects.get_or_create(user=admin)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+    close_old_connections()
+    path = path or f'/api/admin-dashboard/users/{admin.pk}/'
+
+    timings = []
+    opened.clear()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        # The test client keeps the connection open, close it like request_finished does
+        close_old_connections()
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+
+    stats = pool.snapshot().get('default')
+    return {
+        'mode': mode,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p95_ms': statistics.quantiles(timings, n=20)[-1] * 1000,
+        # Pooled checkouts still run connect(), count the connections actually opened
+        'connections': stats['connections_created'] if stats else len(opened),
+        'pool': stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--path', help='Endpoint to request, the first admin user by default')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.requests, args.path)))
+        return
+
+    env = dict(os.environ)
+    database = None
+    if env.setdefault('DJANGO_SETTINGS_MODULE', 'ReportingBackend.settings_sqlite') == 'ReportingBackend.settings_sqlite':
+        database = BENCHMARKS_DIR / 'db_connections.sqlite3'
+        env['SQLITE_NAME'] = str(database)
+        database.unlink(missing_ok=True)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], env=env, check=True)
+        subprocess.run([sys.executable, 'manage.py', 'seed_data', '--scale', 'small', '-v', '0'], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    print(f'{"mode":<12}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}{"connections":>13}')
+    for mode in MODES:
+        command = [sys.executable, '-m', 'benchmarks.db_connections', '--mode', mode, '--requests', str(args.requests)]
+        if args.path:
+            command += ['--path', args.path]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:<12}{result["mean_ms"]:>10.3f}{result["p50_ms"]:>10.3f}{result["p95_ms"]:>10.3f}'
+              f'{result["connections"]:>13}')
+        if result['pool']:
+            print(f'{"":<12}pool: {result["pool"]}')
+
+    if database is not None:
+        database.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    main()
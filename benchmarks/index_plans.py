@@ -0,0 +1,106 @@
+"""
+Query plans and timings of the dashboard/list access paths before and after
+the 0002_indexes migration, on a seeded SQLite stand-in for MySQL.
+
+    python -m benchmarks.index_plans [--users 100000] [--salles 500] [--links 300000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReportingBackend.settings_sqlite')
+os.environ.setdefault('SQLITE_NAME', str(Path(__file__).resolve().parent / 'index_plans.sqlite3'))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.migrations.executor import MigrationExecutor  # noqa: E402
+from django.db.models import Count  # noqa: E402
+
+from API.models import User, Salle, User_Salle  # noqa: E402
+from API.seeding import seed  # noqa: E402
+
+
+def scenarios(salle_id):
+    return {
+        'dashboard admin count': User.objects.filter(is_admin=True).values('is_admin').annotate(n=Count('pk')).order_by(),
+        'dashboard role/active counts': User.objects.values('is_admin', 'is_active').annotate(n=Count('pk')).order_by(),
+        'user list ?role=user page': User.objects.filter(is_admin=False).order_by('id_user').values('id_user')[:100],
+        'user list by date_creation': User.objects.order_by('-date_creation', '-id_user').values('id_user')[:100],
+        'salle list by date_creation': Salle.objects.order_by('-date_creation', '-id_salle').values('id_salle')[:100],
+        'salle users (AdminSalleUsersView)': User.objects.filter(salle_Links__id_salle__id_salle=salle_id).values('id_user'),
+        'links of salle count': User_Salle.objects.filter(id_salle=salle_id).values('id_salle').annotate(n=Count('pk')).order_by(),
+        'link list by date_creation': User_Salle.objects.order_by('-date_creation', '-id').values('id')[:100],
+    }
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def timed(queryset, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(salle_id, repeat):
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return {
+        name: (explain(queryset), timed(queryset, repeat))
+        for name, queryset in scenarios(salle_id).items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--admins', type=int, default=20)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--salles', type=int, default=500)
+    parser.add_argument('--links', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    database = Path(connection.settings_dict['NAME'])
+    connection.close()
+    database.unlink(missing_ok=True)
+
+    call_command('migrate', verbosity=0)
+    call_command('migrate', 'API', '0001', verbosity=0)
+    # Seeded through the 0001 models: the current ones have columns added by later migrations
+    state = MigrationExecutor(connection).loader.project_state(('API', '0001_initial'))
+    counts = seed(admins=args.admins, users=args.users, salles=args.salles, links=args.links, apps=state.apps)
+    print('Seeded', ', '.join(f'{value} {name}' for name, value in counts.items()))
+
+    salle_id = User_Salle.objects.values('id_salle').annotate(n=Count('pk')).order_by('-n')[0]['id_salle']
+    before = measure(salle_id, args.repeat)
+    call_command('migrate', 'API', '0002', verbosity=0)
+    after = measure(salle_id, args.repeat)
+
+    for name in before:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f'\n{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms')
+        print('  before: ' + ' | '.join(plan_before))
+        print('  after:  ' + ' | '.join(plan_after))
+
+    connection.close()
+    database.unlink(missing_ok=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Throughput of DRF's JSONRenderer/JSONParser against FastJSONRenderer/FastJSONParser
+on UserSerializer and UserSalleListSerializer payloads from a seeded SQLite stand-in.
+
+    python -m benchmarks.json_renderers [--users 5000] [--links 20000] [--repeat 20]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReportingBackend.settings_sqlite')
+os.environ.setdefault('SQLITE_NAME', str(Path(__file__).resolve().parent / 'json_renderers.sqlite3'))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from API import renderers  # noqa: E402
+from API.models import User, User_Salle  # noqa: E402
+from API.parsers import FastJSONParser  # noqa: E402
+from API.renderers import FastJSONRenderer  # noqa: E402
+from API.seeding import seed  # noqa: E402
+from API.serializers import UserSerializer, UserSalleListSerializer  # noqa: E402
+
+
+def best_of(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return min(samples), statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--salles', type=int, default=100)
+    parser.add_argument('--links', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if renderers.orjson is None:
+        print('orjson is not installed: FastJSONRenderer falls back to the stdlib encoder')
+
+    database = Path(connection.settings_dict['NAME'])
+    connection.close()
+    database.unlink(missing_ok=True)
+    call_command('migrate', verbosity=0)
+    seed(users=args.users, salles=args.salles, links=args.links)
+
+    payloads = {
+        'UserSerializer': UserSerializer(UserSerializer.setup_queryset(User.objects.all()), many=True).data,
+        'UserSalleListSerializer': UserSalleListSerializer(
+            UserSalleListSerializer.setup_queryset(User_Salle.objects.all()), many=True).data,
+    }
+
+    print(f'{"payload":<26}{"codec":<10}{"stdlib ms":>12}{"fast ms":>12}{"speedup":>10}{"MB/s fast":>12}')
+    for name, data in payloads.items():
+        body = JSONRenderer().render(data)
+        assert FastJSONRenderer().render(data) == body
+
+        cases = {
+            'render': (lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+            'parse': (lambda: JSONParser().parse(io.BytesIO(body)), lambda: FastJSONParser().parse(io.BytesIO(body))),
+        }
+        for codec, (stdlib, fast) in cases.items():
+            stdlib_best, _ = best_of(stdlib, args.repeat)
+            fast_best, _ = best_of(fast, args.repeat)
+            print(f'{name:<26}{codec:<10}{stdlib_best * 1000:>12.2f}{fast_best * 1000:>12.2f}'
+                  f'{stdlib_best / fast_best:>9.1f}x{len(body) / fast_best / 1e6:>12.1f}')
+
+    connection.close()
+    database.unlink(missing_ok=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Logins per second through the async login view under concurrency, with
+AsyncClient against a seeded SQLite stand-in.
+
+Each configuration logs in --requests times with at most --concurrency
+requests in flight; hash_workers=1 serializes PBKDF2 the way a single
+sync_to_async thread would, the default uses one hashing thread per CPU.
+
+    python -m benchmarks.login_throughput [--users 200] [--requests 64] [--concurrency 1 8 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReportingBackend.settings_sqlite')
+os.environ.setdefault('SQLITE_NAME', str(Path(__file__).resolve().parent / 'login_throughput.sqlite3'))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+
+from API import logins  # noqa: E402
+from API.models import User  # noqa: E402
+from API.seeding import DEFAULT_PASSWORD, seed  # noqa: E402
+
+
+async def run(emails, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login(i):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await AsyncClient().post(
+                '/api/login/', {'email': emails[i % len(emails)], 'password': DEFAULT_PASSWORD},
+                content_type='application/json',
+            )
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return requests / elapsed, statistics.median(latencies), max(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--flush-interval', type=float, default=1,
+                        help='LAST_LOGIN_FLUSH_INTERVAL while benchmarking, 0 writes on every login')
+    args = parser.parse_args(argv)
+
+    database = Path(connection.settings_dict['NAME'])
+    connection.close()
+    database.unlink(missing_ok=True)
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+    seed(admins=1, users=args.users, salles=1, links=0)
+    emails = list(User.objects.filter(is_active=True).values_list('email', flat=True))
+    print(f'{os.cpu_count()} CPUs, {len(emails)} active users, {args.requests} logins per run')
+
+    print(f'{"hash workers":<14}{"concurrency":>12}{"logins/s":>10}{"p50 ms":>10}{"max ms":>10}')
+    for workers in sorted({1, os.cpu_count() or 1}):
+        login_settings = {**settings.API_LOGIN, 'HASH_WORKERS': workers, 'LAST_LOGIN_FLUSH_INTERVAL': args.flush_interval}
+        with override_settings(API_LOGIN=login_settings):
+            logins._hash_pool = None
+            for concurrency in args.concurrency:
+                throughput, p50, worst = asyncio.run(run(emails, args.requests, concurrency))
+                print(f'{workers:<14}{concurrency:>12}{throughput:>10.1f}{p50 * 1000:>10.1f}{worst * 1000:>10.1f}')
+            logins._hash_pool.shutdown()
+            logins._hash_pool = None
+        logins.last_login_flusher.flush()
+
+    connection.close()
+    database.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    main()